@@ -18,6 +18,10 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 
 from .database import get_db  # helper para AsyncSession
+from .ui_sql import (
+    UI_OLTS, UI_PONS, UI_UNLOCATED_GROUPS, is_serial_query, search_norm, ui_geo_sql,
+    ui_onts_sql, ui_search_filters, ui_search_params, ui_search_sql,
+)
 
 
 from fastapi.middleware.cors import CORSMiddleware
@@ -70,16 +74,6 @@ async def geo(
 ) -> Dict[str, Any]:
     minx, miny, maxx, maxy = parse_bbox(bbox)
     sql = text("""
-        WITH last AS (
-            SELECT DISTINCT ON (ont_id)
-              ont_id,
-              time,
-              ptx,
-              prx,
-              status AS power_status
-            FROM ont_power
-            ORDER BY ont_id, time DESC
-        )
         SELECT
           o.id,
           o.olt_id,
@@ -96,9 +90,9 @@ async def geo(
           l.ptx,
           l.prx,
           l.time                AS last_read,
-          l.power_status
+          l.status              AS power_status
         FROM ont AS o
-        JOIN last AS l
+        JOIN ont_last_power AS l
           ON l.ont_id = o.id
         WHERE 
           o.geom IS NOT NULL
@@ -166,6 +160,92 @@ class Point(BaseModel):
     ptx: float | None = Field(None, example=-22.5)
     prx: float | None = Field(None, example=-26.8)
     status: str | None =  Field(None, example=1)
+    # Solo con resolution agregada: ptx/prx son la media del bucket
+    ptx_min: float | None = None
+    ptx_max: float | None = None
+    prx_min: float | None = None
+    prx_max: float | None = None
+    samples: int | None = None
+    status_seconds: Dict[str, float] | None = None
+
+# ─────────────── RESOLUCIÓN DE SERIES ───────────────────────
+# Agregados continuos de ont_power (db-init/20261017_add_ont_power_aggregates.sql):
+# resolución → (vista, segundos por bucket), de más fina a más gruesa
+AGGREGATES: Dict[str, tuple] = {
+    "5m": ("ont_power_5m", 300),
+    "1h": ("ont_power_1h", 3600),
+    "1d": ("ont_power_1d", 86400),
+}
+RESOLUTION_REGEX = "^(raw|5m|1h|1d|auto)$"
+# auto: crudo hasta RAW_MAX_HOURS; si no, el agregado más fino que no
+# devuelva más de AUTO_MAX_POINTS puntos
+RAW_MAX_HOURS = 6
+AUTO_MAX_POINTS = 1500
+# Nombre en status_seconds → estado en st_agg (ver la migración)
+_STATUS_STATES = (("down", "0"), ("up", "1"), ("los", "2"), ("dying_gasp", "3"), ("other", "other"))
+
+
+def pick_resolution(resolution: str, start: datetime, end: datetime) -> str:
+    if resolution != "auto":
+        return resolution
+    span = (end - start).total_seconds()
+    if span <= RAW_MAX_HOURS * 3600:
+        return "raw"
+    for name, (_, step) in AGGREGATES.items():
+        if span / step <= AUTO_MAX_POINTS:
+            return name
+    return "1d"
+
+
+def aggregate_sql(resolution: str, order: str = "ASC"):
+    """
+    Buckets de la ONT que solapan [start, end] en la vista de `resolution`.
+    st_<status>: segundos del bucket en cada status, ponderados por tiempo
+    con el state_agg; el tramo anterior a la primera lectura del bucket
+    hereda el último estado del bucket previo (se lee uno más para el LAG)
+    y el bucket en curso se corta en now().
+    """
+    view, _ = AGGREGATES[resolution]
+    durations = ",\n".join(
+        f"""               EXTRACT(EPOCH FROM interpolated_duration_in(
+                   st_agg, '{state}', bucket,
+                   LEAST(CAST(:step AS INTERVAL), now() - bucket), st_prev
+               ))                         AS st_{name}"""
+        for name, state in _STATUS_STATES
+    )
+    return text(f"""
+        WITH b AS (
+            SELECT *, LAG(st_agg) OVER (ORDER BY bucket) AS st_prev
+              FROM {view}
+             WHERE ont_id = :oid
+               AND bucket >  :lead
+               AND bucket <= :end
+        )
+        SELECT bucket                     AS time,
+               ptx_sum / NULLIF(ptx_n, 0) AS ptx,
+               ptx_min,
+               ptx_max,
+               prx_sum / NULLIF(prx_n, 0) AS prx,
+               prx_min,
+               prx_max,
+               last_status                AS status,
+               samples,
+{durations}
+          FROM b
+         WHERE bucket > :first
+         ORDER BY bucket {order}
+    """)
+
+
+def aggregate_params(resolution: str, ont_id: int, start: datetime, end: datetime) -> Dict[str, Any]:
+    _, step = AGGREGATES[resolution]
+    step = timedelta(seconds=step)
+    return {"oid": ont_id, "lead": start - 2 * step, "first": start - step, "end": end, "step": step}
+
+
+def status_seconds(r: Any) -> Dict[str, float]:
+    """Segundos del bucket en cada status (calculados en aggregate_sql)."""
+    return {name: round(float(getattr(r, f"st_{name}") or 0), 1) for name, _ in _STATUS_STATES}
 
 # ──────────────────── LISTADO DE ONTs ───────────────────────
 @app.get(
@@ -182,11 +262,6 @@ async def list_onts(
 ) -> OntList:
     where_clause = "WHERE o.olt_id = :olt" if olt_id else ""
     sql = text(f"""
-        WITH last AS (
-            SELECT DISTINCT ON (ont_id) ont_id, time, ptx, prx, status
-              FROM ont_power
-             ORDER BY ont_id, time DESC
-        )
         SELECT
           o.id,
           o.olt_id,
@@ -203,7 +278,7 @@ async def list_onts(
           l.time   AS last_read,
           o.props
         FROM ont AS o
-        JOIN last AS l ON l.ont_id = o.id
+        JOIN ont_last_power AS l ON l.ont_id = o.id
         {where_clause}
         ORDER BY o.id
         LIMIT :lim OFFSET :off
@@ -245,14 +320,50 @@ async def list_onts(
 async def ont_history(
     ont_id: int,
     hours: int = Query(24, gt=0, le=24*30),
+    resolution: str = Query(
+        "raw", regex=RESOLUTION_REGEX,
+        description="raw | 5m | 1h | 1d | auto (según la ventana)",
+    ),
     db: AsyncSession = Depends(get_db),
 ) -> list[Point]:
-    since = datetime.utcnow() - timedelta(hours=hours)
+    now = datetime.utcnow()
+    since = now - timedelta(hours=hours)
+    resolution = pick_resolution(resolution, since, now)
+    if resolution != "raw":
+        result = await db.execute(
+            aggregate_sql(resolution, "DESC"), aggregate_params(resolution, ont_id, since, now),
+        )
+        rows = result.fetchall()
+        if not rows:
+            raise HTTPException(404, "ONT sin datos")
+        return [
+            Point(
+                time=r.time, ptx=r.ptx, prx=r.prx,
+                status=str(r.status) if r.status is not None else None,
+                ptx_min=r.ptx_min, ptx_max=r.ptx_max, prx_min=r.prx_min, prx_max=r.prx_max,
+                samples=r.samples, status_seconds=status_seconds(r),
+            )
+            for r in rows
+        ]
+
+    # El collector puede omitir lecturas sin cambios (deadband/heartbeat):
+    # la serie es escalonada, así que se añade el último valor anterior a
+    # la ventana fijado en `since` para que el primer tramo no quede vacío.
+    # Una lectura justo en `since` es ese mismo punto (<= / >): no se duplica.
     sql = text("""
         SELECT time, ptx, prx, status
           FROM ont_power
          WHERE ont_id = :oid
-           AND time >= :since
+           AND time > :since
+        UNION ALL
+        SELECT * FROM (
+            SELECT CAST(:since AS TIMESTAMPTZ) AS time, ptx, prx, status
+              FROM ont_power
+             WHERE ont_id = :oid
+               AND time <= :since
+             ORDER BY time DESC
+             LIMIT 1
+        ) AS carry
          ORDER BY time DESC
     """)
     result = await db.execute(sql, {"oid": ont_id, "since": since})
@@ -262,6 +373,36 @@ async def ont_history(
     return [Point(time=r.time, ptx=r.ptx, prx=r.prx, status=r.status) for r in rows]
 
 
+# ─────────────── PLANIFICADOR DE SONDEOS ─────────────────────
+class OltSchedule(BaseModel):
+    olt_id: str
+    mode: str
+    base_interval: int
+    effective_interval: float = Field(..., description="Intervalo aplicado por el collector (s)")
+    avg_duration: float | None = None
+    failure_rate: float | None = None
+    busy_rate: float | None = None
+    last_outcome: str | None = None
+    last_poll: datetime | None = None
+    next_due: datetime | None = None
+
+@app.get(
+    "/olts/schedule",
+    response_model=list[OltSchedule],
+    tags=["olts"],
+    summary="Intervalo efectivo de sondeo y estadísticas por OLT"
+)
+async def olts_schedule(db: AsyncSession = Depends(get_db)) -> list[OltSchedule]:
+    sql = text("""
+        SELECT olt_id, mode, base_interval, effective_interval, avg_duration,
+               failure_rate, busy_rate, last_outcome, last_poll, next_due
+          FROM olt_schedule
+         ORDER BY olt_id
+    """)
+    result = await db.execute(sql)
+    return [OltSchedule(**r._mapping) for r in result.fetchall()]
+
+
 # ─────────────── UBICAR Y UUID POR ADMIN-UI ─────────────────────
 
 class OntPatch(BaseModel):
@@ -332,6 +473,12 @@ class OntMetricBase(BaseModel):
     metric: str
     value: float | None
     timestamp: datetime
+    # Solo con resolution agregada: value es la media (ptx/prx) o el último
+    # status del bucket
+    min: float | None = None
+    max: float | None = None
+    samples: int | None = None
+    status_seconds: Dict[str, float] | None = None
 
     model_config = dict(from_attributes=True)  # ORM mode
 
@@ -355,14 +502,55 @@ async def get_ont_metrics(
     ),
     start: datetime = Query(..., description="Fecha/hora de inicio (ISO8601)"),
     end: datetime = Query(..., description="Fecha/hora de fin (ISO8601)"),
+    resolution: str = Query(
+        "raw", regex=RESOLUTION_REGEX,
+        description="raw | 5m | 1h | 1d | auto (según la ventana)",
+    ),
     db: AsyncSession = Depends(get_db),
 ) -> List[OntMetricResponse]:
     """
-    Serie temporal cruda de una métrica de ont_power para una ONT (sin agregación).
+    Serie temporal de una métrica de ont_power para una ONT.
+    Con resolution=raw es la serie cruda y escalonada: el primer punto es el
+    último valor conocido hasta `start`, fijado en `start` (el collector
+    puede omitir lecturas iguales). Con 5m/1h/1d (o auto) sale de los
+    agregados continuos: un punto por bucket con media, mínimo y máximo.
     """
+    resolution = pick_resolution(resolution, start, end)
+    if resolution != "raw":
+        result = await db.execute(
+            aggregate_sql(resolution), aggregate_params(resolution, ont_id, start, end),
+        )
+        items = []
+        for r in result.fetchall():
+            if metric == "status":
+                value, low, high = r.status, None, None
+            else:
+                value, low, high = getattr(r, metric), getattr(r, f"{metric}_min"), getattr(r, f"{metric}_max")
+            items.append(OntMetricResponse(
+                ont_id=ont_id, metric=metric, value=value, timestamp=r.time,
+                min=low, max=high, samples=r.samples,
+                status_seconds=status_seconds(r) if metric == "status" else None,
+            ))
+        return items
+
     sql = text("""
+        WITH carry AS (
+            SELECT CAST(:start AS TIMESTAMPTZ) AS time, ptx, prx, status
+              FROM ont_power
+             WHERE ont_id = :ont_id
+               AND time <= :start
+             ORDER BY time DESC
+             LIMIT 1
+        ), series AS (
+            SELECT time, ptx, prx, status
+              FROM ont_power
+             WHERE ont_id = :ont_id
+               AND time > :start AND time <= :end
+            UNION ALL
+            SELECT time, ptx, prx, status FROM carry
+        )
         SELECT
-          ont_id         AS ont_id,
+          CAST(:ont_id AS BIGINT) AS ont_id,
           :metric        AS metric,
           CASE
             WHEN :metric = 'ptx'    THEN ptx
@@ -370,9 +558,7 @@ async def get_ont_metrics(
             WHEN :metric = 'status' THEN status::DOUBLE PRECISION
           END            AS value,
           time           AS timestamp
-        FROM ont_power
-        WHERE ont_id = :ont_id
-          AND time BETWEEN :start AND :end
+        FROM series
         ORDER BY time ASC
     """)
     params = {"metric": metric, "ont_id": ont_id, "start": start, "end": end}
@@ -411,71 +597,20 @@ class UIOntList(BaseModel):
     items: List[UIOntItem]
 
 
-def sql_pon_id_expr() -> str:
-    """
-    Deriva el 'pon_id' a partir de ont.vendor_ont_id + olt.vendor.
-    - huawei:        CHASIS/SLOT/PON/ID -> CHASIS/SLOT/PON
-    - zyxel2406/1240XA: (ont-)SLOT-PON-ID -> SLOT-PON
-    - zyxel1408A:    (ont-)PON-ID -> PON
-    Nota: se elimina prefijo ^ont- si existe.
-    """
-    return r"""
-    CASE
-      WHEN ol.vendor = 'huawei' THEN
-        split_part(o.vendor_ont_id, '/', 1) || '/' ||
-        split_part(o.vendor_ont_id, '/', 2) || '/' ||
-        split_part(o.vendor_ont_id, '/', 3)
-
-      WHEN ol.vendor IN ('zyxel2406','zyxel1240XA') THEN
-        split_part(regexp_replace(o.vendor_ont_id, '^ont-', ''), '-', 1) || '-' ||
-        split_part(regexp_replace(o.vendor_ont_id, '^ont-', ''), '-', 2)
-
-      WHEN ol.vendor IN ('zyxel1408A','zyxel') THEN
-        split_part(regexp_replace(o.vendor_ont_id, '^ont-', ''), '-', 1)
-
-      ELSE
-        -- fallback: si tiene '/', asume huawei-like; si tiene '-', usa primer token
-        CASE
-          WHEN position('/' in o.vendor_ont_id) > 0 THEN
-            split_part(o.vendor_ont_id, '/', 1) || '/' ||
-            split_part(o.vendor_ont_id, '/', 2) || '/' ||
-            split_part(o.vendor_ont_id, '/', 3)
-          ELSE
-            split_part(regexp_replace(o.vendor_ont_id, '^ont-', ''), '-', 1)
-        END
-    END
-    """
-
-
 @app.get("/ui/olts", response_model=UIList, tags=["ui"], summary="Listado de OLTs (admin-ui)")
 async def ui_list_olts(db: AsyncSession = Depends(get_db)) -> UIList:
-    sql = text("""
-        SELECT
-          id::text AS id,
-          COALESCE(NULLIF(description,''), id)::text AS name
-        FROM olt
-        ORDER BY id
-    """)
+    sql = text(UI_OLTS)
     res = await db.execute(sql)
     items = [UIItem(id=r.id, name=r.name) for r in res.fetchall()]
     return UIList(items=items)
 
 
-@app.get("/ui/olts/{olt_id}/pons", response_model=UIList, tags=["ui"], summary="Listado de PONs por OLT (derivado)")
+@app.get("/ui/olts/{olt_id}/pons", response_model=UIList, tags=["ui"], summary="Listado de PONs por OLT (ont.pon_id)")
 async def ui_list_pons(
     olt_id: str,
     db: AsyncSession = Depends(get_db),
 ) -> UIList:
-    pon_expr = sql_pon_id_expr()
-    sql = text(f"""
-        SELECT DISTINCT
-          ({pon_expr})::text AS id,
-          ({pon_expr})::text AS name
-        FROM ont o
-        JOIN olt ol ON ol.id = o.olt_id
-        WHERE o.olt_id = :olt_id
-        ORDER BY id
-    """)
+    sql = text(UI_PONS)
     res = await db.execute(sql, {"olt_id": olt_id})
     items = [UIItem(id=r.id, name=r.name) for r in res.fetchall()]
     return UIList(items=items)
@@ -495,41 +630,8 @@ async def ui_list_onts(
     offset: int = Query(0, ge=0),
     db: AsyncSession = Depends(get_db),
 ) -> UIOntList:
-    pon_expr = sql_pon_id_expr()
-
-    where_unlocated = "AND o.geom IS NULL" if only_unlocated == 1 else ""
-
-    sql_items = text(f"""
-        SELECT
-          o.id,
-          o.olt_id,
-          COALESCE(NULLIF(ol.description,''), ol.id)::text AS olt_name,
-          o.vendor_ont_id,
-          ({pon_expr})::text AS pon_id,
-          o.cto_uuid,
-          ST_Y(o.geom) AS lat,
-          ST_X(o.geom) AS lon,
-          o.status,
-          o.serial,
-          o.model,
-          o.description
-        FROM ont o
-        JOIN olt ol ON ol.id = o.olt_id
-        WHERE o.olt_id = :olt_id
-          AND ({pon_expr})::text = :pon_id
-          {where_unlocated}
-        ORDER BY o.id
-        LIMIT :lim OFFSET :off
-    """)
-
-    sql_total = text(f"""
-        SELECT COUNT(*)
-        FROM ont o
-        JOIN olt ol ON ol.id = o.olt_id
-        WHERE o.olt_id = :olt_id
-          AND ({pon_expr})::text = :pon_id
-          {where_unlocated}
-    """)
+    items_sql, total_sql = ui_onts_sql(pon_id, only_unlocated == 1)
+    sql_items, sql_total = text(items_sql), text(total_sql)
 
     params = {"olt_id": olt_id, "pon_id": pon_id, "lim": limit, "off": offset}
 
@@ -558,9 +660,6 @@ async def ui_list_onts(
     return UIOntList(total=int(total or 0), items=items)
 
 
-from sqlalchemy import text
-from fastapi import Query
-
 @app.get(
     "/ui/onts/search",
     response_model=UIOntList,
@@ -568,7 +667,7 @@ from fastapi import Query
     summary="Búsqueda de ONTs por vendor_ont_id / serial (opcionalmente filtrada por OLT/PON)",
 )
 async def ui_search_onts(
-    q: str = Query(..., min_length=1, description="Texto a buscar (ILIKE)"),
+    q: str = Query(..., min_length=1, description="Texto a buscar en vendor_ont_id / serial (sin distinguir mayúsculas ni prefijo ont-)"),
     olt_id: str | None = Query(None, description="Filtrar por OLT"),
     pon_id: str | None = Query(None, description="Filtrar por PON derivada"),
     only_unlocated: int = Query(1, description="1: solo sin geom (geom IS NULL)"),
@@ -576,63 +675,28 @@ async def ui_search_onts(
     offset: int = Query(0, ge=0),
     db: AsyncSession = Depends(get_db),
 ) -> UIOntList:
-    pon_expr = sql_pon_id_expr()
-
-    # Normalización simple: si el usuario busca "3-1-12" y en DB está "ont-3-1-12", también lo pillamos.
-    q_norm = q.strip()
-    like = f"%{q_norm}%"
-    like2 = f"%ont-{q_norm}%" if not q_norm.lower().startswith("ont-") else like
-
-    where = ["1=1"]
-    params = {"like": like, "like2": like2, "lim": limit, "off": offset}
-
-    # Texto: vendor_ont_id o serial
-    where.append("(o.vendor_ont_id ILIKE :like OR o.vendor_ont_id ILIKE :like2 OR COALESCE(o.serial,'') ILIKE :like)")
-
-    if olt_id:
-        where.append("o.olt_id = :olt_id")
-        params["olt_id"] = olt_id
-
-    if pon_id:
-        where.append(f"({pon_expr})::text = :pon_id")
-        params["pon_id"] = pon_id
-
-    if only_unlocated == 1:
-        where.append("o.geom IS NULL")
-
-    where_sql = " AND ".join(where)
-
-    sql_items = text(f"""
-        SELECT
-          o.id,
-          o.olt_id,
-          COALESCE(NULLIF(ol.description,''), ol.id)::text AS olt_name,
-          o.vendor_ont_id,
-          ({pon_expr})::text AS pon_id,
-          o.cto_uuid,
-          ST_Y(o.geom) AS lat,
-          ST_X(o.geom) AS lon,
-          o.status,
-          o.serial,
-          o.model,
-          o.description
-        FROM ont o
-        JOIN olt ol ON ol.id = o.olt_id
-        WHERE {where_sql}
-        ORDER BY o.id
-        LIMIT :lim OFFSET :off
-    """)
-
-    sql_total = text(f"""
-        SELECT COUNT(*)
-        FROM ont o
-        JOIN olt ol ON ol.id = o.olt_id
-        WHERE {where_sql}
-    """)
+    q_norm = search_norm(q)
+    if not q_norm:
+        return UIOntList(total=0, items=[])
+    params = {"q": q_norm, "lim": limit, "off": offset, "olt_id": olt_id, "pon_id": pon_id}
+    filters = ui_search_filters(olt_id, pon_id, only_unlocated == 1)
+
+    # Camino rápido: un nº de serie completo (o su principio); si no
+    # encuentra nada, búsqueda general por trigram (ver ui_sql.py)
+    total = 0
+    if is_serial_query(q_norm):
+        total_sql, items_sql = ui_search_sql(True, filters)
+        params.update(ui_search_params(q_norm, True))
+        total = await db.scalar(text(total_sql), params)
+    if not total:
+        total_sql, items_sql = ui_search_sql(False, filters)
+        params.update(ui_search_params(q_norm, False))
+        total = await db.scalar(text(total_sql), params)
+
+    sql_items = text(items_sql)
 
     res = await db.execute(sql_items, params)
     rows = res.fetchall()
-    total = await db.scalar(sql_total, params)
 
     items = [
         UIOntItem(
@@ -671,32 +735,7 @@ async def ui_geo_onts(
         return {"type": "FeatureCollection", "features": []}
 
     minx, miny, maxx, maxy = parse_bbox(bbox)
-    pon_expr = sql_pon_id_expr()
-
-    sql = text(f"""
-        SELECT
-          o.id,
-          o.olt_id,
-          COALESCE(NULLIF(ol.description,''), ol.id)::text AS olt_name,
-          o.vendor_ont_id,
-          ({pon_expr})::text AS pon_id,
-          o.status,
-          o.cto_uuid,
-          o.description,
-          o.model,
-          o.serial,
-          ST_AsGeoJSON(o.geom) AS geom
-        FROM ont o
-        JOIN olt ol ON ol.id = o.olt_id
-        WHERE o.geom IS NOT NULL
-          AND o.olt_id = :olt_id
-          AND ({pon_expr})::text = :pon_id
-          AND ST_Intersects(
-                o.geom,
-                ST_MakeEnvelope(:minx, :miny, :maxx, :maxy, 4326)
-              )
-        ORDER BY o.id
-    """)
+    sql = text(ui_geo_sql(pon_id))
 
     res = await db.execute(sql, {
         "minx": minx, "miny": miny, "maxx": maxx, "maxy": maxy,
@@ -1035,24 +1074,7 @@ class UIUnlocatedGroups(BaseModel):
     summary="Jerarquía OLT->PON con counts de ONTs sin ubicar (geom IS NULL)",
 )
 async def ui_unlocated_groups(db: AsyncSession = Depends(get_db)) -> UIUnlocatedGroups:
-    pon_expr = sql_pon_id_expr()
-
-    # OJO: repetimos la expresión de olt_name en GROUP BY (no alias)
-    sql = text(f"""
-        SELECT
-          o.olt_id::text AS olt_id,
-          COALESCE(NULLIF(ol.description,''), ol.id)::text AS olt_name,
-          ({pon_expr})::text AS pon_id,
-          COUNT(*)::int AS cnt
-        FROM ont o
-        JOIN olt ol ON ol.id = o.olt_id
-        WHERE o.geom IS NULL
-        GROUP BY
-          o.olt_id,
-          COALESCE(NULLIF(ol.description,''), ol.id),
-          ({pon_expr})
-        ORDER BY o.olt_id, pon_id
-    """)
+    sql = text(UI_UNLOCATED_GROUPS)
 
     res = await db.execute(sql)
     rows = res.fetchall()
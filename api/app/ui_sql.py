@@ -0,0 +1,205 @@
+# ui_sql.py (SQL de los endpoints /ui/* de main.py)
+# ───────────────────────────────────────────────────────────────
+# • Sin FastAPI ni SQLAlchemy: test/check_pon_id.py importa este módulo
+#   y hace EXPLAIN de exactamente las mismas consultas que la API.
+# • Parámetros con nombre (:olt_id, :pon_id…) para text().
+# • ont.pon_id la materializa un trigger (20260121_add_pon_id_cache.sql);
+#   índices en db-init/20261017_add_ont_pon_id_indexes.sql.
+# ───────────────────────────────────────────────────────────────
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Tuple
+
+UI_OLTS = """
+    SELECT
+      id::text AS id,
+      COALESCE(NULLIF(description,''), id)::text AS name
+    FROM olt
+    ORDER BY id
+"""
+
+UI_PONS = """
+    SELECT
+      COALESCE(p.pon_id, '') AS id,
+      COALESCE(p.pon_id, '') AS name
+    FROM (
+      SELECT DISTINCT o.pon_id
+      FROM ont o
+      WHERE o.olt_id = :olt_id
+    ) AS p
+    ORDER BY id
+"""
+
+# Agrupa sobre el índice parcial (olt_id, pon_id) WHERE geom IS NULL y
+# solo después cruza con olt para el nombre
+UI_UNLOCATED_GROUPS = """
+    SELECT
+      g.olt_id::text AS olt_id,
+      COALESCE(NULLIF(ol.description,''), ol.id)::text AS olt_name,
+      COALESCE(g.pon_id, '') AS pon_id,
+      g.cnt
+    FROM (
+      SELECT o.olt_id, o.pon_id, COUNT(*)::int AS cnt
+      FROM ont o
+      WHERE o.geom IS NULL
+      GROUP BY o.olt_id, o.pon_id
+    ) AS g
+    JOIN olt ol ON ol.id = g.olt_id
+    ORDER BY g.olt_id, pon_id
+"""
+
+# Columnas de UIOntItem (listado y búsqueda)
+_ONT_ITEM_COLUMNS = """
+      o.id,
+      o.olt_id,
+      COALESCE(NULLIF(ol.description,''), ol.id)::text AS olt_name,
+      o.vendor_ont_id,
+      COALESCE(o.pon_id, '') AS pon_id,
+      o.cto_uuid,
+      ST_Y(o.geom) AS lat,
+      ST_X(o.geom) AS lon,
+      o.status,
+      o.serial,
+      o.model,
+      o.description
+"""
+
+
+def sql_pon_filter(pon_id: Optional[str]) -> str:
+    """
+    Condición sobre ont.pon_id, indexada con olt_id. Se compara la columna
+    tal cual para que el índice sirva; "" (como lo devuelven los listados
+    con COALESCE) selecciona las ONTs sin PON derivable.
+    """
+    return "o.pon_id = :pon_id" if pon_id else "o.pon_id IS NULL"
+
+
+def ui_onts_sql(pon_id: Optional[str], only_unlocated: bool) -> Tuple[str, str]:
+    """(items, total) de /ui/onts. Parámetros: olt_id, pon_id, lim, off."""
+    where = f"""
+        WHERE o.olt_id = :olt_id
+          AND {sql_pon_filter(pon_id)}
+          {"AND o.geom IS NULL" if only_unlocated else ""}
+    """
+    items = f"""
+        SELECT {_ONT_ITEM_COLUMNS}
+        FROM ont o
+        JOIN olt ol ON ol.id = o.olt_id
+        {where}
+        ORDER BY o.id
+        LIMIT :lim OFFSET :off
+    """
+    total = f"""
+        SELECT COUNT(*)
+        FROM ont o
+        JOIN olt ol ON ol.id = o.olt_id
+        {where}
+    """
+    return items, total
+
+
+def ui_geo_sql(pon_id: Optional[str]) -> str:
+    """/ui/onts/geo. Parámetros: olt_id, pon_id, minx, miny, maxx, maxy."""
+    return f"""
+        SELECT
+          o.id,
+          o.olt_id,
+          COALESCE(NULLIF(ol.description,''), ol.id)::text AS olt_name,
+          o.vendor_ont_id,
+          COALESCE(o.pon_id, '') AS pon_id,
+          o.status,
+          o.cto_uuid,
+          o.description,
+          o.model,
+          o.serial,
+          ST_AsGeoJSON(o.geom) AS geom
+        FROM ont o
+        JOIN olt ol ON ol.id = o.olt_id
+        WHERE o.geom IS NOT NULL
+          AND o.olt_id = :olt_id
+          AND {sql_pon_filter(pon_id)}
+          AND ST_Intersects(
+                o.geom,
+                ST_MakeEnvelope(:minx, :miny, :maxx, :maxy, 4326)
+              )
+        ORDER BY o.id
+    """
+
+
+# ── Búsqueda (db-init/20261017_add_ont_search_trgm.sql) ─────
+# Misma normalización que la función SQL ont_search_norm() de los índices
+SERIAL_MIN_LEN = 8
+
+
+def search_norm(q: str) -> str:
+    """Minúsculas y sin prefijo "ont-": "ONT-3-1-12" → "3-1-12"."""
+    q = q.strip().lower()
+    return q[4:] if q.startswith("ont-") else q
+
+
+def is_serial_query(q_norm: str) -> bool:
+    """¿Parece un nº de serie (completo o casi)? → camino rápido por prefijo."""
+    return len(q_norm) >= SERIAL_MIN_LEN and q_norm.isascii() and q_norm.isalnum()
+
+
+def like_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def ui_search_filters(
+    olt_id: Optional[str], pon_id: Optional[str], only_unlocated: bool,
+) -> List[str]:
+    filters = []
+    if olt_id:
+        filters.append("o.olt_id = :olt_id")
+    if pon_id:
+        filters.append(sql_pon_filter(pon_id))
+    if only_unlocated:
+        filters.append("o.geom IS NULL")
+    return filters
+
+
+def ui_search_params(q_norm: str, serial: bool) -> Dict[str, Any]:
+    """Parámetros del patrón de cada camino (se añaden a q, olt_id, pon_id, lim, off)."""
+    if serial:
+        # Prefijo como rango [lo, hi): q_norm es ASCII alfanumérico, así que
+        # basta con subir el último carácter
+        return {"lo": q_norm, "hi": q_norm[:-1] + chr(ord(q_norm[-1]) + 1)}
+    escaped = like_escape(q_norm)
+    return {"like": "%" + escaped + "%", "starts": escaped + "%"}
+
+
+def ui_search_sql(serial: bool, filters: List[str]) -> Tuple[str, str]:
+    """
+    (total, items) de /ui/onts/search.
+    serial=True: nº de serie completo (o su principio) por el btree
+    text_pattern_ops de ont_search_norm(serial). El prefijo va como rango
+    ~>=~ / ~<~ y no como LIKE: asyncpg usa sentencias preparadas y un plan
+    genérico no convierte LIKE :param en rango de índice (sí estos operadores).
+    serial=False: subcadena sobre los índices trigram (GIN) de vendor_ont_id
+    y serial; orden exacto → prefijo → similitud.
+    """
+    if serial:
+        match = "ont_search_norm(o.serial) ~>=~ :lo AND ont_search_norm(o.serial) ~<~ :hi"
+        order = "(ont_search_norm(o.serial) = :q) DESC, length(o.serial), o.id"
+    else:
+        match = "(ont_search_norm(o.vendor_ont_id) LIKE :like OR ont_search_norm(o.serial) LIKE :like)"
+        order = """
+          (ont_search_norm(o.vendor_ont_id) = :q OR ont_search_norm(o.serial) = :q) DESC,
+          (ont_search_norm(o.vendor_ont_id) LIKE :starts OR ont_search_norm(o.serial) LIKE :starts) DESC,
+          GREATEST(
+            similarity(ont_search_norm(o.vendor_ont_id), :q),
+            similarity(ont_search_norm(o.serial), :q)
+          ) DESC,
+          o.id"""
+    where = " AND ".join([match] + filters)
+    total = f"SELECT COUNT(*) FROM ont o WHERE {where}"
+    items = f"""
+        SELECT {_ONT_ITEM_COLUMNS}
+        FROM ont o
+        JOIN olt ol ON ol.id = o.olt_id
+        WHERE {where}
+        ORDER BY {order}
+        LIMIT :lim OFFSET :off
+    """
+    return total, items
@@ -0,0 +1,169 @@
+# collector/cache.py
+# ───────────────────────────────────────────────────────────────
+# Caché de huellas (fingerprints) de metadatos de ONT.
+# • Clave (olt_id, vendor_ont_id) → (huella, ont.id)
+# • Si la huella de status/serial/model/description/props coincide con la
+#   última escrita, la ONT no se reenvía al upsert y se reutiliza su PK.
+# • Backends (ONT_CACHE_BACKEND): none | memory | redis
+#     - memory: dict por proceso (cada hijo prefork tiene el suyo)
+#     - redis:  un hash por OLT, compartido entre procesos y workers
+# • ONT_CACHE_TTL acota cuánto tiempo se confía en una entrada, para que
+#   cambios hechos fuera del collector (CSV, admin-ui) acaben convergiendo.
+# ───────────────────────────────────────────────────────────────
+
+from __future__ import annotations
+
+import os
+import time
+import hashlib
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from normalize import OntRow
+from redis_conn import get_redis
+
+ONT_CACHE_BACKEND = os.getenv("ONT_CACHE_BACKEND", "none").strip().lower()
+ONT_CACHE_TTL = int(os.getenv("ONT_CACHE_TTL", "3600"))
+
+Entry = Tuple[str, int]  # (huella, ont.id)
+
+
+def ont_fingerprint(row: OntRow) -> str:
+    """Huella estable entre procesos (hash() de Python está aleatorizado)."""
+    h = hashlib.blake2b(digest_size=8)
+    for value in (row.status, row.serial, row.model, row.description, row.props):
+        h.update(repr(value).encode())
+        h.update(b"\x1f")
+    return h.hexdigest()
+
+
+class NullFingerprintCache:
+    """Sin caché: todas las ONTs van al upsert (comportamiento histórico)."""
+
+    enabled = False
+
+    def get_many(self, olt_id: str, vids: List[str]) -> Dict[str, Entry]:
+        return {}
+
+    def set_many(self, olt_id: str, entries: Dict[str, Entry]) -> None:
+        pass
+
+    def evict(self, olt_id: str, vids: Iterable[str]) -> None:
+        pass
+
+    def clear(self, olt_id: str) -> None:
+        pass
+
+
+class MemoryFingerprintCache(NullFingerprintCache):
+    enabled = True
+
+    def __init__(self, ttl: int = ONT_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data: Dict[str, Dict[str, Tuple[str, int, float]]] = {}
+
+    def get_many(self, olt_id: str, vids: List[str]) -> Dict[str, Entry]:
+        deadline = time.monotonic() - self.ttl
+        with self._lock:
+            per_olt = self._data.get(olt_id)
+            if not per_olt:
+                return {}
+            out: Dict[str, Entry] = {}
+            for vid in vids:
+                hit = per_olt.get(vid)
+                if hit is not None and hit[2] >= deadline:
+                    out[vid] = (hit[0], hit[1])
+            return out
+
+    def set_many(self, olt_id: str, entries: Dict[str, Entry]) -> None:
+        if not entries:
+            return
+        now = time.monotonic()
+        with self._lock:
+            per_olt = self._data.setdefault(olt_id, {})
+            for vid, (fp, ont_id) in entries.items():
+                per_olt[vid] = (fp, ont_id, now)
+
+    def evict(self, olt_id: str, vids: Iterable[str]) -> None:
+        with self._lock:
+            per_olt = self._data.get(olt_id)
+            if per_olt:
+                for vid in vids:
+                    per_olt.pop(vid, None)
+
+    def clear(self, olt_id: str) -> None:
+        with self._lock:
+            self._data.pop(olt_id, None)
+
+
+class RedisFingerprintCache(NullFingerprintCache):
+    """
+    Un hash `collector:ontfp:<olt_id>` con campo vendor_ont_id → "huella:id".
+    El TTL se aplica a nivel de hash y se refresca solo al escribir, de modo
+    que todas las entradas de una OLT caducan juntas como mucho ONT_CACHE_TTL
+    después del último cambio.
+    """
+
+    enabled = True
+    PREFIX = "collector:ontfp:"
+
+    def __init__(self, ttl: int = ONT_CACHE_TTL):
+        self.ttl = ttl
+
+    def _key(self, olt_id: str) -> str:
+        return f"{self.PREFIX}{olt_id}"
+
+    def get_many(self, olt_id: str, vids: List[str]) -> Dict[str, Entry]:
+        if not vids:
+            return {}
+        try:
+            values = get_redis().hmget(self._key(olt_id), vids)
+        except Exception as exc:
+            logging.warning("Caché ONT (redis) no disponible: %s", exc)
+            return {}
+        out: Dict[str, Entry] = {}
+        for vid, raw in zip(vids, values):
+            if raw:
+                fp, _, ont_id = raw.partition(":")
+                out[vid] = (fp, int(ont_id))
+        return out
+
+    def set_many(self, olt_id: str, entries: Dict[str, Entry]) -> None:
+        if not entries:
+            return
+        key = self._key(olt_id)
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            pipe.hset(key, mapping={vid: f"{fp}:{oid}" for vid, (fp, oid) in entries.items()})
+            pipe.expire(key, self.ttl)
+            pipe.execute()
+        except Exception as exc:
+            logging.warning("Caché ONT (redis) no actualizada: %s", exc)
+
+    def evict(self, olt_id: str, vids: Iterable[str]) -> None:
+        vids = list(vids)
+        if not vids:
+            return
+        try:
+            get_redis().hdel(self._key(olt_id), *vids)
+        except Exception as exc:
+            logging.warning("Caché ONT (redis) no invalidada: %s", exc)
+
+    def clear(self, olt_id: str) -> None:
+        try:
+            get_redis().delete(self._key(olt_id))
+        except Exception as exc:
+            logging.warning("Caché ONT (redis) no vaciada: %s", exc)
+
+
+def build_fingerprint_cache(backend: Optional[str] = None) -> NullFingerprintCache:
+    backend = (backend or ONT_CACHE_BACKEND)
+    if backend == "memory":
+        return MemoryFingerprintCache()
+    if backend == "redis":
+        return RedisFingerprintCache()
+    if backend not in ("none", ""):
+        logging.warning("ONT_CACHE_BACKEND=%s desconocido; caché desactivada", backend)
+    return NullFingerprintCache()
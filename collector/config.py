@@ -4,6 +4,13 @@ import yaml
 CONFIG_PATH = os.getenv("OLT_CONFIG_PATH", "/config/olts.yaml")
 
 
+def env_bool(name: str, default: bool = True) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in {"1", "true", "t", "yes", "y", "on"}
+
+
 def load_config():
     with open(CONFIG_PATH, "r") as f:
         raw = yaml.safe_load(f)
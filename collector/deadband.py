@@ -0,0 +1,180 @@
+# collector/deadband.py
+# ───────────────────────────────────────────────────────────────
+# Compresión deadband / heartbeat de lecturas de potencia.
+# • Se descarta una lectura si |Δprx| y |Δptx| respecto a la última
+#   ESCRITA están por debajo de POWER_DEADBAND (dB) y el status no cambió.
+# • Siempre se escribe una lectura cada POWER_HEARTBEAT_MINUTES.
+# • Se compara contra lo último escrito (no contra lo último leído), así la
+#   deriva lenta acaba superando el umbral y nunca se pierde un cambio.
+# • Lo último escrito se cachea por ont.id (POWER_CACHE_BACKEND=redis|memory).
+#   Un fallo de caché se resuelve con ont_last_power (última lectura
+#   escrita, misma transacción): nunca se omite una lectura por no
+#   conocer la anterior.
+# • Las entradas de las ONTs borradas (reconciliación) se eliminan con
+#   forget() para que el hash no crezca indefinidamente.
+# • memory solo es correcto con un único proceso escritor: cada hijo
+#   prefork compararía contra lo que escribió él, no contra la BD. Con
+#   varios hijos el worker pasa a redis (require_shared, en tasks.py).
+# Desactivado si POWER_DEADBAND no está definido o es <= 0.
+# ───────────────────────────────────────────────────────────────
+
+from __future__ import annotations
+
+import os
+import logging
+import threading
+import datetime as dt
+from typing import Any, Dict, List, Tuple
+
+from sqlalchemy import text
+
+from redis_conn import get_redis
+
+POWER_DEADBAND = float(os.getenv("POWER_DEADBAND", "0") or 0)
+POWER_HEARTBEAT_MINUTES = float(os.getenv("POWER_HEARTBEAT_MINUTES", "15"))
+POWER_CACHE_BACKEND = os.getenv("POWER_CACHE_BACKEND", "redis").strip().lower()
+
+Last = Tuple[float, Any, Any, Any]  # (epoch, ptx, prx, status)
+
+_LAST_WRITTEN = text("""
+    SELECT ont_id, time, ptx, prx, status
+      FROM ont_last_power
+     WHERE ont_id = ANY(CAST(:ids AS bigint[]))
+""")
+
+
+def _epoch(value: dt.datetime) -> float:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=dt.timezone.utc)
+    return value.timestamp()
+
+
+class MemoryLastPowerStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data: Dict[int, Last] = {}
+
+    def get_many(self, ont_ids: List[int]) -> Dict[int, Last]:
+        with self._lock:
+            return {oid: self._data[oid] for oid in ont_ids if oid in self._data}
+
+    def set_many(self, entries: Dict[int, Last]) -> None:
+        with self._lock:
+            self._data.update(entries)
+
+    def delete_many(self, ont_ids: List[int]) -> None:
+        with self._lock:
+            for oid in ont_ids:
+                self._data.pop(oid, None)
+
+
+class RedisLastPowerStore:
+    """Un único hash `collector:lastpower` con ont_id → "epoch|ptx|prx|status"."""
+
+    KEY = "collector:lastpower"
+
+    @staticmethod
+    def _decode(raw: str) -> Last:
+        ts, ptx, prx, status = raw.split("|")
+        return (
+            float(ts),
+            float(ptx) if ptx else None,
+            float(prx) if prx else None,
+            int(status) if status else None,
+        )
+
+    def get_many(self, ont_ids: List[int]) -> Dict[int, Last]:
+        if not ont_ids:
+            return {}
+        try:
+            values = get_redis().hmget(self.KEY, ont_ids)
+        except Exception as exc:
+            logging.warning("Caché de potencias (redis) no disponible: %s", exc)
+            return {}
+        return {oid: self._decode(raw) for oid, raw in zip(ont_ids, values) if raw}
+
+    def set_many(self, entries: Dict[int, Last]) -> None:
+        if not entries:
+            return
+        try:
+            get_redis().hset(self.KEY, mapping={
+                oid: "|".join("" if v is None else str(v) for v in last)
+                for oid, last in entries.items()
+            })
+        except Exception as exc:
+            logging.warning("Caché de potencias (redis) no actualizada: %s", exc)
+
+    def delete_many(self, ont_ids: List[int]) -> None:
+        if not ont_ids:
+            return
+        try:
+            get_redis().hdel(self.KEY, *ont_ids)
+        except Exception as exc:
+            logging.warning("Caché de potencias (redis) no depurada: %s", exc)
+
+
+class PowerDeadband:
+    def __init__(
+        self,
+        deadband: float = POWER_DEADBAND,
+        heartbeat_minutes: float = POWER_HEARTBEAT_MINUTES,
+        backend: str = POWER_CACHE_BACKEND,
+    ):
+        self.deadband = deadband
+        self.heartbeat = heartbeat_minutes * 60.0
+        self.enabled = deadband > 0
+        self.store = RedisLastPowerStore() if backend == "redis" else MemoryLastPowerStore()
+
+    def require_shared(self, reason: str) -> None:
+        """Pasa a la caché de Redis si la actual es local al proceso."""
+        if self.enabled and isinstance(self.store, MemoryLastPowerStore):
+            logging.warning("POWER_CACHE_BACKEND=memory no es válido con %s: se usa redis", reason)
+            self.store = RedisLastPowerStore()
+
+    def _changed(self, row: Dict[str, Any], last: Last) -> bool:
+        ts, ptx, prx, status = last
+        if _epoch(row["time"]) - ts >= self.heartbeat:
+            return True
+        if row["status"] != status:
+            return True
+        for value, prev in ((row["ptx"], ptx), (row["prx"], prx)):
+            if (value is None) != (prev is None):
+                return True
+            if value is not None and abs(float(value) - float(prev)) >= self.deadband:
+                return True
+        return False
+
+    def filter(self, power_rows: List[Dict[str, Any]], conn=None) -> List[Dict[str, Any]]:
+        """
+        Devuelve solo las lecturas que hay que escribir. Los fallos de caché
+        se completan desde ont_last_power con `conn` (transacción en curso).
+        """
+        if not self.enabled or not power_rows:
+            return power_rows
+        ids = [r["ont_id"] for r in power_rows]
+        last = self.store.get_many(ids)
+        misses = [oid for oid in ids if oid not in last]
+        if misses and conn is not None:
+            last.update({
+                oid: (_epoch(ts), ptx, prx, status)
+                for oid, ts, ptx, prx, status in conn.execute(_LAST_WRITTEN, {"ids": misses})
+            })
+        return [
+            r for r in power_rows
+            if r["ont_id"] not in last or self._changed(r, last[r["ont_id"]])
+        ]
+
+    def remember(self, written_rows: List[Dict[str, Any]]) -> None:
+        """Registrar lo escrito; llamar solo tras el commit."""
+        if not self.enabled or not written_rows:
+            return
+        self.store.set_many({
+            r["ont_id"]: (_epoch(r["time"]), r["ptx"], r["prx"], r["status"])
+            for r in written_rows
+        })
+
+    def forget(self, ont_ids: List[int]) -> None:
+        """Olvidar ONTs borradas; llamar solo tras el commit."""
+        if not self.enabled or not ont_ids:
+            return
+        self.store.delete_many(ont_ids)
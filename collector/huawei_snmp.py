@@ -0,0 +1,262 @@
+# collector/huawei_snmp.py
+# ───────────────────────────────────────────────────────────────
+# Modo SNMP para Huawei MA56xxT (huawei_mode: snmp en olts.yaml).
+# • En lugar de "display ont info" por PON (páginas telnet en serie) +
+#   un GET SNMP por ONT y potencia, recorre con GETBULK las tablas de
+#   todo el chasis:
+#     - estado de ejecución   hwGponDeviceOntControlRunStatus  (46.1.15)
+#     - causa de la última caída hwGponDeviceOntControlLastDownCause (46.1.24)
+#     - número de serie       hwGponDeviceOntSn                (43.1.3)
+#     - descripción           hwGponDeviceOntDespt             (43.1.9)
+#     - Rx / Tx óptico        hwGponOntOpticalDdm*             (51.1.4 / 51.1.6)
+#   y las une en memoria por índice (ifIndex de la PON, nº de ONT).
+# • Devuelve los mismos dicts que jmq_olt_huawei.get_onts() (schema_fsp,
+#   id, sn, run_state, description, ptx, prx…), así normalize_huawei no
+#   cambia. run_state usa las mismas cadenas que el CLI: una ONT offline
+#   por LOS/LOSi/LOBi es "losi" y por dying-gasp "dyinggasp" (según la causa
+#   de la última caída). control_flag/config_state/match_state/protect_side
+#   no se leen por SNMP y quedan a None.
+# • No abre sesión CLI: la consola queda libre para provisión.
+# • Parámetros (olts.yaml > entorno):
+#     snmp_max_repetitions  HUAWEI_SNMP_MAX_REPETITIONS  (25)
+#     snmp_timeout          HUAWEI_SNMP_TIMEOUT          (2 s)
+#     snmp_retries          HUAWEI_SNMP_RETRIES          (1)
+# ───────────────────────────────────────────────────────────────
+
+from __future__ import annotations
+
+import os
+import asyncio
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    from pysnmp.hlapi.v3arch.asyncio import (
+        CommunityData,
+        ContextData,
+        ObjectIdentity,
+        ObjectType,
+        SnmpEngine,
+        UdpTransportTarget,
+        bulk_walk_cmd,
+    )
+    from pysnmp.proto.rfc1905 import EndOfMibView, NoSuchInstance, NoSuchObject
+    _EXCEPTION_VALUES = (EndOfMibView, NoSuchInstance, NoSuchObject)
+except ImportError:
+    SnmpEngine = None
+
+HUAWEI_MODE = os.getenv("HUAWEI_MODE", "cli").lower()
+HUAWEI_SNMP_MAX_REPETITIONS = int(os.getenv("HUAWEI_SNMP_MAX_REPETITIONS", "25"))
+HUAWEI_SNMP_TIMEOUT = float(os.getenv("HUAWEI_SNMP_TIMEOUT", "2"))
+HUAWEI_SNMP_RETRIES = int(os.getenv("HUAWEI_SNMP_RETRIES", "1"))
+
+_GPON = "1.3.6.1.4.1.2011.6.128.1.1.2"
+COLUMNS: Dict[str, str] = {
+    "run_state":   f"{_GPON}.46.1.15",
+    "down_cause":  f"{_GPON}.46.1.24",
+    "sn":          f"{_GPON}.43.1.3",
+    "description": f"{_GPON}.43.1.9",
+    "rx":          f"{_GPON}.51.1.4",
+    "tx":          f"{_GPON}.51.1.6",
+}
+
+# ifIndex de una PON GPON (misma fórmula que jmq_olt_huawei, frame 0)
+IFINDEX_BASE = 4194304000
+_RUN_STATES = {1: "online", 2: "offline"}
+# Causa de la última caída → run_state del CLI (el resto queda "offline")
+_DOWN_CAUSES = {1: "losi", 2: "losi", 13: "dyinggasp"}  # LOS, LOSi/LOBi, dying-gasp
+_NO_VALUE = 2147483647
+
+
+class HuaweiSnmpError(Exception):
+    pass
+
+
+def snmp_mode(cfg: Dict[str, Any]) -> bool:
+    return cfg["vendor"] == "huawei" and str(cfg.get("huawei_mode", HUAWEI_MODE)).lower() == "snmp"
+
+
+def pon_ifindex(slot: int, port: int) -> int:
+    return IFINDEX_BASE + int(port) * 256 + int(slot) * 8192
+
+
+def split_ifindex(ifindex: int) -> Tuple[int, int]:
+    """ifIndex → (slot, port)."""
+    slot, rest = divmod(int(ifindex) - IFINDEX_BASE, 8192)
+    return slot, rest // 256
+
+
+# Escalas y centinelas como jmq_olt_huawei (continuidad de las series)
+def tx_dbm(raw: Any) -> Any:
+    try:
+        val = int(raw)
+    except (TypeError, ValueError):
+        return ""
+    power = round(val / 1000, 2)
+    return "" if val == _NO_VALUE or power == -0.0 else power
+
+
+def rx_dbm(raw: Any) -> Any:
+    try:
+        val = int(raw)
+    except (TypeError, ValueError):
+        return ""
+    power = round(val / 100, 2)
+    return "" if val == _NO_VALUE or power == -0.01 else power
+
+
+def _text(raw: Any) -> Optional[str]:
+    if raw is None:
+        return None
+    if hasattr(raw, "asOctets"):
+        return raw.asOctets().decode("utf-8", "replace").strip() or None
+    return str(raw).strip() or None
+
+
+def _serial(raw: Any) -> Optional[str]:
+    # El CLI muestra el SN como 16 dígitos hex (4857544312345678)
+    if raw is None:
+        return None
+    if hasattr(raw, "asOctets"):
+        return raw.asOctets().hex().upper()
+    return str(raw)
+
+
+def join_tables(
+    tables: Dict[str, Dict[Tuple[int, int], Any]],
+    pons: Optional[Iterable[Tuple[int, int]]] = None,
+) -> List[dict]:
+    """
+    Une las columnas por (ifIndex, nº ONT). El inventario lo marca la tabla
+    de números de serie: toda ONT configurada tiene SN. Con `pons` se
+    descartan las PONs que no estén en la lista (slot, port).
+    """
+    wanted = {pon_ifindex(s, p) for s, p in pons} if pons else None
+    run, desc = tables.get("run_state", {}), tables.get("description", {})
+    down = tables.get("down_cause", {})
+    rx, tx = tables.get("rx", {}), tables.get("tx", {})
+
+    onts: List[dict] = []
+    for key in sorted(tables.get("sn", {})):
+        ifindex, ont_id = key
+        if wanted is not None and ifindex not in wanted:
+            continue
+        slot, port = split_ifindex(ifindex)
+        raw_state = run.get(key)
+        state = _RUN_STATES.get(int(raw_state), str(raw_state)) if raw_state is not None else None
+        if state == "offline" and down.get(key) is not None:
+            state = _DOWN_CAUSES.get(int(down[key]), state)
+        online = state == "online"
+        onts.append({
+            "id":           ont_id,
+            "schema_fsp":   f"0/{slot}/{port}",
+            "sn":           _serial(tables["sn"][key]),
+            "control_flag": None,
+            "run_state":    state,
+            "config_state": None,
+            "match_state":  None,
+            "protect_side": None,
+            "description":  _text(desc.get(key)),
+            "ptx":          tx_dbm(tx.get(key)) if online else "",
+            "prx":          rx_dbm(rx.get(key)) if online else "",
+        })
+    return onts
+
+
+class HuaweiSnmpClient:
+    """
+    Cliente Huawei solo-SNMP con la interfaz que usa el collector:
+    connect() / disconnect() / close() no hacen nada (no hay sesión CLI).
+    """
+
+    def __init__(self, cfg: Dict[str, Any]):
+        if SnmpEngine is None:
+            raise ImportError("pysnmp no instalado (huawei_mode: snmp)")
+        self.olt_id = cfg["id"]
+        self.host = cfg.get("snmp_ip") or cfg["host"]
+        self.port = int(cfg.get("snmp_port") or 161)
+        self.community = str(cfg.get("snmp_community") or "public")
+        self.max_repetitions = max(1, int(cfg.get("snmp_max_repetitions", HUAWEI_SNMP_MAX_REPETITIONS)))
+        self.timeout = float(cfg.get("snmp_timeout", HUAWEI_SNMP_TIMEOUT))
+        self.retries = int(cfg.get("snmp_retries", HUAWEI_SNMP_RETRIES))
+
+    def connect(self) -> None:
+        pass
+
+    def disconnect(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    async def _walk(self, engine, transport, root: str) -> Dict[Tuple[int, ...], Any]:
+        """GETBULK sobre un subárbol → {sufijo del índice: valor}."""
+        prefix = len(root.split("."))
+        out: Dict[Tuple[int, ...], Any] = {}
+        async for err_ind, err_status, err_index, var_binds in bulk_walk_cmd(
+            engine,
+            CommunityData(self.community),
+            transport,
+            ContextData(),
+            0,
+            self.max_repetitions,
+            ObjectType(ObjectIdentity(root)),
+            lexicographicMode=False,
+            lookupMib=False,
+        ):
+            if err_ind or err_status:
+                # Una tabla a medias es un escaneo truncado: mejor abortar
+                raise HuaweiSnmpError(
+                    f"{self.olt_id}: walk {root} → {err_ind or err_status.prettyPrint()}"
+                )
+            for name, value in var_binds:
+                if isinstance(value, _EXCEPTION_VALUES):
+                    continue
+                out[tuple(name)[prefix:]] = value
+        return out
+
+    async def walk_onts(
+        self,
+        pon_list: Optional[List[Dict[str, Any]]] = None,
+        targeted: bool = False,
+    ) -> List[dict]:
+        """
+        ONTs del chasis (o de `pon_list`). Por defecto cada columna es un
+        único walk del chasis completo; con `targeted` (re-escaneo de pocas
+        PONs) se recorre solo el subárbol de cada PON.
+        """
+        pons = [(int(p["slot"]), int(p["port"])) for p in (pon_list or [])]
+        if targeted and pons:
+            roots = [
+                (column, f"{oid}.{pon_ifindex(slot, port)}")
+                for column, oid in COLUMNS.items()
+                for slot, port in pons
+            ]
+        else:
+            roots = list(COLUMNS.items())
+
+        # Un motor por sondeo (su dispatcher queda ligado al bucle asyncio en
+        # que se crea); se cierra siempre para no dejar el socket UDP abierto
+        engine = SnmpEngine()
+        try:
+            transport = await UdpTransportTarget.create(
+                (self.host, self.port), timeout=self.timeout, retries=self.retries,
+            )
+            walks = await asyncio.gather(*(self._walk(engine, transport, root) for _, root in roots))
+        finally:
+            engine.close_dispatcher()
+
+        tables: Dict[str, Dict[Tuple[int, int], Any]] = {c: {} for c in COLUMNS}
+        for (column, root), rows in zip(roots, walks):
+            base = tuple(int(x) for x in root.split("."))[len(COLUMNS[column].split(".")):]
+            for suffix, value in rows.items():
+                index = base + suffix
+                if len(index) == 2:
+                    tables[column][index] = value
+
+        onts = join_tables(tables, pons)
+        logging.debug(
+            "Huawei SNMP %s: %d ONTs en %d walks (max-repetitions=%d)",
+            self.olt_id, len(onts), len(roots), self.max_repetitions,
+        )
+        return onts
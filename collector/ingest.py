@@ -0,0 +1,284 @@
+# collector/ingest.py
+# ───────────────────────────────────────────────────────────────
+# • Upsert set-based de ont (un único statement con RETURNING)
+# • Reconciliación de ONTs desaparecidas (anti-join + borrado diferido)
+# • Escritura de lecturas en ont_power
+# • Última lectura por ONT en ont_last_power (upsert en la misma transacción)
+# • Dos caminos seleccionables por POWER_WRITE_MODE:
+#     - "insert": executemany de INSERT (camino histórico)
+#     - "copy":   COPY ont_power FROM STDIN (psycopg2 copy_expert)
+# • Si COPY no está disponible o falla se cae al INSERT dentro
+#   de la misma transacción (SAVEPOINT).
+# Sin efectos al importar: lo usan tasks.py y los benchmarks.
+# ───────────────────────────────────────────────────────────────
+
+from __future__ import annotations
+
+import io
+import os
+import logging
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from normalize import OntRow
+
+POWER_WRITE_MODE = os.getenv("POWER_WRITE_MODE", "insert").strip().lower()
+
+_INSERT_POWER = text("""
+    INSERT INTO ont_power(time, ont_id, ptx, prx, status)
+    VALUES (:time, :ont_id, :ptx, :prx, :status)
+""")
+
+_COPY_POWER = "COPY ont_power(time, ont_id, ptx, prx, status) FROM STDIN"
+
+# Upsert de todas las ONTs de una OLT en un solo round trip:
+#  - `upd` actualiza las existentes (no dispara trg_ont_set_pon_id, que solo
+#    escucha UPDATE OF vendor_ont_id/olt_id)
+#  - `ins` inserta únicamente las nuevas; así el trigger BEFORE INSERT solo
+#    corre donde hace falta. ON CONFLICT cubre la carrera con otro insert.
+# Ambos CTE ven la misma instantánea, por eso el NOT EXISTS de `ins` excluye
+# las filas que `upd` está actualizando.
+_UPSERT_ONTS = text("""
+    WITH u AS (
+        SELECT *
+        FROM unnest(
+            CAST(:vids     AS text[]),
+            CAST(:serials  AS text[]),
+            CAST(:models   AS text[]),
+            CAST(:descs    AS text[]),
+            CAST(:statuses AS int[]),
+            CAST(:props    AS text[])
+        ) AS u(vendor_ont_id, serial, model, description, status, props)
+    ),
+    upd AS (
+        UPDATE ont AS o
+           SET status = u.status,
+               props  = CAST(u.props AS jsonb)
+          FROM u
+         WHERE o.olt_id = :olt_id
+           AND o.vendor_ont_id = u.vendor_ont_id
+        RETURNING o.vendor_ont_id, o.id
+    ),
+    ins AS (
+        INSERT INTO ont(olt_id, vendor_ont_id, serial, model, description, status, props)
+        SELECT :olt_id, u.vendor_ont_id, u.serial, u.model, u.description,
+               u.status, CAST(u.props AS jsonb)
+          FROM u
+         WHERE NOT EXISTS (
+                SELECT 1 FROM ont AS o
+                 WHERE o.olt_id = :olt_id
+                   AND o.vendor_ont_id = u.vendor_ont_id
+               )
+        ON CONFLICT (olt_id, vendor_ont_id)
+          DO UPDATE SET
+            status = EXCLUDED.status,
+            props  = EXCLUDED.props
+        RETURNING vendor_ont_id, id
+    )
+    SELECT vendor_ont_id, id FROM upd
+    UNION ALL
+    SELECT vendor_ont_id, id FROM ins
+""")
+
+
+def upsert_onts(conn: Connection, olt_id: str, rows: List[OntRow]) -> Dict[str, int]:
+    """
+    Upsert de las ONTs de una OLT y devuelve el mapping vendor_ont_id → ont.id.
+    `rows` no debe repetir vendor_ont_id (UPDATE … FROM con duplicados es
+    ambiguo); poll_single_olt ya deduplica quedándose con la última.
+    """
+    if not rows:
+        return {}
+    params = {
+        "olt_id":   olt_id,
+        "vids":     [r.vendor_ont_id for r in rows],
+        "serials":  [r.serial for r in rows],
+        "models":   [r.model for r in rows],
+        "descs":    [r.description for r in rows],
+        "statuses": [r.status for r in rows],
+        "props":    [r.props for r in rows],
+    }
+    return dict(conn.execute(_UPSERT_ONTS, params).all())
+
+
+# Reconciliación: los ids del escaneo viajan como un único array (no como
+# literal IN (…) expandido) y se cruzan por anti-join. Cada ONT ausente suma
+# un sondeo a missing_polls; las que reaparecen vuelven a 0. Las ONTs de las
+# PONs retenidas (:hold, escaneo sospechoso en ellas) ni se marcan ni se borran.
+_MARK_MISSING = text("""
+    WITH cur AS (
+        SELECT DISTINCT vid FROM unnest(CAST(:vids AS text[])) AS s(vid)
+    ),
+    missing AS (
+        UPDATE ont AS o
+           SET missing_polls = o.missing_polls + 1
+         WHERE o.olt_id = :olt_id
+           AND COALESCE(o.pon_id, '') <> ALL(CAST(:hold AS text[]))
+           AND NOT EXISTS (SELECT 1 FROM cur WHERE cur.vid = o.vendor_ont_id)
+        RETURNING 1
+    ),
+    back AS (
+        UPDATE ont AS o
+           SET missing_polls = 0
+          FROM cur
+         WHERE o.olt_id = :olt_id
+           AND o.missing_polls > 0
+           AND o.vendor_ont_id = cur.vid
+        RETURNING 1
+    )
+    SELECT (SELECT count(*) FROM missing), (SELECT count(*) FROM back)
+""")
+
+# Borrado por lotes: ont_power cae en cascada, así que cada sondeo borra
+# como mucho :batch ONTs y el resto espera al siguiente.
+_DELETE_MISSING = text("""
+    DELETE FROM ont
+     WHERE id IN (
+            SELECT id FROM ont
+             WHERE olt_id = :olt_id
+               AND missing_polls >= :after
+               AND COALESCE(pon_id, '') <> ALL(CAST(:hold AS text[]))
+             ORDER BY missing_polls DESC, id
+             LIMIT :batch
+           )
+    RETURNING vendor_ont_id, id
+""")
+
+
+def reconcile_missing(
+    conn: Connection,
+    olt_id: str,
+    vids: List[str],
+    after: int,
+    batch: int,
+    hold_pons: Sequence[str] = (),
+) -> Tuple[int, int, Dict[str, int]]:
+    """
+    Marca las ONTs de la OLT que no están en `vids` y borra (hasta `batch`)
+    las que llevan `after` sondeos seguidos sin aparecer, salvo las de
+    `hold_pons` (ont.pon_id, '' = sin PON).
+    Devuelve (ausentes en este sondeo, reaparecidas, {vendor_ont_id: ont.id}
+    de las borradas).
+    """
+    hold = list(hold_pons)
+    missing, back = conn.execute(_MARK_MISSING, {
+        "olt_id": olt_id, "vids": vids, "hold": hold,
+    }).one()
+    deleted: Dict[str, int] = {}
+    if missing:
+        deleted = dict(conn.execute(_DELETE_MISSING, {
+            "olt_id": olt_id, "after": after, "batch": batch, "hold": hold,
+        }).all())
+    return int(missing), int(back), deleted
+
+
+# Última lectura por ONT: la API la cruza directamente (sin DISTINCT ON
+# sobre el hypertable). El WHERE descarta lecturas más antiguas que la
+# guardada (replay del spool, writers de la cola fuera de orden).
+_UPSERT_LAST_POWER = text("""
+    INSERT INTO ont_last_power(ont_id, time, ptx, prx, status)
+    SELECT *
+      FROM unnest(
+            CAST(:ont_ids  AS bigint[]),
+            CAST(:times    AS timestamptz[]),
+            CAST(:ptx      AS numeric[]),
+            CAST(:prx      AS numeric[]),
+            CAST(:statuses AS int[])
+           )
+    ON CONFLICT (ont_id) DO UPDATE SET
+        time   = EXCLUDED.time,
+        ptx    = EXCLUDED.ptx,
+        prx    = EXCLUDED.prx,
+        status = EXCLUDED.status
+     WHERE EXCLUDED.time > ont_last_power.time
+""")
+
+
+def upsert_last_power(conn: Connection, power_rows: List[Dict[str, Any]]) -> int:
+    """
+    Actualiza ont_last_power con la lectura más reciente de cada ONT de
+    `power_rows` (un único statement; ON CONFLICT no admite ont_id repetidos).
+    """
+    latest: Dict[int, Dict[str, Any]] = {}
+    for r in power_rows:
+        prev = latest.get(r["ont_id"])
+        if prev is None or r["time"] >= prev["time"]:
+            latest[r["ont_id"]] = r
+    if not latest:
+        return 0
+    rows = list(latest.values())
+    conn.execute(_UPSERT_LAST_POWER, {
+        "ont_ids":  [r["ont_id"] for r in rows],
+        "times":    [r["time"] for r in rows],
+        "ptx":      [r["ptx"] for r in rows],
+        "prx":      [r["prx"] for r in rows],
+        "statuses": [r["status"] for r in rows],
+    })
+    return len(rows)
+
+
+def _copy_value(val: Any) -> str:
+    # Formato text de COPY: NULL = \N ; nuestros valores no llevan tabs/saltos
+    if val is None:
+        return r"\N"
+    if hasattr(val, "isoformat"):
+        return val.isoformat()
+    return str(val)
+
+
+def _power_copy_buffer(power_rows: Iterable[Dict[str, Any]]) -> io.StringIO:
+    buf = io.StringIO()
+    write = buf.write
+    for r in power_rows:
+        write(
+            f"{_copy_value(r['time'])}\t{r['ont_id']}\t{_copy_value(r['ptx'])}"
+            f"\t{_copy_value(r['prx'])}\t{_copy_value(r['status'])}\n"
+        )
+    buf.seek(0)
+    return buf
+
+
+def insert_power_rows(conn: Connection, power_rows: List[Dict[str, Any]]) -> int:
+    """Camino histórico: executemany de un INSERT por lectura."""
+    if not power_rows:
+        return 0
+    conn.execute(_INSERT_POWER, power_rows)
+    return len(power_rows)
+
+
+def copy_power_rows(conn: Connection, power_rows: List[Dict[str, Any]]) -> int:
+    """
+    COPY FROM STDIN sobre la conexión DBAPI de la transacción en curso.
+    Lanza AttributeError si el driver no expone copy_expert (psycopg2).
+    """
+    if not power_rows:
+        return 0
+    cursor = conn.connection.cursor()
+    try:
+        cursor.copy_expert(_COPY_POWER, _power_copy_buffer(power_rows))
+    finally:
+        cursor.close()
+    return len(power_rows)
+
+
+def write_power_rows(
+    conn: Connection,
+    power_rows: List[Dict[str, Any]],
+    mode: str = POWER_WRITE_MODE,
+) -> int:
+    """
+    Persiste las lecturas con el camino configurado. En modo "copy" se
+    envuelve el COPY en un SAVEPOINT para poder reintentar con INSERT sin
+    perder el resto de la transacción (upserts de ont ya hechos).
+    """
+    if mode != "copy" or not power_rows:
+        return insert_power_rows(conn, power_rows)
+
+    try:
+        with conn.begin_nested():
+            return copy_power_rows(conn, power_rows)
+    except Exception as exc:
+        logging.warning("COPY ont_power falló (%s); se usa INSERT", exc)
+        return insert_power_rows(conn, power_rows)
@@ -0,0 +1,202 @@
+# collector/ingest_queue.py
+# ───────────────────────────────────────────────────────────────
+# Cola de escritura entre el escaneo y la persistencia.
+# • INGEST_MODE=inline (por defecto): cada sondeo escribe en su propia
+#   transacción, como siempre.
+# • INGEST_MODE=queue: el sondeo normaliza y encola el escaneo en Redis;
+#   la tarea drain_ingest_queue (cola Celery "ingest") lo escribe en lotes
+#   de varias OLTs por transacción. La sesión con la OLT queda libre en
+#   cuanto termina el escaneo, sin esperar a PostgreSQL.
+# • INGEST_SHARDS listas `collector:ingest:<n>`; cada OLT va siempre al
+#   mismo shard (crc32) y cada shard tiene un único writer a la vez
+#   (lock en Redis, lease renovado mientras vacía) → se conserva el orden
+#   de escaneos por OLT.
+# • Entrega "al menos una vez": pop_batch mueve el lote (LMOVE) a la lista
+#   `collector:ingest:processing:<n>` y ack_batch la vacía solo cuando el
+#   lote está escrito, en el spool o en dead. Si el writer muere antes, el
+#   siguiente writer del shard reprocesa ese lote antes que la cola.
+# • Backpressure: si el shard supera INGEST_QUEUE_MAX escaneos, enqueue
+#   espera hasta INGEST_BACKPRESSURE_TIMEOUT s y, si sigue lleno, devuelve
+#   False para que el sondeo escriba en línea.
+# • Un escaneo que no se puede escribir ni solo va a `collector:ingest:dead`.
+# ───────────────────────────────────────────────────────────────
+
+from __future__ import annotations
+
+import os
+import json
+import time
+import zlib
+import logging
+import datetime as dt
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from locks import LeaseRenewer
+from metrics import incr, observe
+from normalize import OntRow
+from redis_conn import get_redis
+
+INGEST_MODE = os.getenv("INGEST_MODE", "inline").strip().lower()
+INGEST_SHARDS = max(1, int(os.getenv("INGEST_SHARDS", "4")))
+INGEST_QUEUE_MAX = int(os.getenv("INGEST_QUEUE_MAX", "200"))
+INGEST_BACKPRESSURE_TIMEOUT = float(os.getenv("INGEST_BACKPRESSURE_TIMEOUT", "10"))
+# Escaneos (OLTs) por transacción del writer
+INGEST_BATCH = max(1, int(os.getenv("INGEST_BATCH", "20")))
+INGEST_FLUSH_INTERVAL = float(os.getenv("INGEST_FLUSH_INTERVAL", "2"))
+# Lease del writer de cada shard (renovado cada TTL/3 mientras vacía)
+INGEST_WRITER_TTL = float(os.getenv("INGEST_WRITER_TTL", "60"))
+
+_QUEUE_PREFIX = "collector:ingest:"
+_WRITER_PREFIX = "collector:ingest:writer:"
+_PROCESSING_PREFIX = "collector:ingest:processing:"
+DEAD_KEY = "collector:ingest:dead"
+_DEAD_MAX = 100
+
+# Segundos entre encolado y escritura
+LAG_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def shard_for(olt_id: str) -> int:
+    return zlib.crc32(olt_id.encode()) % INGEST_SHARDS
+
+
+def queue_key(shard: int) -> str:
+    return f"{_QUEUE_PREFIX}{shard}"
+
+
+def processing_key(shard: int) -> str:
+    return f"{_PROCESSING_PREFIX}{shard}"
+
+
+def encode_scan(
+    olt_id: str, vendor: str, ts: dt.datetime, rows: List[OntRow], reconcile: bool = True,
+    hold_pons: Sequence[str] = (),
+) -> str:
+    # OntRow → lista posicional: menos bytes que dicts
+    return json.dumps({
+        "olt_id": olt_id,
+        "vendor": vendor,
+        "time": ts.isoformat(),
+        "reconcile": reconcile,
+        "hold_pons": list(hold_pons),
+        "enqueued": time.time(),
+        "rows": rows,
+    }, separators=(",", ":"))
+
+
+def decode_scan(payload: Dict[str, Any]) -> Tuple[dt.datetime, List[OntRow]]:
+    return (
+        dt.datetime.fromisoformat(payload["time"]),
+        [OntRow(*values) for values in payload["rows"]],
+    )
+
+
+def enqueue_scan(
+    olt_id: str, vendor: str, ts: dt.datetime, rows: List[OntRow], reconcile: bool = True,
+    hold_pons: Sequence[str] = (),
+) -> bool:
+    """
+    Encola el escaneo para los writers. False si la cola sigue llena tras
+    INGEST_BACKPRESSURE_TIMEOUT o Redis no responde (el llamante escribe en línea).
+    """
+    key = queue_key(shard_for(olt_id))
+    data = encode_scan(olt_id, vendor, ts, rows, reconcile, hold_pons)
+    deadline = time.monotonic() + INGEST_BACKPRESSURE_TIMEOUT
+    try:
+        redis = get_redis()
+        while redis.llen(key) >= INGEST_QUEUE_MAX:
+            if time.monotonic() >= deadline:
+                incr("collector_ingest_backpressure_total", olt_id=olt_id)
+                logging.warning("OLT %s → cola de escritura llena (%s), se escribe en línea", olt_id, key)
+                return False
+            time.sleep(0.2)
+        redis.rpush(key, data)
+    except Exception as exc:
+        logging.warning("OLT %s → no se pudo encolar el escaneo (%s), se escribe en línea", olt_id, exc)
+        return False
+    incr("collector_ingest_enqueued_total", olt_id=olt_id)
+    return True
+
+
+def pop_batch(shard: int, size: int = INGEST_BATCH) -> List[Dict[str, Any]]:
+    """
+    Saca hasta `size` escaneos del shard en orden FIFO y los deja en la
+    lista de proceso hasta ack_batch. Si esa lista no está vacía (writer
+    anterior caído o lote sin ack), devuelve ese lote otra vez.
+    """
+    redis = get_redis()
+    key, processing = queue_key(shard), processing_key(shard)
+    raw = redis.lrange(processing, 0, -1)
+    if raw:
+        incr("collector_ingest_redelivered_total", shard=shard)
+        logging.warning("Cola de escritura: shard %d → %d escaneos sin confirmar, se reprocesan",
+                        shard, len(raw))
+    else:
+        pipe = redis.pipeline(transaction=True)
+        for _ in range(size):
+            pipe.lmove(key, processing, "LEFT", "RIGHT")
+        raw = [item for item in pipe.execute() if item is not None]
+    out: List[Dict[str, Any]] = []
+    for item in raw:
+        try:
+            out.append(json.loads(item))
+        except ValueError:
+            logging.error("Cola de escritura: payload ilegible descartado")
+            dead_letter(item)
+    return out
+
+
+def ack_batch(shard: int) -> None:
+    """El lote de pop_batch ya está escrito (o en el spool / dead): se olvida."""
+    get_redis().delete(processing_key(shard))
+
+
+def dead_letter(data: Any) -> None:
+    try:
+        raw = data if isinstance(data, str) else json.dumps(data, separators=(",", ":"))
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.lpush(DEAD_KEY, raw)
+        pipe.ltrim(DEAD_KEY, 0, _DEAD_MAX - 1)
+        pipe.execute()
+    except Exception as exc:
+        logging.warning("Cola de escritura: no se pudo guardar el payload fallido (%s)", exc)
+
+
+def observe_lag(payload: Dict[str, Any], now: Optional[float] = None) -> None:
+    now = time.time() if now is None else now
+    observe(
+        "collector_ingest_lag_seconds",
+        max(0.0, now - float(payload.get("enqueued", now))),
+        LAG_BUCKETS,
+        olt_id=payload["olt_id"],
+    )
+
+
+@contextmanager
+def writer_lock(shard: int) -> Iterator[bool]:
+    """
+    True si este proceso es el writer del shard. El lease se renueva
+    mientras dura el bloque, así un vaciado largo no deja entrar a otro.
+    """
+    # thread_local=False: el token debe verse desde el hilo renovador
+    lock = get_redis().lock(
+        f"{_WRITER_PREFIX}{shard}",
+        timeout=INGEST_WRITER_TTL,
+        blocking=False,
+        thread_local=False,
+    )
+    if not lock.acquire():
+        yield False
+        return
+    renewer = LeaseRenewer(lock, f"Cola de escritura: shard {shard}", INGEST_WRITER_TTL)
+    renewer.start()
+    try:
+        yield True
+    finally:
+        renewer.stop()
+        try:
+            lock.release()
+        except Exception:
+            logging.debug("Cola de escritura: lock del shard %d ya caducado", shard)
+
@@ -0,0 +1,122 @@
+# collector/locks.py
+# ───────────────────────────────────────────────────────────────
+# Lock distribuido por OLT para que dos sondeos de la misma OLT
+# nunca se solapen (dos sesiones telnet → UserBusyError).
+# • Lease en Redis (SET NX PX) de POLL_LOCK_TTL segundos, renovado por un
+#   hilo mientras dura el sondeo; si el worker muere, el lease caduca solo.
+# • POLL_OVERLAP:
+#     - skip:     la ejecución solapada se descarta
+#     - coalesce: además se marca la OLT como "pendiente" y quien tiene el
+#                 lock relanza UN sondeo al terminar (N solapes → 1 sondeo)
+# ───────────────────────────────────────────────────────────────
+
+from __future__ import annotations
+
+import os
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+from redis.exceptions import LockError
+
+from config import env_bool
+from metrics import incr
+from redis_conn import get_redis
+
+POLL_LOCK_ENABLED = env_bool("POLL_LOCK_ENABLED", default=True)
+POLL_LOCK_TTL = float(os.getenv("POLL_LOCK_TTL", "60"))
+POLL_OVERLAP = os.getenv("POLL_OVERLAP", "skip").strip().lower()
+
+_LOCK_PREFIX = "collector:lock:poll:"
+_PENDING_PREFIX = "collector:pending:poll:"
+
+
+class LeaseRenewer(threading.Thread):
+    """
+    Renueva el lease cada TTL/3 hasta que se detiene. El lock debe crearse
+    con thread_local=False. `label` identifica al dueño en los logs.
+    """
+
+    def __init__(self, lock, label: str, ttl: float = POLL_LOCK_TTL):
+        super().__init__(name=f"lease-{label}", daemon=True)
+        self.lock = lock
+        self.label = label
+        self.ttl = ttl
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        interval = max(1.0, self.ttl / 3.0)
+        while not self.stopped.wait(interval):
+            try:
+                self.lock.reacquire()
+            except LockError:
+                logging.warning("%s → lease perdido antes de terminar", self.label)
+                return
+            except Exception as exc:
+                logging.warning("%s → no se pudo renovar el lease: %s", self.label, exc)
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.join(timeout=5)
+
+
+@contextmanager
+def olt_poll_lock(olt_id: str) -> Iterator[bool]:
+    """
+    Context manager que devuelve True si este proceso tiene el lock de la OLT
+    (o si el lock está desactivado / Redis no responde) y False si otro
+    sondeo de la misma OLT sigue en curso.
+    """
+    if not POLL_LOCK_ENABLED:
+        yield True
+        return
+
+    redis = get_redis()
+    # thread_local=False: el token debe verse desde el hilo renovador
+    lock = redis.lock(
+        f"{_LOCK_PREFIX}{olt_id}",
+        timeout=POLL_LOCK_TTL,
+        blocking=False,
+        thread_local=False,
+    )
+    try:
+        acquired = lock.acquire()
+    except Exception as exc:
+        logging.warning("OLT %s → lock no disponible (%s), se sondea sin lock", olt_id, exc)
+        yield True
+        return
+
+    if not acquired:
+        incr("collector_poll_skipped_total", olt_id=olt_id)
+        if POLL_OVERLAP == "coalesce":
+            try:
+                redis.set(f"{_PENDING_PREFIX}{olt_id}", "1", ex=int(POLL_LOCK_TTL * 10))
+            except Exception:
+                logging.debug("OLT %s → no se pudo marcar sondeo pendiente", olt_id)
+        logging.warning("OLT %s → sondeo anterior en curso, ejecución omitida", olt_id)
+        yield False
+        return
+
+    renewer = LeaseRenewer(lock, f"OLT {olt_id}")
+    renewer.start()
+    try:
+        yield True
+    finally:
+        renewer.stop()
+        try:
+            lock.release()
+        except LockError:
+            logging.warning("OLT %s → lease caducado antes de liberar el lock", olt_id)
+        except Exception as exc:
+            logging.warning("OLT %s → error liberando lock: %s", olt_id, exc)
+
+
+def pop_pending(olt_id: str) -> bool:
+    """True si hubo ejecuciones solapadas pendientes (modo coalesce)."""
+    if POLL_OVERLAP != "coalesce":
+        return False
+    try:
+        return bool(get_redis().delete(f"{_PENDING_PREFIX}{olt_id}"))
+    except Exception:
+        return False
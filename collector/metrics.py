@@ -0,0 +1,198 @@
+# collector/metrics.py
+# ───────────────────────────────────────────────────────────────
+# Métricas del collector compartidas entre procesos del worker.
+# • Backend "redis" (por defecto): HINCRBYFLOAT sobre un hash único,
+#   así todos los hijos prefork (y varios workers) suman en el mismo sitio.
+# • Backend "memory": dict local (útil en desarrollo / benchmarks).
+# • Backend "none": desactivado.
+# • Contadores (incr) e histogramas (observe) con labels; StageTimer mide
+#   las etapas de un sondeo y las vuelca a histograma + log estructurado.
+# • Exposición en formato texto de Prometheus (METRICS_PORT, /metrics).
+# Las métricas nunca deben romper un sondeo: los errores se ignoran.
+# ───────────────────────────────────────────────────────────────
+
+from __future__ import annotations
+
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from redis_conn import get_redis
+
+METRICS_BACKEND = os.getenv("METRICS_BACKEND", "redis").strip().lower()
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+COUNTERS_KEY = "collector:metrics:counters"
+
+# Segundos: cubre desde una PON rápida hasta un 1240XA con timeout 120 s
+STAGE_BUCKETS: Tuple[float, ...] = (
+    0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600,
+)
+
+_lock = threading.Lock()
+_local_counters: Dict[str, float] = {}
+
+
+def _label_value(value: object) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def series_key(name: str, labels: Dict[str, object]) -> str:
+    """Nombre de serie en formato Prometheus: name{k="v",…} (labels ordenados)."""
+    if not labels:
+        return name
+    inner = ",".join(f'{k}="{_label_value(v)}"' for k, v in sorted(labels.items()))
+    return f"{name}{{{inner}}}"
+
+
+def _incr_many(values: Dict[str, float]) -> None:
+    if METRICS_BACKEND == "memory":
+        with _lock:
+            for key, value in values.items():
+                _local_counters[key] = _local_counters.get(key, 0.0) + value
+        return
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for key, value in values.items():
+            pipe.hincrbyfloat(COUNTERS_KEY, key, value)
+        pipe.execute()
+    except Exception as exc:
+        logging.debug("metrics: escritura falló (%s)", exc)
+
+
+def incr(name: str, value: float = 1.0, **labels: object) -> None:
+    if METRICS_BACKEND == "none" or not value:
+        return
+    _incr_many({series_key(name, labels): value})
+
+
+def observe(
+    name: str,
+    value: float,
+    buckets: Tuple[float, ...] = STAGE_BUCKETS,
+    **labels: object,
+) -> None:
+    """Histograma Prometheus: buckets acumulativos + _sum + _count."""
+    if METRICS_BACKEND == "none":
+        return
+    values = {
+        series_key(f"{name}_bucket", {**labels, "le": le}): 1.0
+        for le in buckets if value <= le
+    }
+    values[series_key(f"{name}_bucket", {**labels, "le": "+Inf"})] = 1.0
+    values[series_key(f"{name}_sum", labels)] = value
+    values[series_key(f"{name}_count", labels)] = 1.0
+    _incr_many(values)
+
+
+def counters() -> Dict[str, float]:
+    if METRICS_BACKEND == "memory":
+        with _lock:
+            return dict(_local_counters)
+    if METRICS_BACKEND == "none":
+        return {}
+    return {k: float(v) for k, v in get_redis().hgetall(COUNTERS_KEY).items()}
+
+
+class StageTimer:
+    """
+    Cronometra las etapas de un sondeo:
+
+        timer = StageTimer(olt_id="x", vendor="huawei")
+        with timer.stage("scan"):
+            ...
+        timer.log()
+    """
+
+    METRIC = "collector_poll_stage_seconds"
+
+    def __init__(self, **labels: object):
+        self.labels = labels
+        self.timings: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - t0
+            self.timings[name] = self.timings.get(name, 0.0) + elapsed
+            observe(self.METRIC, elapsed, stage=name, **self.labels)
+
+    def count(self, name: str, value: float) -> None:
+        incr(name, value, **self.labels)
+
+    def log(self, **extra: object) -> None:
+        # key=value en una línea: se filtra/parsea fácil en Loki/ELK
+        fields = " ".join(f"{k}={v}" for k, v in {**self.labels, **extra}.items())
+        stages = " ".join(f"{k}={v:.3f}" for k, v in self.timings.items())
+        logging.info("poll_stages %s total=%.3f %s", fields, sum(self.timings.values()), stages)
+
+
+# ── Exposición Prometheus ───────────────────────────────────
+def _metric_base(series: str) -> Tuple[str, str]:
+    name = series.split("{", 1)[0]
+    for suffix in ("_bucket", "_sum", "_count"):
+        if name.endswith(suffix):
+            return name[: -len(suffix)], "histogram"
+    return name, "counter" if name.endswith("_total") else "gauge"
+
+
+def render() -> str:
+    groups: Dict[str, List[str]] = {}
+    types: Dict[str, str] = {}
+    for series, value in sorted(counters().items()):
+        base, kind = _metric_base(series)
+        types[base] = kind
+        groups.setdefault(base, []).append(f"{series} {value:g}")
+    out: List[str] = []
+    for base in sorted(groups):
+        out.append(f"# TYPE {base} {types[base]}")
+        out.extend(groups[base])
+    return "\n".join(out) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        try:
+            body = render().encode()
+        except Exception as exc:
+            self.send_error(503, str(exc))
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def start_http_server(port: int = METRICS_PORT) -> Optional[ThreadingHTTPServer]:
+    """Arranca /metrics en un hilo demonio (una vez por proceso principal)."""
+    if port <= 0 or METRICS_BACKEND == "none":
+        return None
+    try:
+        server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+    except OSError as exc:
+        logging.warning("metrics: no se pudo abrir el puerto %s (%s)", port, exc)
+        return None
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logging.info("Métricas Prometheus en :%s/metrics", port)
+    return server
+
+
+if __name__ == "__main__":
+    # Exportador independiente: python metrics.py
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    server = start_http_server()
+    if server is not None:
+        threading.Event().wait()
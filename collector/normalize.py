@@ -0,0 +1,227 @@
+# collector/normalize.py
+# ───────────────────────────────────────────────────────────────
+# Normalización de ONTs por vendor (dicts de las librerías → OntRow).
+# • Registro de normalizadores por vendor (@register); añadir un modelo
+#   de OLT es añadir una función, sin tocar poll_single_olt.
+# • Los nombres de campo alternativos ("ONT Rx" / "rx" / "Rx"…) se
+#   resuelven una vez por escaneo con la primera ONT; solo si una ONT no
+#   trae valor en la clave resuelta se busca otra vez para ella.
+# • Salida en tuplas compactas (OntRow); `time` es común a todo el escaneo
+#   y no se repite por fila.
+# Sin efectos al importar: lo usan tasks.py y los benchmarks.
+# ───────────────────────────────────────────────────────────────
+
+from __future__ import annotations
+
+import json
+import logging
+from json.encoder import encode_basestring_ascii
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence
+
+from config import STATUS_NORMALIZE
+
+UNKNOWN_STATUS = 98
+
+
+class OntRow(NamedTuple):
+    vendor_ont_id: str
+    ptx: float
+    prx: float
+    status: int
+    serial: Optional[str]
+    model: Optional[str]
+    description: Optional[str]
+    props: str  # JSON de metadatos
+
+
+Normalizer = Callable[[List[Dict[str, Any]]], List[OntRow]]
+
+NORMALIZERS: Dict[str, Normalizer] = {}
+
+_dumps = json.dumps
+# OntRow(*campos) pasa por un __new__ en Python; tuple.__new__ no
+_row = tuple.__new__
+
+
+def register(*vendors: str) -> Callable[[Normalizer], Normalizer]:
+    def deco(fn: Normalizer) -> Normalizer:
+        for vendor in vendors:
+            NORMALIZERS[vendor] = fn
+        return fn
+    return deco
+
+
+def normalize_scan(vendor: str, onts: List[Dict[str, Any]]) -> List[OntRow]:
+    try:
+        normalizer = NORMALIZERS[vendor]
+    except KeyError:
+        raise ValueError(f"Vendor {vendor} no soportado al procesar ONTs") from None
+    return normalizer(onts) if onts else []
+
+
+# ── Helpers ─────────────────────────────────────────────────
+def to_f(val: Any) -> float:
+    """Potencia en dBm ("-21.3 dBm", "-21.3", -21.3…) → float; 0.0 si no hay."""
+    if val is None:
+        return 0.0
+    if type(val) is float or type(val) is int:
+        return float(val)
+    try:
+        return float(str(val).replace(" dBm", "").strip())
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class _PowerField:
+    """
+    Potencia de una ONT: primera clave de `candidates` con valor. La clave
+    habitual se resuelve con la primera ONT del escaneo; las ONTs sin valor
+    en esa clave (o todas, si la muestra no trae ninguna) caen al camino
+    lento por ONT. Las cadenas ya convertidas se memorizan (se repiten mucho).
+    """
+
+    __slots__ = ("candidates", "key", "memo")
+
+    def __init__(self, candidates: Sequence[str], sample: Dict[str, Any]):
+        self.candidates = tuple(candidates)
+        self.key = next((k for k in self.candidates if k in sample), None)
+        self.memo: Dict[Any, float] = {}
+
+    def __call__(self, ont: Dict[str, Any]) -> float:
+        raw = ont.get(self.key) if self.key is not None else None
+        if not raw:
+            # Camino lento: esta ONT no trae la clave habitual del escaneo
+            # (o la muestra no traía ninguna); sin ninguna → 0.0
+            raw = next((ont[k] for k in self.candidates if ont.get(k)), None)
+        try:
+            return self.memo[raw]
+        except KeyError:
+            value = self.memo[raw] = to_f(raw)
+            return value
+        except TypeError:  # valor no hashable
+            return to_f(raw)
+
+
+def _js(value: Any) -> str:
+    """json.dumps(value) con atajo para cadenas (la mayoría de metadatos)."""
+    return encode_basestring_ascii(value) if type(value) is str else _dumps(value)
+
+
+def _key(name: str) -> str:
+    return f", {encode_basestring_ascii(name)}: "
+
+
+def _first_with(onts: Iterable[Dict[str, Any]], key: str) -> Dict[str, Any]:
+    for ont in onts:
+        if ont.get(key):
+            return ont
+    return {}
+
+
+# ── Huawei MA56xxT ──────────────────────────────────────────
+@register("huawei")
+def normalize_huawei(onts: List[Dict[str, Any]]) -> List[OntRow]:
+    status_map = STATUS_NORMALIZE["huawei"]
+    sample = onts[0]
+    ptx_f = _PowerField(("ptx", "tx"), sample)
+    prx_f = _PowerField(("prx", "rx"), sample)
+
+    # props: mismo JSON que json.dumps(meta), compuesto por trozos (más rápido)
+    out: List[OntRow] = []
+    append = out.append
+    for ont in onts:
+        get = ont.get
+        fsp = get("schema_fsp")
+        vid = f"{fsp}/{get('id')}"
+        run_state = get("run_state")
+        append(_row(OntRow, (
+            vid,
+            ptx_f(ont),
+            prx_f(ont),
+            status_map.get(run_state, UNKNOWN_STATUS),
+            get("sn"),
+            None,
+            get("description"),
+            "".join((
+                '{"id": ', _js(vid),
+                ', "schema_fsp": ', _js(fsp),
+                ', "control_flag": ', _js(get("control_flag")),
+                ', "run_state": ', _js(run_state),
+                ', "config_state": ', _js(get("config_state")),
+                ', "match_state": ', _js(get("match_state")),
+                ', "protect_side": ', _js(get("protect_side")),
+                "}",
+            )),
+        )))
+    return out
+
+
+# ── Zyxel 1408A / 2406 / 1240XA ─────────────────────────────
+# Campos extra de 1408A/2406 (no siempre presentes)
+_ZYXEL_EXTRA = ("Template-ID", "FW Version", "Distance")
+
+
+def _zyxel_normalizer(vendor: str) -> Normalizer:
+    def normalize(onts: List[Dict[str, Any]]) -> List[OntRow]:
+        status_map = STATUS_NORMALIZE[vendor]
+        status_cache: Dict[Any, int] = {}
+        sample = _first_with(onts, "AID")
+        # Por lo general Zyxel expone ONT Rx; ONT Tx puede no existir
+        ptx_f = _PowerField(("ONT Tx", "tx", "Tx", "PTX"), sample)
+        prx_f = _PowerField(("ONT Rx", "rx", "Rx", "PRX"), sample)
+        # Trazabilidad de filter/slot en 1240XA
+        with_filter = vendor == "zyxel1240XA"
+        # props: mismo JSON que json.dumps(meta), compuesto por trozos (más rápido)
+        vendor_part = f'{_key("__vendor")}{_js(vendor)}'
+        extra = [(k, _key(k)) for k in _ZYXEL_EXTRA]
+
+        out: List[OntRow] = []
+        append = out.append
+        for ont in onts:
+            get = ont.get
+            aid = get("AID")
+            if not aid:
+                logging.debug("Descartado dict sin AID (%s): %s", vendor, ont)
+                continue
+
+            # Status puede venir como "IS", "Active"… → pocos valores distintos
+            raw_status = get("Status")
+            status = status_cache.get(raw_status)
+            if status is None:
+                norm = str(raw_status).strip().upper() if raw_status is not None else None
+                status = status_cache[raw_status] = status_map.get(norm, UNKNOWN_STATUS)
+
+            sn = get("SN")
+            model = get("Model")
+            parts = [
+                '{"AID": ', _js(aid),
+                ', "Status": ', _js(raw_status),
+                ', "SN": ', _js(sn),
+                ', "Model": ', _js(model),
+                vendor_part,
+            ]
+            if with_filter and "__filter" in ont:
+                parts += (', "filter": ', _js(ont["__filter"]))
+            for k, prefix in extra:
+                if k in ont:
+                    parts += (prefix, _js(ont[k]))
+            parts.append("}")
+
+            append(_row(OntRow, (
+                aid,
+                ptx_f(ont),
+                prx_f(ont),
+                status,
+                sn,
+                model,
+                get("Description"),
+                "".join(parts),
+            )))
+        return out
+
+    normalize.__name__ = f"normalize_{vendor}"
+    return normalize
+
+
+for _vendor in ("zyxel1408A", "zyxel2406", "zyxel1240XA"):
+    register(_vendor)(_zyxel_normalizer(_vendor))
@@ -0,0 +1,28 @@
+# collector/redis_conn.py
+# ───────────────────────────────────────────────────────────────
+# Cliente Redis compartido (mismo servidor que el broker Celery).
+# Se crea perezosamente: importar este módulo no abre conexiones.
+# ───────────────────────────────────────────────────────────────
+
+from __future__ import annotations
+
+import os
+from typing import Optional
+
+import redis
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
+
+_client: Optional[redis.Redis] = None
+
+
+def get_redis() -> redis.Redis:
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(
+            REDIS_URL,
+            socket_timeout=2,
+            socket_connect_timeout=2,
+            decode_responses=True,
+        )
+    return _client
@@ -0,0 +1,112 @@
+# collector/registry.py
+# ───────────────────────────────────────────────────────────────
+# Registro de OLTs compartido en Redis para la recarga en caliente
+# de olts.yaml.
+# • La tarea reload_config detecta cambios por (mtime, tamaño) y, si
+#   cambian, por checksum SHA-256 del fichero.
+# • El diff por id (altas / bajas / cambios) se aplica solo sobre esas
+#   entradas del hash `collector:config:olts` y se incrementa la versión.
+# • Cada proceso cachea su copia y solo la relee cuando cambia la versión,
+#   así el coste es proporcional al diff y no al tamaño de la flota.
+# ───────────────────────────────────────────────────────────────
+
+from __future__ import annotations
+
+import json
+import hashlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import yaml
+
+from redis_conn import get_redis
+
+_OLTS_KEY = "collector:config:olts"
+_VERSION_KEY = "collector:config:version"
+_CHECKSUM_KEY = "collector:config:checksum"
+_RELOAD_LOCK_KEY = "collector:config:reload"
+
+Diff = Tuple[List[Dict[str, Any]], List[str], List[Dict[str, Any]]]
+
+_cache_version: Optional[str] = None
+_cache_olts: List[Dict[str, Any]] = []
+
+
+def parse_config(raw_bytes: bytes) -> List[Dict[str, Any]]:
+    """Mismo criterio que load_config: `defaults` + overrides por OLT."""
+    raw = yaml.safe_load(raw_bytes) or {}
+    defaults = raw.get("defaults", {})
+    out: List[Dict[str, Any]] = []
+    for olt in raw.get("olts", []):
+        cfg = defaults.copy()
+        cfg.update(olt)
+        out.append(cfg)
+    return out
+
+
+def read_config_file(path: str) -> Tuple[str, List[Dict[str, Any]]]:
+    with open(path, "rb") as f:
+        data = f.read()
+    return hashlib.sha256(data).hexdigest(), parse_config(data)
+
+
+def _dump(cfg: Dict[str, Any]) -> str:
+    # sort_keys → la comparación no depende del orden en el YAML
+    return json.dumps(cfg, sort_keys=True, default=str)
+
+
+def diff_configs(old: Dict[str, str], new: List[Dict[str, Any]]) -> Diff:
+    """
+    old: id → JSON publicado; new: configuración recién leída.
+    Devuelve (altas, ids dados de baja, cambiadas).
+    """
+    new_by_id = {c["id"]: c for c in new}
+    added = [c for oid, c in new_by_id.items() if oid not in old]
+    removed = [oid for oid in old if oid not in new_by_id]
+    changed = [
+        c for oid, c in new_by_id.items()
+        if oid in old and old[oid] != _dump(c)
+    ]
+    return added, removed, changed
+
+
+def published_checksum() -> Optional[str]:
+    return get_redis().get(_CHECKSUM_KEY)
+
+
+def published_olts_raw() -> Dict[str, str]:
+    return get_redis().hgetall(_OLTS_KEY)
+
+
+def publish_diff(checksum: str, diff: Diff) -> None:
+    added, removed, changed = diff
+    pipe = get_redis().pipeline(transaction=True)
+    upserts = {c["id"]: _dump(c) for c in added + changed}
+    if upserts:
+        pipe.hset(_OLTS_KEY, mapping=upserts)
+    if removed:
+        pipe.hdel(_OLTS_KEY, *removed)
+    pipe.set(_CHECKSUM_KEY, checksum)
+    if upserts or removed:
+        pipe.incr(_VERSION_KEY)
+    pipe.execute()
+
+
+def reload_lock(timeout: int = 60):
+    return get_redis().lock(_RELOAD_LOCK_KEY, timeout=timeout, blocking=False)
+
+
+def current_olts() -> Optional[List[Dict[str, Any]]]:
+    """
+    OLTs publicadas (copia local por proceso, releída solo si cambió la
+    versión). None si el registro aún no existe (Redis recién vaciado…).
+    """
+    global _cache_version, _cache_olts
+    redis = get_redis()
+    version = redis.get(_VERSION_KEY)
+    if version is None:
+        return None
+    if version != _cache_version:
+        raw = redis.hgetall(_OLTS_KEY)
+        _cache_olts = sorted((json.loads(v) for v in raw.values()), key=lambda c: c["id"])
+        _cache_version = version
+    return _cache_olts
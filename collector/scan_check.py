@@ -0,0 +1,189 @@
+# collector/scan_check.py
+# ───────────────────────────────────────────────────────────────
+# Detección de escaneos truncados (página telnet cortada, PON que no
+# responde…) antes de persistir.
+# • Un escaneo es sospechoso si:
+#     - trae menos ONTs que `min_onts` (olts.yaml), o
+#     - el total, o el de alguna PON, cae más de SCAN_DROP_RATIO respecto
+#       al último escaneo persistido de la OLT (recuento por PON en Redis,
+#       record_counts; sin él, el inventario con missing_polls = 0).
+#       Solo cuentan PONs con al menos SCAN_MIN_PON_ONTS ONTs.
+# • Las PONs sospechosas se traducen a "slices" re-escaneables:
+#     - huawei:       la PON (F/S/P)
+#     - zyxel1240XA:  el filter/slot
+#     - resto:        el escaneo completo ("*")
+# • Con `retry_once` (por defecto true) poll_single_olt re-escanea solo esos
+#   slices y se queda, por slice, con la lectura más completa. Si sigue
+#   siendo sospechoso se persiste y se reconcilia todo salvo las PONs de
+#   los slices sospechosos (hold_pons); si la caída no se localiza en
+#   ninguna PON (min_onts, total) no se reconcilia nada.
+# • El escaneo persistido pasa a ser la referencia del siguiente: una caída
+#   real (splitter retirado, bajas) confirmada por el re-escaneo y por el
+#   sondeo siguiente deja de ser sospechosa y se reconcilia entonces.
+# ───────────────────────────────────────────────────────────────
+
+from __future__ import annotations
+
+import logging
+import os
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from sqlalchemy import text
+
+from normalize import OntRow
+from redis_conn import get_redis
+
+SCAN_DROP_RATIO = float(os.getenv("SCAN_DROP_RATIO", "0.2"))
+SCAN_MIN_PON_ONTS = int(os.getenv("SCAN_MIN_PON_ONTS", "8"))
+
+WHOLE_SCAN = "*"
+
+_COUNTS_PREFIX = "collector:scan:counts:"
+# Una OLT sin sondear en este tiempo vuelve a compararse con el inventario
+_COUNTS_TTL = 7 * 86400
+
+_PREVIOUS_COUNTS = text("""
+    SELECT COALESCE(pon_id, ''), count(*)
+      FROM ont
+     WHERE olt_id = :olt_id
+       AND missing_polls = 0
+     GROUP BY 1
+""")
+
+
+class ScanCheck(NamedTuple):
+    suspicious: bool
+    reason: str
+    slices: List[str]  # slices a re-escanear
+    # PONs que no se reconcilian (None = ninguna PON de la OLT se reconcilia)
+    hold_pons: Optional[List[str]]
+
+
+def pon_of(vendor: str, vendor_ont_id: str) -> str:
+    """Misma derivación que agis_derive_pon_id() en la BD ('' si no hay)."""
+    if not vendor_ont_id:
+        return ""
+    if "/" in vendor_ont_id:
+        parts = vendor_ont_id.split("/")
+        if len(parts) >= 3 and all(parts[:3]):
+            return "/".join(parts[:3])
+        return ""
+    s = vendor_ont_id[4:] if vendor_ont_id.startswith("ont-") else vendor_ont_id
+    parts = s.split("-") + ["", ""]
+    a, b, c = parts[0], parts[1], parts[2]
+    v = (vendor or "").lower()
+    if v in ("zyxel2406", "zyxel1240xa", "zyxel_1240xa", "1240xa"):
+        return f"{a}-{b}" if a and b else ""
+    if v in ("zyxel1408a", "zyxel_1408a", "1408a", "zyxel"):
+        return a
+    if c:
+        return f"{a}-{b}"
+    return a
+
+
+def slice_of(vendor: str, pon: str) -> str:
+    if vendor == "huawei":
+        return pon
+    if vendor == "zyxel1240XA":
+        return pon.split("-", 1)[0]
+    return WHOLE_SCAN
+
+
+def previous_counts(conn, olt_id: str) -> Dict[str, int]:
+    """Recuento por PON del inventario (referencia si no hay last_counts)."""
+    return dict(conn.execute(_PREVIOUS_COUNTS, {"olt_id": olt_id}).all())
+
+
+def last_counts(olt_id: str) -> Optional[Dict[str, int]]:
+    """Recuento por PON del último escaneo persistido; None si no se conoce."""
+    try:
+        raw = get_redis().hgetall(f"{_COUNTS_PREFIX}{olt_id}")
+    except Exception as exc:
+        logging.warning("OLT %s → recuento del último escaneo no disponible (%s)", olt_id, exc)
+        return None
+    return {pon: int(n) for pon, n in raw.items()} if raw else None
+
+
+def record_counts(olt_id: str, counts: Dict[str, int]) -> None:
+    """Guarda el recuento por PON del escaneo recién persistido (o encolado)."""
+    if not counts:
+        return
+    key = f"{_COUNTS_PREFIX}{olt_id}"
+    try:
+        pipe = get_redis().pipeline(transaction=True)
+        pipe.delete(key)
+        pipe.hset(key, mapping=counts)
+        pipe.expire(key, _COUNTS_TTL)
+        pipe.execute()
+    except Exception as exc:
+        logging.warning("OLT %s → no se pudo guardar el recuento por PON (%s)", olt_id, exc)
+
+
+def pon_counts(vendor: str, rows: Iterable[OntRow]) -> Dict[str, int]:
+    counts: Dict[str, int] = {}
+    for r in rows:
+        pon = pon_of(vendor, r.vendor_ont_id)
+        counts[pon] = counts.get(pon, 0) + 1
+    return counts
+
+
+def check_scan(
+    cfg: Dict,
+    rows: List[OntRow],
+    previous: Dict[str, int],
+    min_onts: Optional[int] = None,
+) -> ScanCheck:
+    return check_counts(cfg, pon_counts(cfg["vendor"], rows), previous, min_onts)
+
+
+def check_counts(
+    cfg: Dict,
+    current: Dict[str, int],
+    previous: Dict[str, int],
+    min_onts: Optional[int] = None,
+) -> ScanCheck:
+    """Como check_scan pero sobre el recuento por PON (escaneo por slices)."""
+    vendor = cfg["vendor"]
+    min_onts = cfg.get("min_onts") if min_onts is None else min_onts
+    total, prev_total = sum(current.values()), sum(previous.values())
+    keep = 1.0 - SCAN_DROP_RATIO
+
+    short_pons = sorted(
+        pon for pon, prev in previous.items()
+        if prev >= SCAN_MIN_PON_ONTS and current.get(pon, 0) < prev * keep
+    )
+    slices = sorted({slice_of(vendor, pon) for pon in short_pons})
+
+    if short_pons:
+        # Sin reconciliar: las PONs cortas y las que comparten slice con ellas
+        # (filter del 1240XA); el resto de la OLT sí se reconcilia
+        hold = set(short_pons) | {
+            pon for pon in set(previous) | set(current)
+            if slice_of(vendor, pon) in slices and slice_of(vendor, pon) != WHOLE_SCAN
+        }
+        return ScanCheck(
+            True, f"PONs con caída > {SCAN_DROP_RATIO:.0%}: {', '.join(short_pons[:10])}",
+            slices, sorted(hold),
+        )
+    if min_onts and total < int(min_onts):
+        return ScanCheck(True, f"{total} ONTs < min_onts={min_onts}", [WHOLE_SCAN], None)
+    if prev_total and total < prev_total * keep:
+        return ScanCheck(
+            True, f"{total} ONTs frente a {prev_total} en el sondeo anterior", [WHOLE_SCAN], None,
+        )
+    return ScanCheck(False, "", [], [])
+
+
+def merge_rescan(vendor: str, rows: List[OntRow], rescanned: List[OntRow]) -> List[OntRow]:
+    """Por cada slice re-escaneado se queda con la lectura que trae más ONTs."""
+    def by_slice(items: List[OntRow]) -> Dict[str, List[OntRow]]:
+        out: Dict[str, List[OntRow]] = {}
+        for r in items:
+            out.setdefault(slice_of(vendor, pon_of(vendor, r.vendor_ont_id)), []).append(r)
+        return out
+
+    old, new = by_slice(rows), by_slice(rescanned)
+    for key, items in new.items():
+        if len(items) >= len(old.get(key, ())):
+            old[key] = items
+    return [r for items in old.values() for r in items]
@@ -0,0 +1,195 @@
+# collector/scheduler.py
+# ───────────────────────────────────────────────────────────────
+# Planificador de sondeos por OLT.
+# • Una única tarea `dispatch_due_polls` cada SCHEDULER_TICK s lanza las
+#   OLTs vencidas (el registro de OLTs puede cambiar en caliente).
+# • SCHEDULER_MODE=static   → cada OLT vence cada poll_interval exacto.
+# • SCHEDULER_MODE=adaptive → el intervalo efectivo de cada OLT se
+#   recalcula tras cada sondeo a partir de:
+#     - duración media (EWMA) del escaneo: objetivo HEADROOM × duración
+#     - tasa de fallos y de UserBusyError (EWMA): estiran ese objetivo
+#   y se acota a [min_poll_interval, max_poll_interval] de olts.yaml
+#   (por defecto [poll_interval, 4 × poll_interval]). Con un
+#   min_poll_interval menor que poll_interval, una OLT rápida y sana se
+#   sondea más a menudo; poll_interval es el intervalo del modo static.
+#   Cada vencimiento lleva jitter (±SCHEDULER_JITTER) y el primer arranque
+#   se reparte uniformemente en [0, intervalo) para evitar sondeos en manada.
+# • En ambos modos las estadísticas se guardan en Redis y se publican en la
+#   tabla olt_schedule para que la API las exponga.
+# ───────────────────────────────────────────────────────────────
+
+from __future__ import annotations
+
+import os
+import time
+import random
+import logging
+import datetime as dt
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import text
+
+from redis_conn import get_redis
+
+SCHEDULER_MODE = os.getenv("SCHEDULER_MODE", "static").strip().lower()
+SCHEDULER_TICK = float(os.getenv("SCHEDULER_TICK", "5"))
+SCHEDULER_JITTER = float(os.getenv("SCHEDULER_JITTER", "0.1"))
+SCHEDULER_ALPHA = float(os.getenv("SCHEDULER_ALPHA", "0.3"))
+SCHEDULER_HEADROOM = float(os.getenv("SCHEDULER_HEADROOM", "1.5"))
+# Peso de cada tasa (0..1) en el estiramiento del intervalo
+SCHEDULER_BUSY_WEIGHT = float(os.getenv("SCHEDULER_BUSY_WEIGHT", "2.0"))
+SCHEDULER_FAILURE_WEIGHT = float(os.getenv("SCHEDULER_FAILURE_WEIGHT", "1.0"))
+
+_STATE_PREFIX = "collector:sched:"
+_CLAIM_PREFIX = "collector:sched:claim:"
+
+_UPSERT_SCHEDULE = text("""
+    INSERT INTO olt_schedule(olt_id, mode, base_interval, effective_interval,
+                             avg_duration, failure_rate, busy_rate,
+                             last_outcome, last_poll, next_due, updated_at)
+    VALUES (:olt_id, :mode, :base, :interval, :duration, :failure, :busy,
+            :outcome, :last_poll, :next_due, now())
+    ON CONFLICT (olt_id) DO UPDATE SET
+        mode = EXCLUDED.mode,
+        base_interval = EXCLUDED.base_interval,
+        effective_interval = EXCLUDED.effective_interval,
+        avg_duration = EXCLUDED.avg_duration,
+        failure_rate = EXCLUDED.failure_rate,
+        busy_rate = EXCLUDED.busy_rate,
+        last_outcome = EXCLUDED.last_outcome,
+        last_poll = EXCLUDED.last_poll,
+        next_due = EXCLUDED.next_due,
+        updated_at = now()
+""")
+
+
+def interval_bounds(cfg: Dict[str, Any]) -> tuple[float, float, float]:
+    base = float(cfg["poll_interval"])
+    lo = float(cfg.get("min_poll_interval", base))
+    hi = float(cfg.get("max_poll_interval", base * 4))
+    return base, lo, max(lo, hi)
+
+
+def compute_interval(cfg: Dict[str, Any], duration: float, failure: float, busy: float) -> float:
+    _, lo, hi = interval_bounds(cfg)
+    # lo es el suelo real: el objetivo sale solo de la duración y el estiramiento
+    target = SCHEDULER_HEADROOM * duration
+    target *= 1.0 + SCHEDULER_BUSY_WEIGHT * busy + SCHEDULER_FAILURE_WEIGHT * failure
+    return min(hi, max(lo, target))
+
+
+def _jittered(interval: float) -> float:
+    return interval * (1.0 + random.uniform(-SCHEDULER_JITTER, SCHEDULER_JITTER))
+
+
+def _state(olt_id: str) -> Dict[str, str]:
+    return get_redis().hgetall(f"{_STATE_PREFIX}{olt_id}")
+
+
+def record_poll(cfg: Dict[str, Any], duration: float, outcome: str) -> Optional[Dict[str, Any]]:
+    """
+    Actualiza las EWMA de la OLT tras un sondeo y recalcula su intervalo.
+    outcome: ok | partial | empty | busy | error. Nunca lanza: el planificador no debe
+    romper un sondeo ya terminado.
+    """
+    olt_id = cfg["id"]
+    try:
+        prev = _state(olt_id)
+        a = SCHEDULER_ALPHA
+        failed = 1.0 if outcome == "error" else 0.0
+        was_busy = 1.0 if outcome == "busy" else 0.0
+        if prev:
+            avg = (1 - a) * float(prev["duration"]) + a * duration
+            failure = (1 - a) * float(prev["failure"]) + a * failed
+            busy = (1 - a) * float(prev["busy"]) + a * was_busy
+        else:
+            avg, failure, busy = duration, failed, was_busy
+
+        if SCHEDULER_MODE == "adaptive":
+            interval = compute_interval(cfg, avg, failure, busy)
+        else:
+            interval = float(cfg["poll_interval"])
+
+        state = {
+            "interval": interval,
+            "duration": avg,
+            "failure": failure,
+            "busy": busy,
+            "outcome": outcome,
+            "last_poll": time.time(),
+        }
+        get_redis().hset(f"{_STATE_PREFIX}{olt_id}", mapping=state)
+        if prev and abs(interval - float(prev.get("interval", interval))) >= 1:
+            logging.info(
+                "OLT %s → intervalo efectivo %.0f s (dur=%.1f s fallos=%.2f busy=%.2f)",
+                olt_id, interval, avg, failure, busy,
+            )
+        return state
+    except Exception as exc:
+        logging.warning("OLT %s → planificador no actualizado: %s", olt_id, exc)
+        return None
+
+
+def publish_schedule(conn, cfg: Dict[str, Any], state: Dict[str, Any]) -> None:
+    """Vuelca el estado en olt_schedule (lo lee la API)."""
+    next_due = get_redis().hget(f"{_STATE_PREFIX}{cfg['id']}", "next_due")
+    conn.execute(_UPSERT_SCHEDULE, {
+        "olt_id": cfg["id"],
+        "mode": SCHEDULER_MODE,
+        "base": int(cfg["poll_interval"]),
+        "interval": state["interval"],
+        "duration": state["duration"],
+        "failure": state["failure"],
+        "busy": state["busy"],
+        "outcome": state["outcome"],
+        "last_poll": dt.datetime.fromtimestamp(state["last_poll"], dt.timezone.utc),
+        "next_due": (
+            dt.datetime.fromtimestamp(float(next_due), dt.timezone.utc) if next_due else None
+        ),
+    })
+
+
+def due_olts(olts: Iterable[Dict[str, Any]], now: Optional[float] = None) -> List[Dict[str, Any]]:
+    """
+    OLTs vencidas en este tick. Reclama cada vencimiento con SET NX para que
+    dos dispatchers concurrentes no lancen la misma OLT.
+    """
+    now = time.time() if now is None else now
+    redis = get_redis()
+    olts = list(olts)
+    adaptive = SCHEDULER_MODE == "adaptive"
+
+    pipe = redis.pipeline(transaction=False)
+    for cfg in olts:
+        pipe.hmget(f"{_STATE_PREFIX}{cfg['id']}", "interval", "next_due")
+    states = pipe.execute()
+
+    out: List[Dict[str, Any]] = []
+    for cfg, (interval_raw, next_due) in zip(olts, states):
+        key = f"{_STATE_PREFIX}{cfg['id']}"
+        if adaptive and interval_raw:
+            interval = float(interval_raw)
+        else:
+            interval = float(cfg["poll_interval"])
+
+        if next_due is None:
+            # Primera vez: arranque repartido en [0, intervalo)
+            redis.hset(key, "next_due", now + random.uniform(0, interval))
+            continue
+        if float(next_due) > now:
+            continue
+        if not redis.set(f"{_CLAIM_PREFIX}{cfg['id']}", "1", nx=True, ex=max(1, int(SCHEDULER_TICK))):
+            continue
+        redis.hset(key, "next_due", now + (_jittered(interval) if adaptive else interval))
+        out.append(cfg)
+    return out
+
+
+def reset_schedule(olt_id: str) -> None:
+    """Config cambiada: se vuelve a repartir su próximo vencimiento."""
+    get_redis().hdel(f"{_STATE_PREFIX}{olt_id}", "next_due")
+
+
+def forget_schedule(olt_id: str) -> None:
+    """OLT retirada de olts.yaml: deja de planificarse."""
+    get_redis().delete(f"{_STATE_PREFIX}{olt_id}")
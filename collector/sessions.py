@@ -0,0 +1,134 @@
+# collector/sessions.py
+# ───────────────────────────────────────────────────────────────
+# Modo de worker y límites de sesiones con las OLTs.
+# • WORKER_MODE:
+#     - prefork (por defecto): un sondeo por proceso hijo de Celery.
+#     - io: pool de hilos de Celery (IO_CONCURRENCY hilos en un solo
+#       proceso). Los clientes síncronos (telnet Zyxel/Huawei) ocupan un
+#       hilo mientras esperan E/S; las corrutinas realmente asíncronas
+#       (walks SNMP de huawei_mode: snmp) van a un único event loop
+#       compartido en un hilo aparte (run_async).
+# • session_slot(vendor): semáforo global (SESSIONS_MAX) + por vendor
+#   (SESSIONS_PER_VENDOR="huawei=16,zyxel1240XA=4"). Se adquiere durante la
+#   sesión (conexión → escaneo); es reentrante en el mismo hilo (re-escaneo
+#   dentro de un escaneo por slices). Los límites son por proceso: en
+#   prefork, multiplicar por el nº de hijos.
+# ───────────────────────────────────────────────────────────────
+
+from __future__ import annotations
+
+import os
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional
+
+from metrics import observe
+
+WORKER_MODE = os.getenv("WORKER_MODE", "prefork").strip().lower()
+IO_CONCURRENCY = max(1, int(os.getenv("IO_CONCURRENCY", "200")))
+# 0 = sin límite
+SESSIONS_MAX = int(os.getenv("SESSIONS_MAX", "0"))
+WAIT_BUCKETS = (0.01, 0.1, 0.5, 1, 5, 15, 30, 60, 120, 300)
+
+
+def parse_limits(raw: str) -> Dict[str, int]:
+    """"huawei=16, zyxel1240XA=4" → {"huawei": 16, "zyxel1240XA": 4}"""
+    limits: Dict[str, int] = {}
+    for item in raw.split(","):
+        if "=" not in item:
+            continue
+        vendor, value = item.split("=", 1)
+        try:
+            limits[vendor.strip()] = int(value)
+        except ValueError:
+            logging.warning("SESSIONS_PER_VENDOR: valor no válido %r", item)
+    return limits
+
+
+SESSIONS_PER_VENDOR = parse_limits(os.getenv("SESSIONS_PER_VENDOR", ""))
+
+_global_sem: Optional[threading.BoundedSemaphore] = (
+    threading.BoundedSemaphore(SESSIONS_MAX) if SESSIONS_MAX > 0 else None
+)
+_vendor_sems: Dict[str, threading.BoundedSemaphore] = {
+    vendor: threading.BoundedSemaphore(n) for vendor, n in SESSIONS_PER_VENDOR.items() if n > 0
+}
+_local = threading.local()
+
+
+@contextmanager
+def session_slot(vendor: str, blocking: bool = True) -> Iterator[bool]:
+    """
+    Reserva una sesión del vendor (y del total). Devuelve False solo con
+    blocking=False si no hay hueco (p. ej. sesiones extra de la 1240XA).
+    """
+    if getattr(_local, "depth", 0):
+        _local.depth += 1
+        try:
+            yield True
+        finally:
+            _local.depth -= 1
+        return
+
+    sems = [s for s in (_vendor_sems.get(vendor), _global_sem) if s is not None]
+    acquired: List[threading.BoundedSemaphore] = []
+    t0 = time.monotonic()
+    try:
+        for sem in sems:
+            if not sem.acquire(blocking=blocking):
+                break
+            acquired.append(sem)
+        ok = len(acquired) == len(sems)
+        if ok:
+            if sems and blocking:
+                observe("collector_session_wait_seconds", time.monotonic() - t0, WAIT_BUCKETS, vendor=vendor)
+            _local.depth = 1
+        try:
+            yield ok
+        finally:
+            if ok:
+                _local.depth = 0
+    finally:
+        for sem in reversed(acquired):
+            sem.release()
+
+
+# ── Event loop compartido (WORKER_MODE=io) ──────────────────
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def _shared_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None or _loop.is_closed():
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="io-loop", daemon=True).start()
+            _loop = loop
+        return _loop
+
+
+def run_async(fn: Callable[..., Awaitable[Any]], *args: Any) -> Any:
+    """
+    Ejecuta una corrutina y espera el resultado: en modo io en el event
+    loop compartido; si no, en un loop propio (async_to_sync). Solo para
+    corrutinas que no bloquean el loop (el CLI de jmq_olt_huawei sí
+    bloquea: ese sigue con async_to_sync en su hilo).
+    """
+    if WORKER_MODE == "io":
+        future: Future = asyncio.run_coroutine_threadsafe(fn(*args), _shared_loop())
+        return future.result()
+    from asgiref.sync import async_to_sync
+
+    return async_to_sync(fn)(*args)
+
+
+def celery_settings() -> Dict[str, Any]:
+    """Ajustes del worker Celery según WORKER_MODE (los flags -P/-c mandan)."""
+    if WORKER_MODE == "io":
+        return {"worker_pool": "threads", "worker_concurrency": IO_CONCURRENCY}
+    return {}
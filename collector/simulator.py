@@ -0,0 +1,229 @@
+# collector/simulator.py
+# ───────────────────────────────────────────────────────────────
+# Simulador de OLTs para pruebas y benchmarks sin red.
+# • Sustituye a los clientes de jmq_olt_huawei / jmq_olt_zyxel con la
+#   misma interfaz que usa el collector:
+#     - huawei:                 connect() / async get_onts(slot, port) / disconnect()
+#     - zyxel1408A / 2406:      get_all_onts() / close()
+#     - zyxel1240XA:            get_all_onts(filter) / close()
+# • Se activa por OLT con la clave `simulate` de olts.yaml (true o dict de
+#   parámetros) o para todas con OLT_SIMULATE=true.
+# • Parámetros (clave `simulate` > variables SIM_* > valores por defecto):
+#     onts_per_pon  ONTs por PON                     (SIM_ONTS_PER_PON, 64)
+#     pons          PONs por slot en Zyxel           (SIM_PONS, 8)
+#     latency       s por llamada (PON en Huawei)    (SIM_LATENCY, 0.05)
+#     jitter        ± fracción sobre latency         (SIM_JITTER, 0.2)
+#     busy_rate     prob. de UserBusyError / llamada (SIM_BUSY_RATE, 0)
+#     churn         fracción de ONTs que cambian     (SIM_CHURN, 0)
+#                   (baja + alta nueva) por lectura
+#     offline_rate  fracción de ONTs no operativas   (SIM_OFFLINE_RATE, 0.05)
+#     seed          semilla (por defecto, el id de la OLT)
+# • El inventario de cada OLT vive en memoria del proceso, así el churn se
+#   acumula entre sondeos como en una OLT real.
+# ───────────────────────────────────────────────────────────────
+
+from __future__ import annotations
+
+import os
+import time
+import random
+import asyncio
+import threading
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from config import env_bool
+
+OLT_SIMULATE = env_bool("OLT_SIMULATE", default=False)
+
+_DEFAULTS: Dict[str, float] = {
+    "onts_per_pon": float(os.getenv("SIM_ONTS_PER_PON", "64")),
+    "pons": float(os.getenv("SIM_PONS", "8")),
+    "latency": float(os.getenv("SIM_LATENCY", "0.05")),
+    "jitter": float(os.getenv("SIM_JITTER", "0.2")),
+    "busy_rate": float(os.getenv("SIM_BUSY_RATE", "0")),
+    "churn": float(os.getenv("SIM_CHURN", "0")),
+    "offline_rate": float(os.getenv("SIM_OFFLINE_RATE", "0.05")),
+}
+
+_ZYXEL_STATUSES = ("OOS-LS", "OOS-DG", "OOS-NR")
+_HUAWEI_STATUSES = ("offline", "losi", "dyinggasp")
+
+
+def simulation_enabled(cfg: Dict[str, Any]) -> bool:
+    return OLT_SIMULATE or bool(cfg.get("simulate"))
+
+
+def sim_params(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    params: Dict[str, Any] = dict(_DEFAULTS)
+    if isinstance(cfg.get("simulate"), dict):
+        params.update(cfg["simulate"])
+    params.setdefault("seed", cfg["id"])
+    return params
+
+
+class _Inventory:
+    """
+    ONTs de una OLT simulada: PON (slot, port) → lista de números de ONT.
+    Cada lectura de una PON aplica el churn: una fracción de sus ONTs se da
+    de baja y aparecen otras con número nuevo.
+    """
+
+    def __init__(self, olt_id: str, params: Dict[str, Any]):
+        self.olt_id = olt_id
+        self.params = params
+        self.rnd = random.Random(str(params["seed"]))
+        self.lock = threading.Lock()
+        self.pons: Dict[Tuple[int, int], List[int]] = {}
+        self.next_id: Dict[Tuple[int, int], int] = {}
+
+    def read_pon(self, slot: int, port: int) -> List[Tuple[int, float, float, bool]]:
+        """[(nº ONT, ptx, prx, operativa)] de la PON tras aplicar churn."""
+        key = (slot, port)
+        p = self.params
+        with self.lock:
+            ids = self.pons.get(key)
+            if ids is None:
+                n = int(p["onts_per_pon"])
+                ids = self.pons[key] = list(range(n))
+                self.next_id[key] = n
+            elif p["churn"] > 0:
+                for i in range(len(ids)):
+                    if self.rnd.random() < p["churn"]:
+                        ids[i] = self.next_id[key]
+                        self.next_id[key] += 1
+            rnd = self.rnd
+            return [
+                (
+                    oid,
+                    round(rnd.uniform(1.5, 3.5), 2),
+                    round(rnd.uniform(-28.0, -17.0), 2),
+                    rnd.random() >= p["offline_rate"],
+                )
+                for oid in ids
+            ]
+
+    def pick(self, values: Tuple[str, ...]) -> str:
+        with self.lock:
+            return self.rnd.choice(values)
+
+    def delay(self) -> float:
+        p = self.params
+        with self.lock:
+            return max(0.0, p["latency"] * (1 + self.rnd.uniform(-p["jitter"], p["jitter"])))
+
+    def busy(self) -> bool:
+        if self.params["busy_rate"] <= 0:
+            return False
+        with self.lock:
+            return self.rnd.random() < self.params["busy_rate"]
+
+
+_inventories: Dict[str, _Inventory] = {}
+_inventories_lock = threading.Lock()
+
+
+def _inventory(cfg: Dict[str, Any]) -> _Inventory:
+    params = sim_params(cfg)
+    with _inventories_lock:
+        inv = _inventories.get(cfg["id"])
+        if inv is None or inv.params != params:
+            inv = _inventories[cfg["id"]] = _Inventory(cfg["id"], params)
+        return inv
+
+
+def reset_inventories() -> None:
+    with _inventories_lock:
+        _inventories.clear()
+
+
+# ── Huawei MA56xxT ──────────────────────────────────────────
+class SimulatedHuawei:
+    def __init__(self, cfg: Dict[str, Any], busy_error: Type[Exception]):
+        self.inv = _inventory(cfg)
+        self.busy_error = busy_error
+        self.connected = False
+
+    def connect(self) -> None:
+        time.sleep(self.inv.delay())
+        if self.inv.busy():
+            raise self.busy_error("simulador: sesión ocupada")
+        self.connected = True
+
+    def disconnect(self) -> None:
+        self.connected = False
+
+    async def get_onts(self, slot: int, port: int) -> List[dict]:
+        await asyncio.sleep(self.inv.delay())
+        if self.inv.busy():
+            raise self.busy_error(f"simulador: PON {slot}/{port} ocupada")
+        fsp = f"0/{slot}/{port}"
+        return [
+            {
+                "schema_fsp":   fsp,
+                "id":           oid,
+                "control_flag": "active",
+                "run_state":    "online" if up else self.inv.pick(_HUAWEI_STATUSES),
+                "config_state": "normal",
+                "match_state":  "match",
+                "protect_side": "no",
+                "sn":           f"48575443{slot:02X}{port:02X}{oid:04X}",
+                "description":  f"SIM {fsp}/{oid}",
+                "tx":           ptx if up else None,
+                "rx":           prx if up else None,
+            }
+            for oid, ptx, prx, up in self.inv.read_pon(slot, port)
+        ]
+
+
+# ── Zyxel ───────────────────────────────────────────────────
+class SimulatedZyxel:
+    """1408A / 2406: get_all_onts() recorre todas las PONs; 1240XA por filter (slot)."""
+
+    MODELS = {"zyxel1408A": "PMG5317-T20B", "zyxel2406": "PMG5617GA", "zyxel1240XA": "PMG3000-D20B"}
+
+    def __init__(self, cfg: Dict[str, Any], busy_error: Type[Exception]):
+        self.vendor = cfg["vendor"]
+        self.inv = _inventory(cfg)
+        self.busy_error = busy_error
+
+    def close(self) -> None:
+        pass
+
+    def get_all_onts(self, filter: Optional[str] = None) -> List[dict]:
+        time.sleep(self.inv.delay())
+        if self.inv.busy():
+            raise self.busy_error("simulador: sesión ocupada")
+        slots = [int(filter)] if filter is not None else [1]
+        out: List[dict] = []
+        for slot in slots:
+            for port in range(1, int(self.inv.params["pons"]) + 1):
+                out.extend(self._pon(slot, port))
+        return out
+
+    def _pon(self, slot: int, port: int) -> List[dict]:
+        model = self.MODELS[self.vendor]
+        out = []
+        for oid, ptx, prx, up in self.inv.read_pon(slot, port):
+            ont = {
+                "AID":         f"ont-{slot}-{port}-{oid + 1}",
+                "Status":      ("Active" if self.vendor == "zyxel1240XA" else "IS")
+                               if up else self.inv.pick(_ZYXEL_STATUSES),
+                "SN":          f"5A59584C{slot:02X}{port:02X}{oid:04X}",
+                "Model":       model,
+                "Description": f"SIM {slot}-{port}-{oid + 1}",
+                "ONT Rx":      f"{prx:.2f} dBm" if up else "--",
+            }
+            if self.vendor != "zyxel1240XA":
+                ont["Template-ID"] = "Template-1"
+                ont["FW Version"] = "V5.40(ABVJ.0)"
+                ont["Distance"] = str(500 + oid * 7)
+            out.append(ont)
+        return out
+
+
+def build_simulated_client(cfg: Dict[str, Any], busy_error: Type[Exception]):
+    if cfg["vendor"] == "huawei":
+        return SimulatedHuawei(cfg, busy_error)
+    if cfg["vendor"] in SimulatedZyxel.MODELS:
+        return SimulatedZyxel(cfg, busy_error)
+    raise ValueError(f"Vendor no soportado por el simulador: {cfg['vendor']}")
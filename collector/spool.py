@@ -0,0 +1,260 @@
+# collector/spool.py
+# ───────────────────────────────────────────────────────────────
+# Spool local en disco para no perder escaneos cuando PostgreSQL no
+# responde (no da conexión en SPOOL_DB_DEADLINE s).
+# • Se guarda el mismo payload que la cola de escritura (encode_scan):
+#   filas ya normalizadas, hora del sondeo y si se reconcilia.
+# • Formato: registros [longitud u32 big-endian][JSON comprimido zlib]
+#   añadidos a segmentos por shard (mismo shard_for que ingest_queue):
+#       SPOOL_DIR/<shard>/<seq>.open   segmento activo
+#       SPOOL_DIR/<shard>/<seq>.seg    segmento cerrado (pendiente de replay)
+#       SPOOL_DIR/<shard>/<seq>.pos    offset ya reproducido del segmento
+#   Escritores concurrentes (hijos prefork, writers) se serializan con
+#   flock sobre SPOOL_DIR/<shard>/.lock.
+# • Orden por OLT: mientras un shard tenga segmentos pendientes, los
+#   sondeos nuevos de sus OLTs también van al spool (pending()), y el
+#   replay los reproduce en orden de seq/offset.
+# • Disco acotado a SPOOL_MAX_BYTES: si no cabe un registro se descartan
+#   los segmentos cerrados más antiguos (métrica collector_spool_dropped_*),
+#   salvo los de un shard que se está reproduciendo en ese momento.
+# • El replay (tasks.replay_spool) cierra el segmento activo, reproduce
+#   los cerrados en lotes y borra cada segmento al terminarlo.
+# ───────────────────────────────────────────────────────────────
+
+from __future__ import annotations
+
+import os
+import fcntl
+import struct
+import zlib
+import logging
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+
+from config import env_bool
+from ingest_queue import shard_for
+from metrics import incr
+
+SPOOL_ENABLED = env_bool("SPOOL_ENABLED", default=True)
+SPOOL_DIR = os.getenv("SPOOL_DIR", "/spool")
+SPOOL_MAX_BYTES = int(os.getenv("SPOOL_MAX_BYTES", str(512 * 1024 * 1024)))
+SPOOL_SEGMENT_BYTES = int(os.getenv("SPOOL_SEGMENT_BYTES", str(8 * 1024 * 1024)))
+# Conexión (o conexión libre del pool) más lenta que esto (s) → el escaneo va al spool
+SPOOL_DB_DEADLINE = float(os.getenv("SPOOL_DB_DEADLINE", "60"))
+# statement_timeout (s) de la transacción en línea; 0 = sin límite. Cubre
+# también la reconciliación y los borrados en cascada: si se activa, que
+# sobre de margen o esos sondeos acabarán en el spool una y otra vez
+SPOOL_STATEMENT_TIMEOUT = float(os.getenv("SPOOL_STATEMENT_TIMEOUT", "0") or 0)
+SPOOL_REPLAY_INTERVAL = float(os.getenv("SPOOL_REPLAY_INTERVAL", "30"))
+# Escaneos por transacción al reproducir
+SPOOL_REPLAY_BATCH = max(1, int(os.getenv("SPOOL_REPLAY_BATCH", "50")))
+
+_HEADER = struct.Struct(">I")
+_OPEN, _SEALED, _POS = ".open", ".seg", ".pos"
+
+
+def _shard_dir(shard: int) -> str:
+    return os.path.join(SPOOL_DIR, str(shard))
+
+
+def _seq(name: str) -> int:
+    return int(name.split(".", 1)[0])
+
+
+def _segments(shard: int, suffix: str) -> List[str]:
+    """Rutas de los segmentos del shard con ese sufijo, por seq."""
+    path = _shard_dir(shard)
+    try:
+        names = [n for n in os.listdir(path) if n.endswith(suffix) and n[0].isdigit()]
+    except FileNotFoundError:
+        return []
+    return [os.path.join(path, n) for n in sorted(names, key=_seq)]
+
+
+def shards() -> List[int]:
+    try:
+        return sorted(int(n) for n in os.listdir(SPOOL_DIR) if n.isdigit())
+    except FileNotFoundError:
+        return []
+
+
+@contextmanager
+def _locked(path: str, name: str = ".lock", blocking: bool = True) -> Iterator[bool]:
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, name), "a") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def pending_shard(shard: int) -> bool:
+    if not SPOOL_ENABLED:
+        return False
+    return bool(_segments(shard, _SEALED) or _segments(shard, _OPEN))
+
+
+def pending(olt_id: str) -> bool:
+    """¿Quedan escaneos en el spool del shard de la OLT? (entonces, al spool)"""
+    return pending_shard(shard_for(olt_id))
+
+
+def usage() -> int:
+    total = 0
+    for shard in shards():
+        for suffix in (_OPEN, _SEALED):
+            for path in _segments(shard, suffix):
+                try:
+                    total += os.path.getsize(path)
+                except FileNotFoundError:
+                    pass
+    return total
+
+
+def _make_room(needed: int) -> bool:
+    """Descarta segmentos cerrados antiguos hasta que quepan `needed` bytes."""
+    used = usage()
+    if used + needed <= SPOOL_MAX_BYTES:
+        return True
+    sealed = sorted(
+        ((shard, p) for shard in shards() for p in _segments(shard, _SEALED)),
+        key=lambda item: os.path.getmtime(item[1]),
+    )
+    for shard, path in sealed:
+        # Nunca bajo un replay en curso: borraría el segmento que está leyendo
+        with replay_lock(shard) as acquired:
+            if not acquired:
+                continue
+            try:
+                size = os.path.getsize(path)
+                os.unlink(path)
+            except FileNotFoundError:
+                continue
+            _discard_pos(path)
+        used -= size
+        incr("collector_spool_dropped_segments_total")
+        incr("collector_spool_dropped_bytes_total", size)
+        logging.error("Spool lleno (%d bytes): descartado %s", SPOOL_MAX_BYTES, path)
+        if used + needed <= SPOOL_MAX_BYTES:
+            return True
+    return False
+
+
+def _discard_pos(segment: str) -> None:
+    try:
+        os.unlink(segment[: -len(_SEALED)] + _POS)
+    except FileNotFoundError:
+        pass
+
+
+def append(olt_id: str, data: str) -> bool:
+    """
+    Añade un payload (encode_scan) al spool del shard de la OLT.
+    False si no cabe ni descartando segmentos antiguos o el disco falla.
+    """
+    shard = shard_for(olt_id)
+    record = zlib.compress(data.encode(), 1)
+    record = _HEADER.pack(len(record)) + record
+    path = _shard_dir(shard)
+    try:
+        with _locked(path):
+            if not _make_room(len(record)):
+                incr("collector_spool_rejected_total", olt_id=olt_id)
+                logging.error("OLT %s → spool lleno, escaneo perdido", olt_id)
+                return False
+            current = _segments(shard, _OPEN)
+            if current and os.path.getsize(current[-1]) >= SPOOL_SEGMENT_BYTES:
+                _seal(current[-1])
+                current = []
+            if not current:
+                last = _segments(shard, _SEALED)
+                seq = _seq(os.path.basename(last[-1])) + 1 if last else 1
+                current = [os.path.join(path, f"{seq:012d}{_OPEN}")]
+            with open(current[-1], "ab") as f:
+                f.write(record)
+                f.flush()
+                os.fsync(f.fileno())
+    except OSError as exc:
+        logging.error("OLT %s → no se pudo escribir en el spool (%s)", olt_id, exc)
+        return False
+    incr("collector_spool_records_total", olt_id=olt_id)
+    incr("collector_spool_bytes_total", len(record), olt_id=olt_id)
+    return True
+
+
+def _seal(path: str) -> str:
+    sealed = path[: -len(_OPEN)] + _SEALED
+    os.rename(path, sealed)
+    return sealed
+
+
+def seal(shard: int) -> List[str]:
+    """Cierra el segmento activo del shard → segmentos a reproducir, en orden."""
+    with _locked(_shard_dir(shard)):
+        for path in _segments(shard, _OPEN):
+            _seal(path)
+        return _segments(shard, _SEALED)
+
+
+@contextmanager
+def replay_lock(shard: int) -> Iterator[bool]:
+    """Un único replay por shard (no bloqueante)."""
+    with _locked(_shard_dir(shard), ".replay", blocking=False) as acquired:
+        yield acquired
+
+
+def read_offset(segment: str) -> int:
+    try:
+        with open(segment[: -len(_SEALED)] + _POS) as f:
+            return int(f.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def commit_offset(segment: str, offset: int) -> None:
+    """Guarda el offset reproducido (escritura atómica con rename)."""
+    pos = segment[: -len(_SEALED)] + _POS
+    tmp = pos + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(str(offset))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, pos)
+
+
+def remove(segment: str) -> None:
+    try:
+        os.unlink(segment)
+    except FileNotFoundError:
+        pass
+    _discard_pos(segment)
+
+
+def read_records(segment: str, offset: int = 0) -> Iterator[Tuple[int, Optional[str]]]:
+    """
+    (offset tras el registro, payload JSON) desde `offset`. Un registro
+    corrupto da payload None; un final truncado (caída a mitad de write)
+    termina la lectura.
+    """
+    with open(segment, "rb") as f:
+        f.seek(offset)
+        while True:
+            head = f.read(_HEADER.size)
+            if len(head) < _HEADER.size:
+                return
+            (size,) = _HEADER.unpack(head)
+            body = f.read(size)
+            if len(body) < size:
+                logging.warning("Spool: registro truncado al final de %s", segment)
+                return
+            offset += _HEADER.size + size
+            try:
+                yield offset, zlib.decompress(body).decode()
+            except (zlib.error, UnicodeDecodeError):
+                logging.error("Spool: registro ilegible en %s (offset %d)", segment, offset)
+                yield offset, None
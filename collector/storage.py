@@ -0,0 +1,108 @@
+# collector/storage.py
+# ───────────────────────────────────────────────────────────────
+# Políticas de almacenamiento del hypertable ont_power (TimescaleDB):
+# • Tamaño de chunk           POWER_CHUNK_HOURS          (24 h)
+# • Compresión a los N días   POWER_COMPRESS_AFTER_DAYS  (7; 0 = sin política)
+#   segmentada por ont_id y ordenada por time DESC: la serie de una ONT
+#   queda contigua, que es como la leen /metrics/ y /history.
+# • Retención del crudo       POWER_RETENTION_DAYS       (0 = sin borrado)
+#   Nunca por debajo de RETENTION_MIN_DAYS: el refresco del agregado
+#   diario (ventana de 30 días) borraría buckets ya calculados.
+# Se aplican al arrancar el collector (setup_periodic) y son idempotentes:
+# cambiar el entorno y reiniciar basta. El tamaño de chunk solo afecta a
+# los chunks nuevos.
+# Desactivado con STORAGE_POLICIES=false (p. ej. si las gestiona un DBA).
+# ───────────────────────────────────────────────────────────────
+
+from __future__ import annotations
+
+import os
+import logging
+from typing import Any, Dict
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from config import env_bool
+
+STORAGE_POLICIES = env_bool("STORAGE_POLICIES", default=True)
+POWER_CHUNK_HOURS = int(os.getenv("POWER_CHUNK_HOURS", "24"))
+POWER_COMPRESS_AFTER_DAYS = int(os.getenv("POWER_COMPRESS_AFTER_DAYS", "7"))
+POWER_RETENTION_DAYS = int(os.getenv("POWER_RETENTION_DAYS", "0"))
+# start_offset de la política de ont_power_1d (db-init/20261017_add_ont_power_aggregates.sql) + 1
+RETENTION_MIN_DAYS = 31
+
+# Un único proceso aplica las políticas (collector y writers arrancan a la vez)
+_TRY_LOCK = text("SELECT pg_try_advisory_xact_lock(hashtext('ont_power_storage'))")
+
+_COMPRESSION_ENABLED = text("""
+    SELECT compression_enabled
+      FROM timescaledb_information.hypertables
+     WHERE hypertable_name = 'ont_power'
+""")
+
+_ENABLE_COMPRESSION = text("""
+    ALTER TABLE ont_power SET (
+        timescaledb.compress,
+        timescaledb.compress_segmentby = 'ont_id',
+        timescaledb.compress_orderby   = 'time DESC'
+    )
+""")
+
+_SET_CHUNK = text("SELECT set_chunk_time_interval('ont_power', make_interval(hours => :hours))")
+_REMOVE_COMPRESSION = text("SELECT remove_compression_policy('ont_power', if_exists => true)")
+_ADD_COMPRESSION = text("SELECT add_compression_policy('ont_power', make_interval(days => :days))")
+_REMOVE_RETENTION = text("SELECT remove_retention_policy('ont_power', if_exists => true)")
+_ADD_RETENTION = text("SELECT add_retention_policy('ont_power', make_interval(days => :days))")
+
+
+def retention_days(days: int = POWER_RETENTION_DAYS) -> int:
+    """Retención efectiva (0 = sin borrado), con el mínimo de los agregados."""
+    if 0 < days < RETENTION_MIN_DAYS:
+        logging.warning(
+            "POWER_RETENTION_DAYS=%d < %d (ventana del agregado diario): se usa %d",
+            days, RETENTION_MIN_DAYS, RETENTION_MIN_DAYS,
+        )
+        return RETENTION_MIN_DAYS
+    return max(0, days)
+
+
+def apply_storage_policies(
+    conn: Connection,
+    chunk_hours: int = POWER_CHUNK_HOURS,
+    compress_after_days: int = POWER_COMPRESS_AFTER_DAYS,
+    retention: int = POWER_RETENTION_DAYS,
+) -> Dict[str, Any]:
+    """
+    Aplica chunk, compresión y retención a ont_power dentro de `conn`.
+    Devuelve lo aplicado ({} si otro proceso las está aplicando).
+    """
+    if not conn.execute(_TRY_LOCK).scalar():
+        return {}
+
+    applied: Dict[str, Any] = {}
+    if chunk_hours > 0:
+        conn.execute(_SET_CHUNK, {"hours": chunk_hours})
+        applied["chunk_hours"] = chunk_hours
+
+    # La política se recrea siempre: así un cambio de días se aplica al reiniciar
+    conn.execute(_REMOVE_COMPRESSION)
+    if compress_after_days > 0:
+        # Los ajustes de compresión no se pueden cambiar con chunks ya
+        # comprimidos: solo se fijan la primera vez
+        if not conn.execute(_COMPRESSION_ENABLED).scalar():
+            conn.execute(_ENABLE_COMPRESSION)
+        conn.execute(_ADD_COMPRESSION, {"days": compress_after_days})
+    applied["compress_after_days"] = compress_after_days
+
+    days = retention_days(retention)
+    conn.execute(_REMOVE_RETENTION)
+    if days > 0:
+        conn.execute(_ADD_RETENTION, {"days": days})
+        if compress_after_days >= days:
+            logging.warning(
+                "ont_power: compresión a los %d días >= retención de %d: no llegará a comprimirse",
+                compress_after_days, days,
+            )
+    applied["retention_days"] = days
+    return applied
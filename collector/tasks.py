@@ -3,23 +3,61 @@
 # • Lee config/olts.yaml
 # • Sincroniza la tabla `olt`
 # • Programa una tarea periódica por OLT
+# • Persiste en línea o vía cola de escritura (INGEST_MODE)
 # • Guarda potencias en ont_power (TimescaleDB/PostGIS)
 # ───────────────────────────────────────────────────────────────
 
 from __future__ import annotations
 
 import os
+import time
+import json
+import queue
+import asyncio
 import logging
 import datetime as dt
-import json
-from typing import Any, Dict, List, Optional
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple
 
 import yaml
 from celery import Celery
+from celery.signals import worker_init, worker_ready
 from sqlalchemy import create_engine, text
+from sqlalchemy.exc import IntegrityError, InterfaceError, OperationalError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.orm import Session
 
-from config import STATUS_NORMALIZE
+from config import env_bool
+from cache import build_fingerprint_cache, ont_fingerprint
+from deadband import PowerDeadband
+import spool
+from storage import STORAGE_POLICIES, apply_storage_policies
+from ingest import (
+    POWER_WRITE_MODE, reconcile_missing, upsert_last_power, upsert_onts, write_power_rows,
+)
+from ingest_queue import (
+    INGEST_BATCH, INGEST_FLUSH_INTERVAL, INGEST_MODE, INGEST_SHARDS,
+    ack_batch, dead_letter, decode_scan, encode_scan, enqueue_scan, observe_lag, pop_batch,
+    shard_for, writer_lock,
+)
+from locks import olt_poll_lock, pop_pending
+from normalize import OntRow, normalize_scan
+from huawei_snmp import HuaweiSnmpClient, snmp_mode
+from scan_check import (
+    WHOLE_SCAN, ScanCheck, check_counts, check_scan, last_counts, merge_rescan, pon_counts,
+    previous_counts, record_counts,
+)
+from sessions import WORKER_MODE, celery_settings, run_async, session_slot
+from simulator import build_simulated_client, simulation_enabled
+from registry import (
+    current_olts, diff_configs, published_checksum, published_olts_raw,
+    publish_diff, read_config_file, reload_lock,
+)
+from scheduler import (
+    SCHEDULER_MODE, SCHEDULER_TICK, due_olts, forget_schedule, publish_schedule,
+    record_poll, reset_schedule,
+)
+from metrics import StageTimer, incr, start_http_server
 
 # ── APIs OLT ─────────────────────────────────────────────────
 try:
@@ -49,45 +87,51 @@ DB_DSN      = os.getenv("DB_DSN", "postgresql://postgres:changeme@db:5432/olt")
 CONFIG_PATH = os.getenv("OLT_CONFIG_PATH", "/config/olts.yaml")
 
 
-def env_bool(name: str, default: bool = True) -> bool:
-    value = os.getenv(name)
-    if value is None:
-        return default
-    return value.strip().lower() in {"1", "true", "t", "yes", "y", "on"}
-
-
 DELETE_MISSING_ONTS = env_bool("DELETE_ONTS", default=True)
+# Sondeos seguidos sin ver una ONT antes de borrarla, y máximo de ONTs
+# borradas por sondeo (ont_power se borra en cascada)
+DELETE_MISSING_AFTER = max(1, int(os.getenv("DELETE_MISSING_AFTER", "3")))
+DELETE_MISSING_BATCH = max(1, int(os.getenv("DELETE_MISSING_BATCH", "500")))
+# Persistir cada PON/filter según llega (clave `stream_slices` por OLT)
+STREAM_SLICES = env_bool("STREAM_SLICES", default=False)
 
 app    = Celery("collector", broker=BROKER_URL)
-engine = create_engine(DB_DSN, future=True, pool_pre_ping=True)
+# Los writers de la cola de escritura consumen su propia cola Celery
+app.conf.task_routes = {"tasks.drain_ingest_queue": {"queue": "ingest"}}
+# WORKER_MODE=io: pool de hilos (muchos sondeos por proceso, ver sessions.py)
+app.conf.update(celery_settings())
 
-# ── SQL para upsert+select de ont y bulk insert en ont_power ──
-_INSERT_POWER = text("""
-    INSERT INTO ont_power(time, ont_id, ptx, prx, status)
-    VALUES (:time, :ont_id, :ptx, :prx, :status)
-""")
+# Conexiones a la BD por proceso: en modo io las comparten todos los hilos
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20" if WORKER_MODE == "io" else "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# Con spool, una BD que no da conexión (nueva o del pool) en SPOOL_DB_DEADLINE s
+# cuenta como caída; las sentencias no tienen límite salvo SPOOL_STATEMENT_TIMEOUT
+_DEADLINES: Dict[str, Any] = {
+    "connect_args": {"connect_timeout": max(1, int(spool.SPOOL_DB_DEADLINE))},
+    "pool_timeout": spool.SPOOL_DB_DEADLINE,
+} if spool.SPOOL_ENABLED else {}
+engine = create_engine(
+    DB_DSN, future=True, pool_pre_ping=True,
+    pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+    **_DEADLINES,
+)
+# Errores de "BD no disponible" (no de datos): el escaneo va al spool
+DB_UNAVAILABLE = (OperationalError, InterfaceError, PoolTimeoutError)
+_STATEMENT_DEADLINE = text("SELECT set_config('statement_timeout', :ms, true)")
 
-_UPSERT_ONT = text("""
-    INSERT INTO ont(olt_id, vendor_ont_id, serial, model, description, status, props)
-    VALUES (:olt_id, :vendor_ont_id, :serial, :model, :description, :status, CAST(:props AS jsonb))
-    ON CONFLICT (olt_id, vendor_ont_id)
-      DO UPDATE SET
-        status = EXCLUDED.status,
-        props = EXCLUDED.props
-""")
+# Caché de huellas de ONT (ONT_CACHE_BACKEND=none|memory|redis)
+ONT_CACHE = build_fingerprint_cache()
+
+# Compresión deadband/heartbeat de ont_power (POWER_DEADBAND > 0 la activa)
+POWER_DEADBAND = PowerDeadband()
 
 # ── YAML ────────────────────────────────────────────────────
-def load_config() -> List[Dict[str, Any]]:
-    with open(CONFIG_PATH, "r") as f:
-        raw = yaml.safe_load(f)
+# Segundos entre comprobaciones de cambios en olts.yaml (0 = sin recarga)
+CONFIG_RELOAD_INTERVAL = float(os.getenv("CONFIG_RELOAD_INTERVAL", "30"))
 
-    defaults = raw.get("defaults", {})
-    out: List[Dict[str, Any]] = []
-    for olt in raw.get("olts", []):
-        cfg = defaults.copy()
-        cfg.update(olt)
-        out.append(cfg)
-    return out
+
+def load_config() -> List[Dict[str, Any]]:
+    return read_config_file(CONFIG_PATH)[1]
 
 
 OLTS = load_config()
@@ -103,9 +147,9 @@ _INSERT_OLT = text("""
         poll_interval=:pi, prompt=:prompt, description=:desc
 """)
 
-def sync_db() -> None:
+def sync_db(olts: Optional[List[Dict[str, Any]]] = None) -> None:
     with Session(engine) as db:
-        for c in OLTS:
+        for c in (OLTS if olts is None else olts):
             db.execute(_INSERT_OLT, {
                 "id": c["id"],
                 "vendor": c["vendor"],
@@ -119,11 +163,38 @@ def sync_db() -> None:
             })
         db.commit()
 
+
+def _apply_storage_policies() -> None:
+    """Chunk/compresión/retención de ont_power (ver storage.py); un fallo no impide arrancar."""
+    try:
+        with engine.begin() as conn:
+            applied = apply_storage_policies(conn)
+    except Exception as exc:
+        logging.error("No se pudieron aplicar las políticas de ont_power: %s", exc)
+        return
+    if applied:
+        compress, retention = applied["compress_after_days"], applied["retention_days"]
+        logging.info(
+            "ont_power: chunks de %s h, compresión %s, retención %s",
+            applied.get("chunk_hours", "-"),
+            f"a los {compress} días" if compress else "desactivada",
+            f"de {retention} días" if retention else "indefinida",
+        )
+
+
 # ── Factoría de clientes ───────────────────────────────────
 def build_client(cfg: Dict[str, Any]):
     timeout = cfg.get("timeout", 5)
     vendor = cfg["vendor"]
 
+    # OLT simulada (clave `simulate` en olts.yaml u OLT_SIMULATE=true)
+    if simulation_enabled(cfg):
+        return build_simulated_client(cfg, busy_error=UserBusyError)
+
+    # Huawei solo-SNMP (huawei_mode: snmp): sin sesión CLI
+    if snmp_mode(cfg):
+        return HuaweiSnmpClient(cfg)
+
     if vendor == "zyxel1408A":
         if APIOLT1408A is None:
             raise ImportError("jmq_olt_zyxel no instalado (APIOLT1408A)")
@@ -175,92 +246,887 @@ def build_client(cfg: Dict[str, Any]):
 def setup_periodic(sender, **_):
     logging.info("Sincronizando tabla 'olt'…")
     sync_db()
+    _reload_olts(force=True)
+    if STORAGE_POLICIES:
+        _apply_storage_policies()
+
+    # Un único tick lanza las OLTs vencidas (static: poll_interval fijo;
+    # adaptive: intervalo efectivo). Así altas/bajas/cambios de olts.yaml
+    # se aplican sin tocar el schedule de beat.
+    sender.add_periodic_task(
+        SCHEDULER_TICK,
+        dispatch_due_polls.s(),
+        name="dispatch_due_polls",
+    )
+    logging.info(
+        "Planificador %s: %d OLTs, tick cada %s s", SCHEDULER_MODE, len(OLTS), SCHEDULER_TICK
+    )
+
+    if CONFIG_RELOAD_INTERVAL > 0:
+        sender.add_periodic_task(
+            CONFIG_RELOAD_INTERVAL,
+            reload_config.s(),
+            name="reload_config",
+        )
+        logging.info("Recarga de %s cada %s s", CONFIG_PATH, CONFIG_RELOAD_INTERVAL)
+
+    if INGEST_MODE == "queue":
+        sender.add_periodic_task(
+            INGEST_FLUSH_INTERVAL,
+            drain_ingest_queue.s(),
+            name="drain_ingest_queue",
+        )
+        logging.info(
+            "Escritura por cola: %d shards, lotes de %d escaneos cada %s s",
+            INGEST_SHARDS, INGEST_BATCH, INGEST_FLUSH_INTERVAL,
+        )
 
-    for c in OLTS:
+    if spool.SPOOL_ENABLED:
         sender.add_periodic_task(
-            c["poll_interval"],
-            poll_single_olt.s(c),
-            name=f"poll_{c['id']}",
+            spool.SPOOL_REPLAY_INTERVAL,
+            replay_spool.s(),
+            name="replay_spool",
         )
-        logging.info("Programada 'poll_%s' cada %s s", c["id"], c["poll_interval"])
+        logging.info("Spool en %s, replay cada %s s", spool.SPOOL_DIR, spool.SPOOL_REPLAY_INTERVAL)
+
+
+@worker_init.connect
+def check_deadband_store(sender=None, **_):
+    # Caché de potencias en memoria + varios hijos prefork = cada hijo
+    # compara contra lo que escribió él: se fuerza la de Redis
+    pool = str(getattr(sender, "pool_cls", "")).lower()
+    if "thread" in pool or "solo" in pool:
+        return
+    if int(getattr(sender, "concurrency", 0) or 0) != 1:
+        POWER_DEADBAND.require_shared("un worker prefork con varios procesos")
+
+
+@worker_ready.connect
+def start_metrics_server(**_):
+    # Solo en el proceso principal del worker: los hijos escriben en Redis
+    start_http_server()
 
 # ── Huawei scan ─────────────────────────────────────────────
 from asgiref.sync import async_to_sync
 
-def _scan_huawei(client, pon_list: List[Dict[str, Any]]) -> List[dict]:
-    client.connect()
+# Reintentos por PON ante UserBusyError (backoff exponencial: base, 2·base, 4·base…)
+HUAWEI_BUSY_RETRIES = int(os.getenv("HUAWEI_BUSY_RETRIES", "3"))
+HUAWEI_BUSY_BACKOFF = float(os.getenv("HUAWEI_BUSY_BACKOFF", "2.0"))
+
+
+async def _get_pon_onts(
+    client,
+    slot: int,
+    port: int,
+    sem: asyncio.Semaphore,
+    retries: int,
+    backoff: float,
+) -> List[dict]:
+    """
+    Lee las ONTs de una PON respetando el límite de concurrencia.
+    Si la OLT responde UserBusyError se reintenta con backoff exponencial;
+    agotados los reintentos se propaga para abortar el sondeo completo
+    (no queremos persistir un escaneo parcial).
+    """
+    async with sem:
+        attempt = 0
+        while True:
+            try:
+                logging.debug("Huawei: escaneando %d/%d", slot, port)
+                return await client.get_onts(slot, port)
+            except UserBusyError:
+                if attempt >= retries:
+                    raise
+                delay = backoff * (2 ** attempt)
+                attempt += 1
+                logging.warning(
+                    "Huawei: PON %d/%d ocupada, reintento %d/%d en %.1f s",
+                    slot, port, attempt, retries, delay,
+                )
+                await asyncio.sleep(delay)
+
+
+async def _scan_huawei_pons(
+    client,
+    pon_list: List[Dict[str, Any]],
+    concurrency: int,
+    retries: int,
+    backoff: float,
+) -> List[dict]:
+    sem = asyncio.Semaphore(max(1, concurrency))
+    slices = await asyncio.gather(*(
+        _get_pon_onts(client, int(pon["slot"]), int(pon["port"]), sem, retries, backoff)
+        for pon in pon_list
+    ))
 
+    # gather conserva el orden de pon_list → resultado determinista
     onts: List[dict] = []
-    for pon in pon_list:
-        slot  = int(pon["slot"])
-        port  = int(pon["port"])
-        logging.debug("Huawei: escaneando %d/%d", slot, port)
-        slice_onts = async_to_sync(client.get_onts)(slot, port)
+    for slice_onts in slices:
         onts.extend(slice_onts)
-
-    client.disconnect()
     return onts
 
+
+def _scan_huawei(
+    client,
+    pon_list: List[Dict[str, Any]],
+    concurrency: int = 1,
+    retries: int = HUAWEI_BUSY_RETRIES,
+    backoff: float = HUAWEI_BUSY_BACKOFF,
+    targeted: bool = False,
+) -> List[dict]:
+    """
+    Escanea las PONs de una Huawei. Con `concurrency` > 1 (clave
+    `pon_concurrency` en olts.yaml) las PONs se consultan en paralelo sobre
+    un único event loop; con 1 el comportamiento es secuencial.
+    El cliente llega ya conectado (etapa "connect" de poll_single_olt).
+    En modo SNMP son walks GETBULK del chasis (`targeted`: solo esas PONs).
+    """
+    if isinstance(client, HuaweiSnmpClient):
+        return run_async(client.walk_onts, pon_list, targeted)
+    try:
+        return async_to_sync(_scan_huawei_pons)(
+            client, pon_list, concurrency, retries, backoff
+        )
+    finally:
+        client.disconnect()
+
+def _pon_key(pon: Dict[str, Any]) -> str:
+    return f"{pon.get('frame', 0)}/{pon['slot']}/{pon['port']}"
+
+
+def _iter_huawei(
+    client,
+    pon_list: List[Dict[str, Any]],
+    concurrency: int = 1,
+    retries: int = HUAWEI_BUSY_RETRIES,
+    backoff: float = HUAWEI_BUSY_BACKOFF,
+) -> Iterator[Tuple[str, List[dict]]]:
+    """
+    Como _scan_huawei pero entrega cada PON (F/S/P, ONTs) en cuanto se lee.
+    El event loop corre en un hilo aparte con la misma concurrencia; los
+    errores (UserBusyError agotado…) se propagan al terminar.
+    """
+    done: "queue.Queue[Tuple[str, List[dict]]]" = queue.Queue()
+
+    async def run() -> None:
+        sem = asyncio.Semaphore(max(1, concurrency))
+
+        async def one(pon: Dict[str, Any]) -> None:
+            onts = await _get_pon_onts(client, int(pon["slot"]), int(pon["port"]), sem, retries, backoff)
+            done.put((_pon_key(pon), onts))
+
+        await asyncio.gather(*(one(pon) for pon in pon_list))
+
+    try:
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="huawei-scan") as pool:
+            yield from _drain_slices(done, [pool.submit(async_to_sync(run))])
+    finally:
+        client.disconnect()
+
+
+def _drain_slices(
+    done: "queue.Queue[Tuple[str, List[dict]]]",
+    futures: List[Future],
+) -> Iterator[Tuple[str, List[dict]]]:
+    """Entrega los slices de `done` mientras los hilos lectores trabajan."""
+    while True:
+        try:
+            yield done.get(timeout=0.05)
+            continue
+        except queue.Empty:
+            pass
+        if all(f.done() for f in futures):
+            break
+    while not done.empty():
+        yield done.get_nowait()
+    for f in futures:
+        f.result()
+
 # ── Zyxel 1240XA scan (filters/slots) ───────────────────────
-def _scan_zyxel1240xa(client, filters: Optional[List[str]]) -> List[dict]:
+# Sesiones telnet simultáneas por OLT (clave `max_sessions` en olts.yaml)
+ZYXEL_MAX_SESSIONS = max(1, int(os.getenv("ZYXEL_MAX_SESSIONS", "1")))
+
+
+def _read_filter(client, flt: str) -> List[dict]:
+    slice_onts = client.get_all_onts(str(flt))
+    for o in slice_onts:
+        o["__filter"] = str(flt)
+    return slice_onts
+
+
+def _scan_zyxel1240xa(
+    client,
+    filters: Optional[List[str]],
+    cfg: Optional[Dict[str, Any]] = None,
+) -> List[dict]:
     """
     En 1240XA se consulta por 'filter' (slots/tarjetas), ej: "1", "2".
     - Si no se pasa lista, se usa ["1"].
     - Se agrega el campo __filter para trazabilidad.
+    - Con `max_sessions` > 1 se reparten los filters entre varias sesiones
+      (ver _iter_zyxel1240xa); el resultado sale en el orden de la lista
+      igualmente.
     """
-    use_filters = filters or ["1"]
+    use_filters = [str(f) for f in (filters or ["1"])]
+    results = dict(_iter_zyxel1240xa(client, use_filters, cfg))
 
     all_onts: List[dict] = []
     for flt in use_filters:
+        all_onts.extend(results.get(flt, ()))
+    return all_onts
+
+
+def _iter_zyxel1240xa(
+    client,
+    filters: Optional[List[str]],
+    cfg: Optional[Dict[str, Any]] = None,
+) -> Iterator[Tuple[str, List[dict]]]:
+    """
+    (filter, ONTs) según se van leyendo. Un filter que falla se registra y
+    se omite.
+    Con `max_sessions` > 1: cola de filters compartida por varias sesiones,
+    la principal (el `client` ya creado) y sesiones extra, cada una con su
+    propio cliente, en un pool de hilos. Cada sesión toma el siguiente
+    filter libre, así una tarjeta lenta no retiene a las demás.
+    Si la OLT rechaza un login extra (error al crear el cliente o en su
+    primera lectura) esa sesión devuelve el filter a la cola y termina; lo
+    que quede pendiente lo lee la sesión principal en serie.
+    """
+    use_filters = [str(f) for f in (filters or ["1"])]
+    sessions = min(int(cfg.get("max_sessions", ZYXEL_MAX_SESSIONS)) if cfg else 1, len(use_filters))
+
+    pending: "queue.Queue[str]" = queue.Queue()
+    for flt in use_filters:
+        pending.put(flt)
+    done: "queue.Queue[Tuple[str, List[dict]]]" = queue.Queue()
+
+    def drain(session, extra: bool) -> None:
+        first = True
+        while True:
+            try:
+                flt = pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                done.put((flt, _read_filter(session, flt)))
+            except Exception:
+                if extra and first:
+                    pending.put(flt)
+                    raise
+                logging.exception("1240XA: error leyendo filter=%s", flt)
+            first = False
+
+    def extra_session(n: int) -> None:
+        # Cuenta en SESSIONS_MAX / SESSIONS_PER_VENDOR; sin hueco, no se abre
+        with session_slot(cfg["vendor"], blocking=False) as free:
+            if not free:
+                logging.info("1240XA %s: sin sesiones libres para la sesión extra %d", cfg["id"], n)
+                return
+            session = None
+            try:
+                session = build_client(cfg)
+                drain(session, extra=True)
+            except Exception as exc:
+                incr("collector_zyxel_sessions_refused_total", olt_id=cfg["id"])
+                logging.warning("1240XA %s: sesión extra %d rechazada (%s), sigue en serie", cfg["id"], n, exc)
+            finally:
+                try:
+                    if session is not None:
+                        session.close()
+                except Exception:
+                    logging.debug("Cierre de sesión falló (ignorado)")
+
+    if sessions > 1:
+        with ThreadPoolExecutor(max_workers=sessions, thread_name_prefix="zyxel-session") as pool:
+            futures = [pool.submit(drain, client, False)]
+            futures += [pool.submit(extra_session, n) for n in range(1, sessions)]
+            yield from _drain_slices(done, futures)
+
+    # Serie (o filters devueltos por sesiones rechazadas tras acabar la principal)
+    while True:
+        try:
+            flt = pending.get_nowait()
+        except queue.Empty:
+            return
         try:
-            slice_onts = client.get_all_onts(str(flt))
-            for o in slice_onts:
-                o["__filter"] = str(flt)
-            all_onts.extend(slice_onts)
+            onts = _read_filter(client, flt)
         except Exception:
             logging.exception("1240XA: error leyendo filter=%s", flt)
+            continue
+        yield flt, onts
+
+# ── Escaneo por vendor ──────────────────────────────────────
+def _scan_olt(cfg: Dict[str, Any], client) -> List[dict]:
+    vendor = cfg["vendor"]
+    if vendor == "zyxel1408A":
+        return client.get_all_onts()
+    if vendor == "zyxel2406":
+        onts = client.get_all_onts()
+        aids = [o.get("AID") for o in onts if o.get("AID")]
+        logging.warning(
+            "zyxel2406 %s → onts=%d aids_first=%s aids_last=%s",
+            cfg["id"], len(onts), aids[:10], aids[-10:] if len(aids) >= 10 else aids
+        )
+        return onts
+    if vendor == "zyxel1240XA":
+        # soporta ambos nombres por compat:
+        filters = cfg.get("filters") or cfg.get("slots")
+        return _scan_zyxel1240xa(client, filters, cfg)
+    if vendor == "huawei":
+        return _scan_huawei(
+            client,
+            cfg.get("pon_list", []),
+            concurrency=int(cfg.get("pon_concurrency", 1)),
+        )
+    raise ValueError(f"Vendor {vendor} no localizado")
+
+def _rescan_olt(cfg: Dict[str, Any], slices: List[str]) -> List[dict]:
+    """Re-escaneo dirigido de los slices sospechosos (ver scan_check.py)."""
+    with session_slot(cfg["vendor"]):
+        return _rescan_session(cfg, slices)
+
+
+def _rescan_session(cfg: Dict[str, Any], slices: List[str]) -> List[dict]:
+    vendor = cfg["vendor"]
+    client = build_client(cfg)
+    if vendor == "huawei":
+        client.connect()
+    try:
+        if WHOLE_SCAN in slices:
+            return _scan_olt(cfg, client)
+        if vendor == "huawei":
+            wanted = set(slices)
+            pon_list = [
+                p for p in cfg.get("pon_list", [])
+                if f"{p.get('frame', 0)}/{p['slot']}/{p['port']}" in wanted
+            ]
+            if not pon_list and isinstance(client, HuaweiSnmpClient):
+                # En modo SNMP pon_list es opcional (walk del chasis completo)
+                pon_list = [
+                    {"frame": f, "slot": s, "port": p}
+                    for f, s, p in (pon.split("/") for pon in slices)
+                ]
+            return _scan_huawei(
+                client, pon_list, concurrency=int(cfg.get("pon_concurrency", 1)), targeted=True,
+            )
+        if vendor == "zyxel1240XA":
+            return _scan_zyxel1240xa(client, slices, cfg)
+        return _scan_olt(cfg, client)
+    finally:
+        try:
+            if hasattr(client, "close"):
+                client.close()
+        except Exception:
+            logging.debug("Cierre de sesión falló (ignorado)")
+
+# ── Persistencia ────────────────────────────────────────────
+def _persist_olt(
+    conn,
+    olt_id: str,
+    ts: dt.datetime,
+    rows: List[OntRow],
+    timer: StageTimer,
+    reconcile: bool = True,
+    power_mode: str = POWER_WRITE_MODE,
+    hold_pons: Sequence[str] = (),
+) -> Dict[str, Any]:
+    """
+    Persiste el escaneo completo de una OLT dentro de la transacción `conn`:
+    borrado de ONTs faltantes, upsert de las ONTs cuya huella cambió, batch
+    de potencias y última lectura de cada ONT (ont_last_power). Devuelve lo
+    necesario para _after_commit (cachés y métricas solo se actualizan
+    cuando la transacción ha confirmado).
+    Con reconcile=False (escaneo posiblemente truncado) no se marcan ni
+    borran ONTs ausentes; con hold_pons, solo las de esas PONs.
+    """
+    # a) Una fila por cada ONT única (dejamos la última)
+    seen: Dict[str, OntRow] = {r.vendor_ont_id: r for r in rows}
+    current_vids = list(seen.keys())
+
+    # Separa ONTs sin cambios (PK desde caché) de las que hay que upsertar
+    cached = ONT_CACHE.get_many(olt_id, current_vids)
+    mapping: Dict[str, int] = {}
+    changed: List[OntRow] = []
+    fingerprints: Dict[str, str] = {}
+    for vid, r in seen.items():
+        fp = ont_fingerprint(r)
+        hit = cached.get(vid)
+        if hit is not None and hit[0] == fp:
+            mapping[vid] = hit[1]
+        else:
+            changed.append(r)
+            fingerprints[vid] = fp
+
+    deleted: Dict[str, int] = {}
+    missing = 0
+    if reconcile:
+        missing, deleted = _reconcile(conn, olt_id, current_vids, timer, hold_pons)
+    else:
+        # Escaneo posiblemente truncado, o slice de un escaneo por slices
+        # (la reconciliación se hace al final, ver _poll_olt_stream)
+        logging.debug("OLT %s → reconciliación omitida en esta escritura", olt_id)
+    # b) Upsert set-based de las ONTs cambiadas → mapping vendor_ont_id → PK ont.id
+    with timer.stage("upsert"):
+        upserted = upsert_onts(conn, olt_id, changed)
+    mapping.update(upserted)
+
+    # c) Inserta batch de potencias
+    with timer.stage("power_insert"):
+        power_rows = [
+            {
+                "time":   ts,
+                "ont_id": mapping[r.vendor_ont_id],
+                "ptx":    r.ptx,
+                "prx":    r.prx,
+                "status": r.status,
+            }
+            for r in rows
+            if r.vendor_ont_id in mapping
+        ]
+        # Deadband/heartbeat: descarta lecturas sin cambios significativos
+        to_write = POWER_DEADBAND.filter(power_rows, conn)
+        write_power_rows(conn, to_write, power_mode)
+
+    # d) Última lectura escrita por ONT (la misma que la última de ont_power;
+    #    el deadband la usa como referencia si su caché no la tiene)
+    with timer.stage("last_power"):
+        upsert_last_power(conn, to_write)
+
+    return {
+        "olt_id":       olt_id,
+        "timer":        timer,
+        "seen":         len(seen),
+        "changed":      len(changed),
+        "fingerprints": fingerprints,
+        "upserted":     upserted,
+        "deleted_vids": list(deleted),
+        "deleted_ids":  list(deleted.values()),
+        "missing":      missing,
+        "power_rows":   len(power_rows),
+        "written":      to_write,
+    }
+
+
+def _reconcile(
+    conn, olt_id: str, vids: List[str], timer: StageTimer, hold_pons: Sequence[str] = (),
+) -> Tuple[int, Dict[str, int]]:
+    """
+    Marca/borra las ONTs de la OLT que no están en `vids`, salvo las de
+    `hold_pons` → (ausentes, {vendor_ont_id: ont.id} borradas).
+    """
+    ### CONTRIBUTOR MATIAS -> eliminar ONTs que ya no existen en la OLT de tipo Zyxel #################
+    # TODO: Testear con Huawei. Implementar casuistica Huawei vs Zyxel si procede.
+    if not DELETE_MISSING_ONTS:
+        logging.info(
+            "OLT %s → borrado de ONTs faltantes omitido por DELETE_ONTS=%s",
+            olt_id,
+            DELETE_MISSING_ONTS,
+        )
+        return 0, {}
+    # Anti-join contra los ids del escaneo; solo se borran las ONTs que
+    # llevan DELETE_MISSING_AFTER sondeos seguidos sin aparecer
+    with timer.stage("delete_missing"):
+        missing, back, deleted = reconcile_missing(
+            conn, olt_id, vids, DELETE_MISSING_AFTER, DELETE_MISSING_BATCH, hold_pons,
+        )
+    if hold_pons:
+        logging.info("OLT %s → sin reconciliar en PONs sospechosas: %s", olt_id, ", ".join(hold_pons[:10]))
+    if missing or back:
+        logging.info(
+            "OLT %s → %d ONTs ausentes en este sondeo, %d reaparecidas", olt_id, missing, back,
+        )
+    if deleted:
+        logging.info("OLT %s → %d ONTs eliminadas de la base", olt_id, len(deleted))
+    ################################################################################################
+    return missing, deleted
+
+
+def _after_commit(result: Dict[str, Any]) -> None:
+    olt_id = result["olt_id"]
+    timer: StageTimer = result["timer"]
+    seen, changed, written = result["seen"], result["changed"], result["written"]
+
+    timer.count("collector_onts_seen_total", seen)
+    timer.count("collector_onts_missing_total", result["missing"])
+    timer.count("collector_onts_deleted_total", len(result["deleted_vids"]))
+    timer.count("collector_onts_upserted_total", len(result["upserted"]))
+    timer.count("collector_power_rows_inserted_total", len(written))
+
+    if POWER_DEADBAND.enabled:
+        POWER_DEADBAND.remember(written)
+        POWER_DEADBAND.forget(result["deleted_ids"])
+        timer.count("collector_power_samples_skipped_total", result["power_rows"] - len(written))
+        logging.info(
+            "OLT %s → deadband: %d/%d lecturas escritas", olt_id, len(written), result["power_rows"],
+        )
+
+    if ONT_CACHE.enabled:
+        upserted = result["upserted"]
+        ONT_CACHE.evict(olt_id, result["deleted_vids"])
+        ONT_CACHE.set_many(olt_id, {
+            vid: (fp, upserted[vid]) for vid, fp in result["fingerprints"].items() if vid in upserted
+        })
+        hits = seen - changed
+        timer.count("collector_ont_cache_hits_total", hits)
+        timer.count("collector_ont_cache_misses_total", changed)
+        logging.info(
+            "OLT %s → caché ONT: %d/%d sin cambios (%.0f%%)",
+            olt_id, hits, seen, 100.0 * hits / seen if seen else 0.0,
+        )
+
+
+def _persist_rows(
+    cfg: Dict[str, Any],
+    ts: dt.datetime,
+    rows: List[OntRow],
+    timer: StageTimer,
+    reconcile: bool = True,
+    hold_pons: Sequence[str] = (),
+) -> None:
+    """
+    Persistencia en línea de una OLT (una transacción). Si la BD no da
+    conexión en SPOOL_DB_DEADLINE s el escaneo va al spool, y también
+    mientras la OLT tenga escaneos anteriores sin reproducir.
+    """
+    olt_id = cfg["id"]
+    if spool.pending(olt_id) and not _replay_shard(shard_for(olt_id)):
+        _spool_scan(cfg, ts, rows, reconcile, "spool pendiente", hold_pons)
+        return
+
+    def attempt() -> None:
+        with engine.begin() as conn:
+            if spool.SPOOL_ENABLED and spool.SPOOL_STATEMENT_TIMEOUT > 0:
+                conn.execute(_STATEMENT_DEADLINE, {"ms": str(int(spool.SPOOL_STATEMENT_TIMEOUT * 1000))})
+            result = _persist_olt(conn, olt_id, ts, rows, timer, reconcile, hold_pons=hold_pons)
+        _after_commit(result)
+
+    try:
+        try:
+            attempt()
+        except IntegrityError:
+            # Una PK cacheada ya no existe (ONT borrada fuera del collector):
+            # se vacía la caché de la OLT y se reintenta una vez sin ella.
+            if not ONT_CACHE.enabled:
+                raise
+            logging.warning("OLT %s → caché de ONTs inconsistente, se reintenta sin caché", olt_id)
+            ONT_CACHE.clear(olt_id)
+            attempt()
+    except DB_UNAVAILABLE as exc:
+        if not spool.SPOOL_ENABLED:
+            raise
+        _spool_scan(cfg, ts, rows, reconcile, exc, hold_pons)
+
+
+def _spool_scan(
+    cfg: Dict[str, Any], ts: dt.datetime, rows: List[OntRow], reconcile: bool, reason: Any,
+    hold_pons: Sequence[str] = (),
+) -> None:
+    logging.warning("OLT %s → %d filas al spool (%s)", cfg["id"], len(rows), reason)
+    data = encode_scan(cfg["id"], cfg["vendor"], ts, rows, reconcile, hold_pons)
+    if not spool.append(cfg["id"], data):
+        raise RuntimeError(f"OLT {cfg['id']}: BD no disponible y spool sin espacio")
+
+
+def _spool_payloads(payloads: List[Dict[str, Any]]) -> None:
+    """Escaneos de la cola de escritura al spool (o a dead letter si no caben)."""
+    for p in payloads:
+        if not (spool.SPOOL_ENABLED and spool.append(p["olt_id"], json.dumps(p, separators=(",", ":")))):
+            logging.error("OLT %s → escaneo encolado no escrito: BD no disponible", p["olt_id"])
+            dead_letter(p)
+
+
+# ── Writers de la cola de escritura (INGEST_MODE=queue) ─────
+def _persist_batch(payloads: List[Dict[str, Any]], power_mode: str = POWER_WRITE_MODE) -> None:
+    """Varios escaneos (de OLTs distintas o no) en una única transacción."""
+    results = []
+    with engine.begin() as conn:
+        for p in payloads:
+            timer = StageTimer(olt_id=p["olt_id"], vendor=p["vendor"])
+            ts, rows = decode_scan(p)
+            results.append(_persist_olt(
+                conn, p["olt_id"], ts, rows, timer, p.get("reconcile", True), power_mode,
+                hold_pons=p.get("hold_pons", ()),
+            ))
+    for p, result in zip(payloads, results):
+        _after_commit(result)
+        observe_lag(p)
+        result["timer"].log(outcome="written", rows=len(p["rows"]))
+
+
+def _drain_shard(shard: int) -> int:
+    written = 0
+    while True:
+        payloads = pop_batch(shard)
+        if not payloads:
+            return written
+        # Orden por OLT: con escaneos del shard en el spool, estos van detrás
+        if spool.pending_shard(shard) and not _replay_shard(shard):
+            _spool_payloads(payloads)
+            ack_batch(shard)
+            continue
+        try:
+            _persist_batch(payloads)
+        except DB_UNAVAILABLE as exc:
+            logging.warning("Cola de escritura: BD no disponible (%s), lote al spool", exc)
+            _spool_payloads(payloads)
+            ack_batch(shard)
+            return written
+        except IntegrityError:
+            # Caché de PKs inconsistente en alguna OLT del lote: se vacía y se reintenta
+            if ONT_CACHE.enabled:
+                for oid in {p["olt_id"] for p in payloads}:
+                    ONT_CACHE.clear(oid)
+            _persist_each(payloads)
+        except Exception as exc:
+            logging.warning("Cola de escritura: lote fallido (%s), se escribe escaneo a escaneo", exc)
+            _persist_each(payloads)
+        # Solo tras el commit (o spool / dead de cada escaneo) sale de la lista de proceso
+        ack_batch(shard)
+        incr("collector_ingest_batches_total", shard=shard)
+        written += len(payloads)
+        if len(payloads) < INGEST_BATCH:
+            return written
+
+
+def _persist_each(payloads: List[Dict[str, Any]]) -> None:
+    # Aísla el escaneo problemático sin perder el resto del lote
+    for i, p in enumerate(payloads):
+        try:
+            _persist_batch([p])
+        except DB_UNAVAILABLE:
+            _spool_payloads(payloads[i:])
+            return
+        except Exception as exc:
+            logging.error("OLT %s → escaneo encolado no escrito: %s", p["olt_id"], exc)
+            dead_letter(p)
+
+
+@app.task
+def drain_ingest_queue() -> None:
+    total = 0
+    for shard in range(INGEST_SHARDS):
+        with writer_lock(shard) as acquired:
+            if not acquired:
+                continue  # otro writer está vaciando este shard
+            total += _drain_shard(shard)
+    if total:
+        logging.info("Cola de escritura: %d escaneos escritos", total)
+
+
+# ── Replay del spool (BD recuperada) ────────────────────────
+def _replay_shard(shard: int) -> bool:
+    """
+    Reproduce en orden los segmentos del shard, en lotes de
+    SPOOL_REPLAY_BATCH escaneos por transacción con COPY para ont_power.
+    El offset de cada segmento se guarda tras cada lote confirmado, así una
+    caída a mitad no duplica lecturas. True si el shard queda vacío.
+    """
+    replayed = 0
+    with spool.replay_lock(shard) as acquired:
+        if not acquired:
+            return False  # otro proceso está reproduciendo este shard
+        try:
+            for segment in spool.seal(shard):
+                batch: List[Tuple[int, Dict[str, Any]]] = []
+                for end, data in spool.read_records(segment, spool.read_offset(segment)):
+                    if data is not None:
+                        batch.append((end, json.loads(data)))
+                    if len(batch) >= spool.SPOOL_REPLAY_BATCH:
+                        replayed += _replay_batch(segment, batch)
+                        batch = []
+                if batch:
+                    replayed += _replay_batch(segment, batch)
+                spool.remove(segment)
+        except DB_UNAVAILABLE as exc:
+            logging.warning("Spool shard %d: BD aún no disponible (%s)", shard, exc)
+            return False
+        finally:
+            if replayed:
+                incr("collector_spool_replayed_total", replayed, shard=shard)
+                logging.info("Spool shard %d: %d escaneos reproducidos", shard, replayed)
+    return not spool.pending_shard(shard)
+
+
+def _replay_batch(segment: str, batch: List[Tuple[int, Dict[str, Any]]]) -> int:
+    payloads = [p for _, p in batch]
+    try:
+        _persist_batch(payloads, power_mode="copy")
+    except DB_UNAVAILABLE:
+        raise
+    except Exception as exc:
+        logging.warning("Spool: lote fallido (%s), se reproduce escaneo a escaneo", exc)
+        if ONT_CACHE.enabled:
+            for oid in {p["olt_id"] for p in payloads}:
+                ONT_CACHE.clear(oid)
+        for end, p in batch:
+            try:
+                _persist_batch([p], power_mode="copy")
+            except DB_UNAVAILABLE:
+                raise
+            except Exception as exc_one:
+                logging.error("OLT %s → escaneo del spool no escrito: %s", p["olt_id"], exc_one)
+                dead_letter(p)
+            spool.commit_offset(segment, end)
+    spool.commit_offset(segment, batch[-1][0])
+    return len(batch)
+
+
+@app.task
+def replay_spool() -> None:
+    for shard in spool.shards():
+        if spool.pending_shard(shard):
+            _replay_shard(shard)
+
+
+# ── Planificador ────────────────────────────────────────────
+def _record_schedule(cfg: Dict[str, Any], duration: float, outcome: str) -> None:
+    state = record_poll(cfg, duration, outcome)
+    if state is None:
+        return
+    try:
+        with engine.begin() as conn:
+            publish_schedule(conn, cfg, state)
+    except Exception as exc:
+        logging.warning("OLT %s → olt_schedule no actualizada: %s", cfg["id"], exc)
+
+
+@app.task
+def dispatch_due_polls() -> None:
+    """Tick del planificador: lanza las OLTs cuyo vencimiento ha pasado."""
+    olts = current_olts()
+    if olts is None:
+        # Registro perdido (Redis reiniciado): se republica desde el fichero
+        _reload_olts(force=True)
+        olts = current_olts() or OLTS
+    for c in due_olts(olts):
+        poll_single_olt.delay(c)
+
+
+# ── Recarga en caliente de olts.yaml ────────────────────────
+_last_config_stat: Optional[Tuple[int, int]] = None
+
+
+def _reload_olts(force: bool = False) -> None:
+    """
+    Aplica el diff entre olts.yaml y el registro publicado: sync_db y
+    replanificación solo de las OLTs añadidas/cambiadas; las retiradas dejan
+    de sondearse (sus filas en `olt` y su histórico se conservan).
+    """
+    global OLTS, _last_config_stat
+    try:
+        st = os.stat(CONFIG_PATH)
+    except OSError as exc:
+        logging.warning("No se puede leer %s: %s", CONFIG_PATH, exc)
+        return
+    stat_key = (st.st_mtime_ns, st.st_size)
+    if not force and stat_key == _last_config_stat:
+        return
+
+    lock = reload_lock()
+    if not lock.acquire():
+        return
+    try:
+        checksum, olts = read_config_file(CONFIG_PATH)
+        if not force and checksum == published_checksum():
+            _last_config_stat = stat_key
+            OLTS = olts
+            return
+
+        diff = diff_configs(published_olts_raw(), olts)
+        added, removed, changed = diff
+        if added or changed:
+            sync_db(added + changed)
+        for c in changed:
+            reset_schedule(c["id"])
+        if removed:
+            for olt_id in removed:
+                forget_schedule(olt_id)
+            with engine.begin() as conn:
+                conn.execute(
+                    text("DELETE FROM olt_schedule WHERE olt_id = ANY(:ids)"),
+                    {"ids": removed},
+                )
+        publish_diff(checksum, diff)
+
+        OLTS = olts
+        _last_config_stat = stat_key
+        if added or removed or changed:
+            logging.info(
+                "olts.yaml recargado: altas=%s bajas=%s cambios=%s",
+                [c["id"] for c in added], removed, [c["id"] for c in changed],
+            )
+    except yaml.YAMLError as exc:
+        logging.error("olts.yaml inválido, se mantiene la configuración anterior: %s", exc)
+    finally:
+        try:
+            lock.release()
+        except Exception:
+            logging.debug("Lock de recarga ya liberado")
+
+
+@app.task
+def reload_config() -> None:
+    _reload_olts()
 
-    return all_onts
 
 # ── Poll ────────────────────────────────────────────────────
 @app.task
 def poll_single_olt(cfg: Dict[str, Any]) -> None:
+    with olt_poll_lock(cfg["id"]) as acquired:
+        if not acquired:
+            return
+        t0 = time.monotonic()
+        timer = StageTimer(olt_id=cfg["id"], vendor=cfg["vendor"])
+        outcome = "error"
+        try:
+            outcome = _poll_olt(cfg, timer)
+        finally:
+            timer.count("collector_polls_total", 1)
+            timer.log(outcome=outcome)
+            _record_schedule(cfg, time.monotonic() - t0, outcome)
+
+    # Modo coalesce: si hubo solapes mientras sondeábamos, un único sondeo más
+    if pop_pending(cfg["id"]):
+        logging.info("OLT %s → relanzando sondeo aplazado por solape", cfg["id"])
+        poll_single_olt.delay(cfg)
+
+
+def _read_olt(cfg: Dict[str, Any], timer: StageTimer) -> Tuple[Optional[List[dict]], str]:
+    """
+    Conecta y lee las ONTs → (onts, "") o (None, resultado del sondeo) si
+    falla o si el escaneo por slices ya lo ha persistido todo.
+    """
     vendor = cfg["vendor"]
-    logging.info("Sondeando OLT %s (%s)…", cfg["id"], vendor)
 
-    # 1 ▸ crear cliente
+    # 1 ▸ crear cliente (Huawei requiere connect() explícito)
     try:
-        client = build_client(cfg)
+        with timer.stage("connect"):
+            client = build_client(cfg)
+            if vendor == "huawei":
+                client.connect()
     except ImportError as exc:
         logging.error("Cliente no disponible: %s", exc)
-        return
+        return None, "error"
+    except UserBusyError:
+        logging.warning("OLT %s ocupado, se reintentará", cfg["id"])
+        return None, "busy"
+    except Exception as exc:
+        logging.exception("Error conectando con %s: %s", cfg["id"], exc)
+        return None, "error"
+
+    if cfg.get("stream_slices", STREAM_SLICES):
+        return None, _poll_olt_stream(cfg, client, timer)
 
     # 2 ▸ consulta ONTs
     try:
-        if vendor == "zyxel1408A":
-            onts = client.get_all_onts()
-        elif vendor == "zyxel2406":
-            onts = client.get_all_onts()
-            aids = [o.get("AID") for o in onts if o.get("AID")]
-            logging.warning(
-                "zyxel2406 %s → onts=%d aids_first=%s aids_last=%s",
-                cfg["id"], len(onts), aids[:10], aids[-10:] if len(aids) >= 10 else aids
-            )
-        elif vendor == "zyxel1240XA":
-            # soporta ambos nombres por compat:
-            filters = cfg.get("filters") or cfg.get("slots")
-            onts = _scan_zyxel1240xa(client, filters)
-        elif vendor == "huawei":
-            onts = _scan_huawei(client, cfg.get("pon_list", []))
-        else:
-            logging.warning("Vendor %s no localizado", vendor)
-            return
+        with timer.stage("scan"):
+            return _scan_olt(cfg, client), ""
     except UserBusyError:
         logging.warning("OLT %s ocupado, se reintentará", cfg["id"])
-        return
+        return None, "busy"
     except Exception as exc:
         logging.exception("Error consultando %s: %s", cfg["id"], exc)
-        return
+        return None, "error"
     finally:
         # Cierre homogéneo si el cliente lo soporta (Zyxel suele exponer close()).
         try:
@@ -269,171 +1135,233 @@ def poll_single_olt(cfg: Dict[str, Any]) -> None:
         except Exception:
             logging.debug("Cierre de sesión falló (ignorado)")
 
-    # 3 ▸ construye filas con metadatos y potencias
+
+def _poll_olt(cfg: Dict[str, Any], timer: StageTimer) -> str:
+    """Sondea y persiste una OLT. Devuelve el resultado: ok|partial|empty|busy|error."""
+    vendor = cfg["vendor"]
+    logging.info("Sondeando OLT %s (%s)…", cfg["id"], vendor)
+
+    # 1-2 ▸ sesión con la OLT (limitada por SESSIONS_MAX / SESSIONS_PER_VENDOR)
+    with session_slot(vendor):
+        onts, outcome = _read_olt(cfg, timer)
+    if onts is None:
+        return outcome
+
+    # 3 ▸ normaliza a filas compactas (metadatos y potencias)
     now = dt.datetime.utcnow()
-    rows: List[Dict[str, Any]] = []
+    with timer.stage("normalize"):
+        rows = normalize_scan(vendor, onts)
 
-    def to_f(val: Any) -> float:
-        try:
-            if val is None:
-                return 0.0
-            return float(str(val).replace(" dBm", "").strip())
-        except (TypeError, ValueError):
-            return 0.0
+    if not rows:
+        logging.warning("OLT %s devolvió 0 ONTs", cfg["id"])
+        return "empty"
 
-    for ont in onts:
-        if vendor == "huawei":
-            vid = f"{ont.get('schema_fsp')}/{ont.get('id')}"
-            meta = {
-                "id":           vid,
-                "schema_fsp":   ont.get("schema_fsp"),
-                "control_flag": ont.get("control_flag"),
-                "run_state":    ont.get("run_state"),
-                "config_state": ont.get("config_state"),
-                "match_state":  ont.get("match_state"),
-                "protect_side": ont.get("protect_side"),
-            }
-            ptx = to_f(ont.get("ptx") or ont.get("tx"))
-            prx = to_f(ont.get("prx") or ont.get("rx"))
-            status = STATUS_NORMALIZE["huawei"].get(ont.get("run_state"), 98)
-            sn = ont.get("sn")
-            model = None
-            description = ont.get("description")
-
-        elif vendor in ("zyxel1408A", "zyxel2406", "zyxel1240XA"):
-            aid = ont.get("AID")
-            if not aid:
-                logging.debug("Descartado dict sin AID (%s): %s", vendor, ont)
-                continue
-
-            vid = aid
-
-            # Normaliza status (puede venir como "IS", "Active", etc.)
-            raw_status = ont.get("Status")
-            raw_status_norm = str(raw_status).strip().upper() if raw_status is not None else None
-            status = STATUS_NORMALIZE[vendor].get(raw_status_norm, 98)
-
-            meta = {
-                "AID":         aid,
-                "Status":      raw_status,
-                "SN":          ont.get("SN"),
-                "Model":       ont.get("Model"),
-                "__vendor":    vendor,
-            }
-            # trazabilidad de filter/slot en 1240XA
-            if vendor == "zyxel1240XA" and "__filter" in ont:
-                meta["filter"] = ont.get("__filter")
-
-            # ptx/prx: por lo general Zyxel expone ONT Rx; ONT Tx puede no existir.
-            ptx = to_f(ont.get("ONT Tx") or ont.get("tx") or ont.get("Tx") or ont.get("PTX"))
-            prx = to_f(ont.get("ONT Rx") or ont.get("rx") or ont.get("Rx") or ont.get("PRX"))
-
-            sn = ont.get("SN")
-            model = ont.get("Model")
-            description = ont.get("Description")
-
-            # Campos extra en 1408A/2406 (no siempre presentes)
-            if "Template-ID" in ont:
-                meta["Template-ID"] = ont.get("Template-ID")
-            if "FW Version" in ont:
-                meta["FW Version"] = ont.get("FW Version")
-            if "Distance" in ont:
-                meta["Distance"] = ont.get("Distance")
+    # 3b ▸ ¿escaneo truncado? re-escaneo dirigido y, si persiste, sin
+    #      reconciliar las PONs sospechosas (o la OLT entera)
+    rows, check = _check_scan(cfg, rows, timer)
+    outcome = "partial" if check.suspicious else "ok"
+    reconcile, hold = check.hold_pons is not None, check.hold_pons or []
 
-        else:
-            logging.warning("Vendor %s no soportado al procesar ONTs", vendor)
-            continue
+    # 4 ▸ upsert en ont y bulk insert en ont_power
+    #     (INGEST_MODE=queue: se delega en los writers salvo backpressure)
+    if INGEST_MODE == "queue" and enqueue_scan(
+        cfg["id"], vendor, now, rows, reconcile=reconcile, hold_pons=hold,
+    ):
+        logging.info("OLT %s → %d registros encolados para escritura", cfg["id"], len(rows))
+    else:
+        _persist_rows(cfg, now, rows, timer, reconcile=reconcile, hold_pons=hold)
+        logging.info("OLT %s → %d registros insertados", cfg["id"], len(rows))
 
-        rows.append({
-            "time":          now,
-            "vendor_ont_id": vid,
-            "ptx":           ptx,
-            "prx":           prx,
-            "status":        status,
-            "serial":        sn,
-            "model":         model,
-            "description":   description,
-            "props":         json.dumps(meta),
-        })
+    # Referencia del siguiente sondeo (ver scan_check.py)
+    record_counts(cfg["id"], pon_counts(vendor, rows))
+    return outcome
 
-    if not rows:
+
+# ── Escaneo por slices (STREAM_SLICES) ─────────────────────
+def _iter_scan(cfg: Dict[str, Any], client) -> Iterator[Tuple[str, List[dict]]]:
+    """(slice, ONTs) por PON (Huawei CLI) o filter (1240XA) según se leen."""
+    vendor = cfg["vendor"]
+    if vendor == "huawei" and not isinstance(client, HuaweiSnmpClient):
+        yield from _iter_huawei(
+            client, cfg.get("pon_list", []), concurrency=int(cfg.get("pon_concurrency", 1)),
+        )
+    elif vendor == "zyxel1240XA":
+        yield from _iter_zyxel1240xa(client, cfg.get("filters") or cfg.get("slots"), cfg)
+    else:
+        # 1408A/2406 y Huawei SNMP leen la OLT completa de una vez
+        yield WHOLE_SCAN, _scan_olt(cfg, client)
+
+
+def _poll_olt_stream(cfg: Dict[str, Any], client, timer: StageTimer) -> str:
+    """
+    Variante de _poll_olt por slices: cada PON/filter se normaliza y se
+    persiste (o encola) en cuanto llega, en su propia transacción. En
+    memoria solo quedan los ids vistos y el recuento por PON; con ellos se
+    comprueba el escaneo (scan_check) y se reconcilia al final. Un sondeo
+    que falla a medias deja escritas las lecturas ya leídas pero nunca
+    marca ni borra ONTs.
+    """
+    vendor = cfg["vendor"]
+    now = dt.datetime.utcnow()
+    vids: Set[str] = set()
+    counts: Dict[str, int] = {}
+    n_slices = 0
+
+    def flush(rows: List[OntRow]) -> None:
+        # Solo ONTs nuevas en este sondeo (el re-escaneo completa, no duplica)
+        fresh = list({r.vendor_ont_id: r for r in rows if r.vendor_ont_id not in vids}.values())
+        if not fresh:
+            return
+        vids.update(r.vendor_ont_id for r in fresh)
+        for pon, n in pon_counts(vendor, fresh).items():
+            counts[pon] = counts.get(pon, 0) + n
+        if INGEST_MODE == "queue" and enqueue_scan(cfg["id"], vendor, now, fresh, reconcile=False):
+            return
+        _persist_rows(cfg, now, fresh, timer, reconcile=False)
+
+    slices = _iter_scan(cfg, client)
+    try:
+        while True:
+            try:
+                with timer.stage("scan"):
+                    item = next(slices, None)
+            except UserBusyError:
+                logging.warning("OLT %s ocupado, se reintentará", cfg["id"])
+                return "busy"
+            except Exception as exc:
+                logging.exception("Error consultando %s: %s", cfg["id"], exc)
+                return "error"
+            if item is None:
+                break
+            key, onts = item
+            with timer.stage("normalize"):
+                rows = normalize_scan(vendor, onts)
+            del onts
+            flush(rows)
+            n_slices += 1
+            logging.debug("OLT %s → slice %s: %d ONTs", cfg["id"], key, len(rows))
+    finally:
+        slices.close()
+        try:
+            if hasattr(client, "close"):
+                client.close()
+        except Exception:
+            logging.debug("Cierre de sesión falló (ignorado)")
+
+    if not vids:
         logging.warning("OLT %s devolvió 0 ONTs", cfg["id"])
+        return "empty"
+
+    check = _check_slices(cfg, counts, timer, flush)
+    if check.hold_pons is not None:
+        _reconcile_olt(cfg, list(vids), timer, check.hold_pons)
+    record_counts(cfg["id"], counts)
+    logging.info("OLT %s → %d registros en %d slices", cfg["id"], len(vids), n_slices)
+    return "partial" if check.suspicious else "ok"
+
+
+def _reconcile_olt(
+    cfg: Dict[str, Any], vids: List[str], timer: StageTimer, hold_pons: Sequence[str] = (),
+) -> None:
+    """
+    Reconciliación de un escaneo por slices, en su propia transacción. Si
+    hay slices en el spool (o la BD no responde) se deja para un sondeo
+    posterior: reconciliar antes del replay desordenaría missing_polls.
+    """
+    if spool.pending(cfg["id"]):
+        logging.warning("OLT %s → escaneo en el spool: reconciliación aplazada", cfg["id"])
+        return
+    try:
+        with engine.begin() as conn:
+            missing, deleted = _reconcile(conn, cfg["id"], vids, timer, hold_pons)
+    except DB_UNAVAILABLE as exc:
+        logging.warning("OLT %s → reconciliación aplazada: BD no disponible (%s)", cfg["id"], exc)
         return
+    timer.count("collector_onts_missing_total", missing)
+    timer.count("collector_onts_deleted_total", len(deleted))
+    POWER_DEADBAND.forget(list(deleted.values()))
+    if ONT_CACHE.enabled:
+        ONT_CACHE.evict(cfg["id"], list(deleted))
 
-    # 4 ▸ upsert en ont y bulk insert en ont_power
-    with engine.begin() as conn:
-        # a) Prepara un dict por cada ONT única (dejamos el último)
-        seen: Dict[str, Dict[str, Any]] = {}
-        for r in rows:
-            seen[r["vendor_ont_id"]] = r
-
-        ### CONTRIBUTOR MATIAS -> eliminar ONTs que ya no existen en la OLT de tipo Zyxel #################
-        # TODO: Testear con Huawei. Implementar casuistica Huawei vs Zyxel si procede.
-        current_vids = list(seen.keys())
-        if DELETE_MISSING_ONTS:
-            result = conn.execute(
-                text("""
-                    DELETE FROM ont
-                    WHERE olt_id = :olt_id
-                    AND vendor_ont_id NOT IN :vids
-                """),
-                {
-                    "olt_id": cfg["id"],
-                    "vids": tuple(current_vids) if current_vids else ("__none__",),
-                },
-            )
 
-            deleted = result.rowcount or 0
-            if deleted:
-                logging.info("OLT %s → %d ONTs eliminadas de la base", cfg["id"], deleted)
-        else:
-            logging.info(
-                "OLT %s → borrado de ONTs faltantes omitido por DELETE_ONTS=%s",
-                cfg["id"],
-                DELETE_MISSING_ONTS,
-            )
-        ################################################################################################
-        # b) Upsert ONTs
-        for vid, r in seen.items():
-            conn.execute(
-                _UPSERT_ONT,
-                {
-                    "olt_id":        cfg["id"],
-                    "vendor_ont_id": vid,
-                    "serial":        r["serial"],
-                    "model":         r["model"],
-                    "description":   r["description"],
-                    "status":        r["status"],
-                    "props":         r["props"],
-                },
-            )
+def _check_slices(
+    cfg: Dict[str, Any], counts: Dict[str, int], timer: StageTimer, flush,
+) -> ScanCheck:
+    """_check_scan sobre el recuento por PON; el re-escaneo se vuelca con `flush`."""
+    previous = _previous_counts(cfg)
+    check = check_counts(cfg, counts, previous)
+    if not check.suspicious:
+        return check
 
-        # c) Recupera mapping vendor_ont_id → PK ont.id
-        mapping = dict(conn.execute(
-            text("""
-                SELECT vendor_ont_id, id
-                FROM ont
-                WHERE olt_id = :olt_id
-                AND vendor_ont_id = ANY(:vids)
-            """),
-            {
-                "olt_id": cfg["id"],
-                "vids": current_vids
-            },
-        ).all())
+    timer.count("collector_scan_suspicious_total", 1)
+    logging.warning("OLT %s → escaneo sospechoso: %s", cfg["id"], check.reason)
 
-        # d) Inserta batch de potencias
-        power_rows = [
-            {
-                "time":   r["time"],
-                "ont_id": mapping[r["vendor_ont_id"]],
-                "ptx":    r["ptx"],
-                "prx":    r["prx"],
-                "status": r["status"],
-            }
-            for r in rows
-            if r["vendor_ont_id"] in mapping
-        ]
-        conn.execute(_INSERT_POWER, power_rows)
+    if cfg.get("retry_once", True):
+        try:
+            with timer.stage("rescan"):
+                flush(normalize_scan(cfg["vendor"], _rescan_olt(cfg, check.slices)))
+            check = check_counts(cfg, counts, previous)
+        except Exception as exc:
+            logging.warning("OLT %s → re-escaneo fallido: %s", cfg["id"], exc)
+        if not check.suspicious:
+            logging.info("OLT %s → re-escaneo completo (%d ONTs)", cfg["id"], sum(counts.values()))
+            return check
+
+    timer.count("collector_scan_truncated_total", 1)
+    logging.warning(
+        "OLT %s → %d ONTs persistidas sin reconciliar %s: %s",
+        cfg["id"], sum(counts.values()), _held(check), check.reason,
+    )
+    return check
+
+
+def _held(check: ScanCheck) -> str:
+    if check.hold_pons is None:
+        return "la OLT"
+    return f"{len(check.hold_pons)} PONs"
+
+
+def _previous_counts(cfg: Dict[str, Any]) -> Dict[str, int]:
+    """Recuento por PON del último escaneo persistido; sin él, del inventario."""
+    last = last_counts(cfg["id"])
+    if last is not None:
+        return last
+    try:
+        with engine.connect() as conn:
+            return previous_counts(conn, cfg["id"])
+    except Exception as exc:
+        logging.warning("OLT %s → sin recuento previo por PON (%s)", cfg["id"], exc)
+        return {}
+
+
+def _check_scan(
+    cfg: Dict[str, Any], rows: List[OntRow], timer: StageTimer,
+) -> Tuple[List[OntRow], ScanCheck]:
+    """Devuelve (filas, comprobación final tras el re-escaneo). Ver scan_check.py."""
+    vendor = cfg["vendor"]
+    previous = _previous_counts(cfg)
+    check = check_scan(cfg, rows, previous)
+    if not check.suspicious:
+        return rows, check
+
+    timer.count("collector_scan_suspicious_total", 1)
+    logging.warning("OLT %s → escaneo sospechoso: %s", cfg["id"], check.reason)
+
+    if cfg.get("retry_once", True):
+        try:
+            with timer.stage("rescan"):
+                rescanned = normalize_scan(vendor, _rescan_olt(cfg, check.slices))
+            rows = merge_rescan(vendor, rows, rescanned)
+            check = check_scan(cfg, rows, previous)
+        except Exception as exc:
+            logging.warning("OLT %s → re-escaneo fallido: %s", cfg["id"], exc)
+        if not check.suspicious:
+            logging.info("OLT %s → re-escaneo completo (%d ONTs)", cfg["id"], len(rows))
+            return rows, check
 
-    logging.info("OLT %s → %d registros insertados", cfg["id"], len(rows))
+    timer.count("collector_scan_truncated_total", 1)
+    logging.warning(
+        "OLT %s → se persisten %d ONTs sin reconciliar %s: %s",
+        cfg["id"], len(rows), _held(check), check.reason,
+    )
+    return rows, check
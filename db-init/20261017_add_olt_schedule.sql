@@ -0,0 +1,22 @@
+-- db-init/20261017_add_olt_schedule.sql
+-- Estado del planificador de sondeos por OLT (lo escribe el collector tras
+-- cada sondeo y lo expone la API en /olts/schedule).
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS olt_schedule (
+    olt_id             TEXT PRIMARY KEY
+                       REFERENCES olt(id) ON DELETE CASCADE,
+    mode               TEXT NOT NULL,                 -- static | adaptive
+    base_interval      INT  NOT NULL,                 -- poll_interval de olts.yaml (s)
+    effective_interval DOUBLE PRECISION NOT NULL,     -- intervalo aplicado (s)
+    avg_duration       DOUBLE PRECISION,              -- EWMA duración del sondeo (s)
+    failure_rate       DOUBLE PRECISION,              -- EWMA de errores (0..1)
+    busy_rate          DOUBLE PRECISION,              -- EWMA de UserBusyError (0..1)
+    last_outcome       TEXT,                          -- ok | empty | busy | error
+    last_poll          TIMESTAMPTZ,
+    next_due           TIMESTAMPTZ,
+    updated_at         TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+COMMIT;
@@ -0,0 +1,28 @@
+-- db-init/20261017_add_ont_last_power.sql
+-- Última lectura por ONT. La mantiene el collector en la misma transacción
+-- que escribe ont_power; /geo y /onts la cruzan directamente en lugar de un
+-- DISTINCT ON sobre todo el hypertable.
+
+BEGIN;
+
+-- fillfactor < 100: cada sondeo reescribe la fila y sin índices sobre las
+-- columnas actualizadas los UPDATE quedan HOT (sin tocar la PK)
+CREATE TABLE IF NOT EXISTS ont_last_power (
+    ont_id BIGINT PRIMARY KEY
+           REFERENCES ont(id) ON DELETE CASCADE,
+    time   TIMESTAMPTZ NOT NULL,
+    ptx    NUMERIC,
+    prx    NUMERIC,
+    status INTEGER
+) WITH (fillfactor = 70);
+
+-- Carga inicial desde el histórico (una sola vez)
+INSERT INTO ont_last_power (ont_id, time, ptx, prx, status)
+SELECT DISTINCT ON (ont_id) ont_id, time, ptx, prx, status
+  FROM ont_power
+ ORDER BY ont_id, time DESC
+ON CONFLICT (ont_id) DO NOTHING;
+
+COMMIT;
+
+ANALYZE ont_last_power;
@@ -0,0 +1,16 @@
+-- db-init/20261017_add_ont_missing_polls.sql
+-- Reconciliación diferida de ONTs desaparecidas: cada sondeo en el que una
+-- ONT no aparece suma 1; el collector solo la borra (con su histórico, en
+-- cascada) al llegar a DELETE_MISSING_AFTER sondeos seguidos.
+
+BEGIN;
+
+ALTER TABLE ont
+  ADD COLUMN IF NOT EXISTS missing_polls INTEGER NOT NULL DEFAULT 0;
+
+-- Pocas filas con missing_polls > 0: índice parcial para el reset y el borrado
+CREATE INDEX IF NOT EXISTS ont_missing_polls_idx
+  ON ont (olt_id, missing_polls)
+  WHERE missing_polls > 0;
+
+COMMIT;
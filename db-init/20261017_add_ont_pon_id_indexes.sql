@@ -0,0 +1,27 @@
+-- db-init/20261017_add_ont_pon_id_indexes.sql
+-- Los endpoints /ui/* filtran y agrupan por ont.pon_id (columna mantenida
+-- por trg_ont_set_pon_id, ver 20260121_add_pon_id_cache.sql) en lugar de
+-- derivarla fila a fila: estos índices sirven esos WHERE/GROUP BY.
+-- Comprobación: test/check_pon_id.py (consistencia y planes EXPLAIN).
+
+BEGIN;
+
+-- Re-deriva las filas desalineadas (p. ej. ONTs anteriores al trigger)
+UPDATE ont o
+   SET pon_id = agis_derive_pon_id(ol.vendor, o.vendor_ont_id)
+  FROM olt ol
+ WHERE ol.id = o.olt_id
+   AND o.pon_id IS DISTINCT FROM agis_derive_pon_id(ol.vendor, o.vendor_ont_id);
+
+-- /ui/olts/{id}/pons, /ui/onts, /ui/onts/search, /ui/onts/geo
+CREATE INDEX IF NOT EXISTS ont_olt_pon_idx
+  ON ont (olt_id, pon_id);
+
+-- /ui/unlocated/groups y /ui/onts?only_unlocated=1
+CREATE INDEX IF NOT EXISTS ont_olt_pon_unlocated_idx
+  ON ont (olt_id, pon_id)
+  WHERE geom IS NULL;
+
+COMMIT;
+
+ANALYZE ont;
@@ -0,0 +1,113 @@
+-- db-init/20261017_add_ont_power_aggregates.sql
+-- Agregados continuos de ont_power (TimescaleDB) para /metrics/ y
+-- /onts/{id}/history con resolution=5m|1h|1d|auto.
+-- • ont_power_5m se calcula del hypertable; ont_power_1h sale de 5m y
+--   ont_power_1d de 1h (agregados jerárquicos): por eso se guardan suma y
+--   nº de muestras en lugar de la media (avg = sum / n en la API).
+-- • st_agg: state_agg de Timescale Toolkit (incluido en timescaledb-ha)
+--   sobre el status ('0' down, '1' up, '2' LOS, '3' sin energía, resto
+--   'other'). Guarda cuándo empieza cada estado, así que la API obtiene
+--   segundos reales en cada status (interpolated_duration_in, con el
+--   estado heredado del bucket anterior) aunque el deadband omita
+--   lecturas o la ONT aparezca a mitad de bucket. 1h/1d usan rollup().
+-- • materialized_only = false: el tramo aún no materializado se calcula
+--   al vuelo, así el último bucket está siempre al día.
+-- Sin BEGIN/COMMIT: refresh_continuous_aggregate no admite transacción.
+
+CREATE EXTENSION IF NOT EXISTS timescaledb_toolkit;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS ont_power_5m
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT
+    time_bucket(INTERVAL '5 minutes', time) AS bucket,
+    ont_id,
+    min(ptx)                               AS ptx_min,
+    max(ptx)                               AS ptx_max,
+    sum(ptx)                               AS ptx_sum,
+    count(ptx)                             AS ptx_n,
+    min(prx)                               AS prx_min,
+    max(prx)                               AS prx_max,
+    sum(prx)                               AS prx_sum,
+    count(prx)                             AS prx_n,
+    count(*)                               AS samples,
+    state_agg(time, CASE WHEN status BETWEEN 0 AND 3
+                         THEN status::text ELSE 'other' END) AS st_agg,
+    last(status, time)                     AS last_status,
+    max(time)                              AS last_time
+FROM ont_power
+GROUP BY bucket, ont_id
+WITH NO DATA;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS ont_power_1h
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT
+    time_bucket(INTERVAL '1 hour', bucket) AS bucket,
+    ont_id,
+    min(ptx_min)                   AS ptx_min,
+    max(ptx_max)                   AS ptx_max,
+    sum(ptx_sum)                   AS ptx_sum,
+    sum(ptx_n)::BIGINT             AS ptx_n,
+    min(prx_min)                   AS prx_min,
+    max(prx_max)                   AS prx_max,
+    sum(prx_sum)                   AS prx_sum,
+    sum(prx_n)::BIGINT             AS prx_n,
+    sum(samples)::BIGINT           AS samples,
+    rollup(st_agg)                 AS st_agg,
+    last(last_status, last_time)   AS last_status,
+    max(last_time)                 AS last_time
+FROM ont_power_5m
+GROUP BY 1, ont_id
+WITH NO DATA;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS ont_power_1d
+WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT
+    time_bucket(INTERVAL '1 day', bucket) AS bucket,
+    ont_id,
+    min(ptx_min)                   AS ptx_min,
+    max(ptx_max)                   AS ptx_max,
+    sum(ptx_sum)                   AS ptx_sum,
+    sum(ptx_n)::BIGINT             AS ptx_n,
+    min(prx_min)                   AS prx_min,
+    max(prx_max)                   AS prx_max,
+    sum(prx_sum)                   AS prx_sum,
+    sum(prx_n)::BIGINT             AS prx_n,
+    sum(samples)::BIGINT           AS samples,
+    rollup(st_agg)                 AS st_agg,
+    last(last_status, last_time)   AS last_status,
+    max(last_time)                 AS last_time
+FROM ont_power_1h
+GROUP BY 1, ont_id
+WITH NO DATA;
+
+-- La API filtra siempre por ONT y rango de buckets
+CREATE INDEX IF NOT EXISTS ont_power_5m_ont_idx ON ont_power_5m (ont_id, bucket DESC);
+CREATE INDEX IF NOT EXISTS ont_power_1h_ont_idx ON ont_power_1h (ont_id, bucket DESC);
+CREATE INDEX IF NOT EXISTS ont_power_1d_ont_idx ON ont_power_1d (ont_id, bucket DESC);
+
+-- Refresco periódico. La ventana es amplia para recoger lecturas que
+-- llegan tarde (replay del spool): solo se recalculan los tramos
+-- invalidados, así que una ventana grande no cuesta más si no hay cambios.
+SELECT add_continuous_aggregate_policy('ont_power_5m',
+    start_offset      => INTERVAL '3 days',
+    end_offset        => INTERVAL '5 minutes',
+    schedule_interval => INTERVAL '5 minutes',
+    if_not_exists     => TRUE);
+
+SELECT add_continuous_aggregate_policy('ont_power_1h',
+    start_offset      => INTERVAL '7 days',
+    end_offset        => INTERVAL '1 hour',
+    schedule_interval => INTERVAL '30 minutes',
+    if_not_exists     => TRUE);
+
+SELECT add_continuous_aggregate_policy('ont_power_1d',
+    start_offset      => INTERVAL '30 days',
+    end_offset        => INTERVAL '1 day',
+    schedule_interval => INTERVAL '1 hour',
+    if_not_exists     => TRUE);
+
+-- Carga inicial del histórico existente (las políticas solo cubren su
+-- ventana; lo anterior quedaría sin materializar). En orden: 5m → 1h → 1d.
+CALL refresh_continuous_aggregate('ont_power_5m', NULL, now() - INTERVAL '5 minutes');
+CALL refresh_continuous_aggregate('ont_power_1h', NULL, now() - INTERVAL '1 hour');
+CALL refresh_continuous_aggregate('ont_power_1d', NULL, now() - INTERVAL '1 day');
@@ -0,0 +1,31 @@
+-- db-init/20261017_add_ont_power_storage_policies.sql
+-- Políticas de almacenamiento de ont_power con los valores por defecto del
+-- collector (collector/storage.py):
+--   • chunks de 1 día (solo afecta a los chunks nuevos)
+--   • compresión a los 7 días, segmentada por ont_id y ordenada por time DESC
+--   • sin retención del crudo (POWER_RETENTION_DAYS en el collector)
+-- El collector las vuelve a aplicar al arrancar según el entorno; esta
+-- migración deja una instalación existente al día sin esperar a reiniciarlo.
+
+BEGIN;
+
+SELECT set_chunk_time_interval('ont_power', INTERVAL '1 day');
+
+DO $$
+BEGIN
+  -- Los ajustes de compresión no se pueden cambiar con chunks comprimidos
+  IF NOT (SELECT compression_enabled
+            FROM timescaledb_information.hypertables
+           WHERE hypertable_name = 'ont_power') THEN
+    ALTER TABLE ont_power SET (
+      timescaledb.compress,
+      timescaledb.compress_segmentby = 'ont_id',
+      timescaledb.compress_orderby   = 'time DESC'
+    );
+  END IF;
+END
+$$;
+
+SELECT add_compression_policy('ont_power', INTERVAL '7 days', if_not_exists => TRUE);
+
+COMMIT;
@@ -0,0 +1,35 @@
+-- db-init/20261017_add_ont_search_trgm.sql
+-- Búsqueda de ONTs de la admin-ui (/ui/onts/search) por índices en lugar
+-- de ILIKE '%q%' sobre toda la tabla:
+--   • ont_search_norm(): minúsculas y sin prefijo "ont-"; la API normaliza
+--     la consulta igual (search_norm en api/app/main.py).
+--   • GIN pg_trgm sobre vendor_ont_id y serial normalizados: LIKE '%q%' y
+--     similarity() para ordenar.
+--   • btree text_pattern_ops sobre serial normalizado: nº de serie exacto
+--     o por prefijo (camino rápido).
+
+BEGIN;
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- SQL e IMMUTABLE: se expande en línea y casa con los índices de expresión
+CREATE OR REPLACE FUNCTION ont_search_norm(value TEXT)
+RETURNS TEXT
+LANGUAGE sql
+IMMUTABLE PARALLEL SAFE
+AS $$
+  SELECT lower(regexp_replace(coalesce(value, ''), '^ont-', '', 'i'))
+$$;
+
+CREATE INDEX IF NOT EXISTS ont_vendor_ont_id_trgm_idx
+  ON ont USING GIN (ont_search_norm(vendor_ont_id) gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS ont_serial_trgm_idx
+  ON ont USING GIN (ont_search_norm(serial) gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS ont_serial_norm_idx
+  ON ont (ont_search_norm(serial) text_pattern_ops);
+
+COMMIT;
+
+ANALYZE ont;
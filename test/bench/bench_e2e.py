@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+bench_e2e.py ─ poll_single_olt de extremo a extremo con OLTs simuladas
+────────────────────────────────────────────────────────────────────
+Uso:
+  python test/bench/bench_e2e.py --olts 50 --onts 4000 --workers 8
+  python test/bench/bench_e2e.py --vendor zyxel2406 --busy-rate 0.02 --churn 0.01
+  python test/bench/bench_e2e.py --vendor huawei --stream     # persistencia por slices
+
+Levanta N OLTs de `collector/simulator.py` (sin red) y lanza rondas de
+sondeos completos (conexión → escaneo → normalización → BD) con un pool
+de procesos, como los hijos prefork de Celery. Informa latencia por
+sondeo, ONTs/s de la ronda y tiempo por etapa.
+
+Necesita la TimescaleDB de pruebas (BENCH_DSN). Redis es opcional: sin
+--redis se desactivan el lock por OLT y las métricas compartidas (y solo
+entonces se desglosa el tiempo por etapa).
+────────────────────────────────────────────────────────────────────
+"""
+from __future__ import annotations
+
+import os
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+import yaml
+
+from common import DSN, Timer, percentile, summarize
+
+STAGE_SERIES = "collector_poll_stage_seconds_sum"
+PONS = 16
+
+
+def make_configs(args) -> List[Dict[str, Any]]:
+    per_pon = max(1, args.onts // PONS)
+    sim = {
+        "onts_per_pon": per_pon,
+        "pons": PONS,
+        "latency": args.latency,
+        "busy_rate": args.busy_rate,
+        "churn": args.churn,
+    }
+    cfgs = []
+    for i in range(args.olts):
+        vendor = args.vendor if args.vendor != "mixed" else ("huawei", "zyxel2406")[i % 2]
+        cfg = {
+            "id": f"sim-olt-{i:03d}",
+            "vendor": vendor,
+            "host": "127.0.0.1",
+            "port": 23,
+            "username": "sim",
+            "password": "sim",
+            "prompt": "SIM#",
+            "description": "benchmark (simulador)",
+            "poll_interval": 300,
+            "simulate": sim,
+        }
+        if vendor == "huawei":
+            cfg.update(
+                snmp_ip="127.0.0.1", snmp_port=161, snmp_community="public",
+                pon_concurrency=args.pon_concurrency,
+                pon_list=[{"frame": "0", "slot": p // 8, "port": p % 8} for p in range(PONS)],
+            )
+        cfgs.append(cfg)
+    return cfgs
+
+
+def _poll(cfg: Dict[str, Any]) -> Tuple[float, Dict[str, float]]:
+    """Un sondeo en el proceso del pool → (segundos, Δ segundos por etapa)."""
+    import tasks
+    from metrics import METRICS_BACKEND, counters
+
+    if METRICS_BACKEND != "memory":
+        # Contadores compartidos entre procesos: no se puede aislar este sondeo
+        with Timer() as t:
+            tasks.poll_single_olt(cfg)
+        return t.elapsed, {}
+
+    before = counters()
+    with Timer() as t:
+        tasks.poll_single_olt(cfg)
+    stages: Dict[str, float] = {}
+    for series, value in counters().items():
+        if series.startswith(STAGE_SERIES):
+            stage = series.split('stage="', 1)[1].split('"', 1)[0]
+            stages[stage] = stages.get(stage, 0.0) + value - before.get(series, 0.0)
+    return t.elapsed, stages
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--olts", type=int, default=50)
+    ap.add_argument("--onts", type=int, default=4000, help="ONTs por OLT")
+    ap.add_argument("--vendor", default="mixed",
+                    choices=("mixed", "huawei", "zyxel1408A", "zyxel2406"))
+    ap.add_argument("--rounds", type=int, default=3)
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    ap.add_argument("--latency", type=float, default=0.05, help="s por llamada simulada")
+    ap.add_argument("--busy-rate", type=float, default=0.0)
+    ap.add_argument("--churn", type=float, default=0.0)
+    ap.add_argument("--pon-concurrency", type=int, default=4)
+    ap.add_argument("--redis", action="store_true", help="usar Redis (lock, métricas, planificador)")
+    ap.add_argument("--stream", action="store_true", help="persistir cada PON al leerla (STREAM_SLICES)")
+    args = ap.parse_args()
+
+    cfgs = make_configs(args)
+    with tempfile.NamedTemporaryFile("w", suffix=".yaml", delete=False) as f:
+        yaml.safe_dump({"olts": cfgs}, f)
+        config_path = f.name
+
+    # tasks.py lee el entorno al importarse
+    os.environ.update({
+        "OLT_CONFIG_PATH": config_path,
+        "DB_DSN": DSN,
+        "INGEST_MODE": "inline",
+        "CONFIG_RELOAD_INTERVAL": "0",
+        "STREAM_SLICES": "true" if args.stream else "false",
+    })
+    if not args.redis:
+        os.environ.update({"POLL_LOCK_ENABLED": "false", "METRICS_BACKEND": "memory"})
+
+    import tasks
+    from sqlalchemy import text
+
+    tasks.sync_db(cfgs)
+    onts_per_olt = max(1, args.onts // PONS) * PONS
+    print(f"{len(cfgs)} OLTs × {onts_per_olt} ONTs, {args.workers} procesos")
+    try:
+        # Procesos (fork tras importar tasks), como los hijos prefork de Celery
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            for rnd in range(1, args.rounds + 1):
+                with Timer() as wall:
+                    results = list(pool.map(_poll, cfgs))
+                durations = [d for d, _ in results]
+                stages: Dict[str, float] = {}
+                for _, st in results:
+                    for k, v in st.items():
+                        stages[k] = stages.get(k, 0.0) + v
+                summarize(f"ronda {rnd} (por sondeo)", durations, onts_per_olt)
+                print(
+                    f"{'':<28} wall={wall.elapsed:7.2f} s  "
+                    f"{len(cfgs) * onts_per_olt / wall.elapsed:12.0f} ONTs/s  "
+                    f"max={percentile(durations, 100):.2f} s"
+                )
+                if stages:
+                    total = sum(stages.values()) or 1e-9
+                    print(f"{'':<28} " + "  ".join(
+                        f"{k}={v / len(cfgs):.3f}s ({100 * v / total:.0f}%)"
+                        for k, v in sorted(stages.items(), key=lambda kv: -kv[1])
+                    ))
+    finally:
+        with tasks.engine.begin() as conn:
+            conn.execute(text("DELETE FROM olt WHERE id LIKE 'sim-olt-%'"))
+        os.unlink(config_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+bench_ingest.py ─ Persistencia de un escaneo completo (mitad BD del sondeo)
+────────────────────────────────────────────────────────────────────
+Uso:
+  python test/bench/bench_ingest.py                       # 1k / 10k / 100k ONTs
+  python test/bench/bench_ingest.py --sizes 10000 --polls 20 --churn 0.01
+  python test/bench/bench_ingest.py --init-schema         # BD recién creada
+  python test/bench/bench_ingest.py --out antes.json      # para comparar cambios
+
+Ejecuta el mismo camino que poll_single_olt tras el escaneo
+(tasks._persist_rows: borrado de ONTs faltantes, upsert, mapping de ids
+e inserción en ont_power) con tres escenarios por tamaño:
+  cold    primer sondeo de la OLT (todas las ONTs son altas)
+  steady  sondeos repetidos: cambian las potencias, no los metadatos
+  churn   sondeos repetidos con --churn de ONTs sustituidas (bajas + altas)
+Informa p50/p99 del tiempo de transacción, filas/s y bytes de WAL
+(pg_current_wal_lsn) por sondeo. Usar una BD desechable: el WAL incluye
+cualquier otra actividad del clúster.
+
+Las variables del collector (POWER_WRITE_MODE, ONT_CACHE_BACKEND,
+POWER_DEADBAND, DELETE_ONTS…) se respetan: comparar ejecuciones con
+distintos valores es el uso previsto.
+────────────────────────────────────────────────────────────────────
+"""
+from __future__ import annotations
+
+import os
+import json
+import random
+import argparse
+import tempfile
+import datetime as dt
+from typing import Any, Dict, List
+
+from common import (
+    BENCH_OLT_ID, DSN, Timer, apply_schema, drop_bench_olt, ensure_bench_olt, get_engine,
+    summarize,
+)
+
+PER_PON = 128
+PONS_PER_SLOT = 16
+
+
+def vendor_ont_id(n: int) -> str:
+    slot, rest = divmod(n, PER_PON * PONS_PER_SLOT)
+    return f"ont-{1 + slot}-{1 + rest // PER_PON}-{1 + rest % PER_PON}"
+
+
+def make_scan(ids: List[int], rnd: random.Random) -> List[Any]:
+    from normalize import OntRow
+
+    return [
+        OntRow(
+            vendor_ont_id(n),
+            0.0,
+            round(rnd.uniform(-28.0, -17.0), 2),
+            1,
+            f"ZYXE{n:08X}",
+            "PMG5617GA",
+            f"bench {n}",
+            json.dumps({"AID": vendor_ont_id(n), "Status": "IS", "SN": f"ZYXE{n:08X}",
+                        "Model": "PMG5617GA", "__vendor": "zyxel2406"}),
+        )
+        for n in ids
+    ]
+
+
+def wal_lsn(engine) -> str:
+    from sqlalchemy import text
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT pg_current_wal_lsn()")).scalar()
+
+
+def wal_bytes(engine, since: str) -> int:
+    from sqlalchemy import text
+    with engine.connect() as conn:
+        return int(conn.execute(
+            text("SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), CAST(:lsn AS pg_lsn))"),
+            {"lsn": since},
+        ).scalar())
+
+
+def run_scenario(tasks, engine, label: str, scans: List[List[Any]], base: dt.datetime) -> Dict[str, Any]:
+    from metrics import StageTimer
+
+    cfg = {"id": BENCH_OLT_ID, "vendor": "zyxel2406"}
+    durations: List[float] = []
+    wal: List[int] = []
+    for i, rows in enumerate(scans):
+        ts = base + dt.timedelta(minutes=i)
+        lsn = wal_lsn(engine)
+        with Timer() as t:
+            tasks._persist_rows(cfg, ts, rows, StageTimer(olt_id=BENCH_OLT_ID, vendor="zyxel2406"))
+        durations.append(t.elapsed)
+        wal.append(wal_bytes(engine, lsn))
+
+    n = len(scans[0])
+    wal_avg = sum(wal) / len(wal)
+    stats = summarize(
+        label, durations, n,
+        extra=f"  WAL={wal_avg / 1024:10.1f} KiB/sondeo ({wal_avg / n:6.0f} B/ONT)",
+    )
+    return {"scenario": label, "onts": n, "polls": len(scans), "wal_bytes_avg": wal_avg, **stats}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--sizes", default="1000,10000,100000", help="ONTs por escaneo (lista)")
+    ap.add_argument("--polls", type=int, default=10, help="sondeos repetidos por escenario")
+    ap.add_argument("--churn", type=float, default=0.01, help="fracción sustituida (escenario churn)")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--init-schema", action="store_true", help="aplicar db-init/*.sql antes")
+    ap.add_argument("--out", help="volcar resultados en JSON")
+    args = ap.parse_args()
+
+    with tempfile.NamedTemporaryFile("w", suffix=".yaml", delete=False) as f:
+        f.write("olts: []\n")
+        config_path = f.name
+    # tasks.py lee el entorno al importarse
+    os.environ.update({
+        "OLT_CONFIG_PATH": config_path,
+        "DB_DSN": DSN,
+        "METRICS_BACKEND": os.getenv("METRICS_BACKEND", "memory"),
+    })
+    import tasks
+
+    engine = get_engine()
+    if args.init_schema:
+        apply_schema(engine)
+
+    print(
+        "POWER_WRITE_MODE={} ONT_CACHE_BACKEND={} POWER_DEADBAND={} DELETE_ONTS={}".format(
+            os.getenv("POWER_WRITE_MODE", "insert"), os.getenv("ONT_CACHE_BACKEND", "none"),
+            os.getenv("POWER_DEADBAND", "0"), tasks.DELETE_MISSING_ONTS,
+        )
+    )
+    results: List[Dict[str, Any]] = []
+    base = dt.datetime.utcnow().replace(microsecond=0)
+    try:
+        for size in (int(s) for s in args.sizes.split(",")):
+            rnd = random.Random(args.seed)
+            drop_bench_olt(engine)
+            ensure_bench_olt(engine)
+            tasks.ONT_CACHE.clear(BENCH_OLT_ID)
+            ids = list(range(size))
+
+            results.append(run_scenario(
+                tasks, engine, f"{size} cold", [make_scan(ids, rnd)], base,
+            ))
+            base += dt.timedelta(hours=1)
+            results.append(run_scenario(
+                tasks, engine, f"{size} steady",
+                [make_scan(ids, rnd) for _ in range(args.polls)], base,
+            ))
+            base += dt.timedelta(hours=1)
+
+            scans, next_id = [], size
+            for _ in range(args.polls):
+                for i in range(len(ids)):
+                    if rnd.random() < args.churn:
+                        ids[i], next_id = next_id, next_id + 1
+                scans.append(make_scan(ids, rnd))
+            results.append(run_scenario(tasks, engine, f"{size} churn", scans, base))
+            base += dt.timedelta(hours=1)
+    finally:
+        drop_bench_olt(engine)
+        os.unlink(config_path)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({
+                "env": {k: os.getenv(k) for k in (
+                    "POWER_WRITE_MODE", "ONT_CACHE_BACKEND", "POWER_DEADBAND", "DELETE_ONTS",
+                )},
+                "results": results,
+            }, f, indent=2)
+        print(f"Resultados en {args.out}")
+
+
+if __name__ == "__main__":
+    main()
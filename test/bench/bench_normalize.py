@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+bench_normalize.py ─ Normalización de ONTs (dict del vendor → OntRow)
+────────────────────────────────────────────────────────────────────
+Uso:
+  python test/bench/bench_normalize.py --onts 100000 --runs 5
+  python test/bench/bench_normalize.py --min-rate 200000   # falla si baja
+
+Mide filas/segundo de `collector/normalize.py` por vendor sobre ONTs
+sintéticas, comparado con el bucle `if vendor == …` histórico. No
+necesita BD. Con --min-rate termina con código 1 si algún vendor queda
+por debajo: sirve como control de regresiones del bucle caliente.
+────────────────────────────────────────────────────────────────────
+"""
+from __future__ import annotations
+
+import sys
+import json
+import random
+import argparse
+from typing import Any, Dict, List
+
+from common import Timer, summarize
+from config import STATUS_NORMALIZE
+from normalize import normalize_scan
+
+VENDORS = ("huawei", "zyxel1408A", "zyxel2406", "zyxel1240XA")
+
+
+def make_onts(vendor: str, n: int) -> List[Dict[str, Any]]:
+    rnd = random.Random(n)
+    out: List[Dict[str, Any]] = []
+    for i in range(n):
+        slot, port, oid = 1 + i // 2048, (i // 128) % 16, i % 128
+        rx = f"{rnd.uniform(-28.0, -17.0):.2f}"
+        if vendor == "huawei":
+            out.append({
+                "schema_fsp": f"0/{slot}/{port}", "id": oid,
+                "control_flag": "active", "run_state": rnd.choice(("online", "online", "offline")),
+                "config_state": "normal", "match_state": "match", "protect_side": "no",
+                "sn": f"HWTC{i:08X}", "description": f"cliente {i}",
+                "rx": rx, "tx": f"{rnd.uniform(1.5, 3.5):.2f}",
+            })
+        else:
+            ont = {
+                "AID": f"ont-{slot}-{port + 1}-{oid + 1}",
+                "Status": rnd.choice(("IS", "IS", "OOS-LS", "Active")),
+                "SN": f"ZYXE{i:08X}", "Model": "PMG5317-T20B",
+                "Description": f"cliente {i}",
+                "ONT Rx": f"{rx} dBm",
+            }
+            if vendor in ("zyxel1408A", "zyxel2406"):
+                ont["Template-ID"] = "Template-1"
+                ont["FW Version"] = "V5.40"
+                ont["Distance"] = "1532"
+            else:
+                ont["__filter"] = f"{slot}-{port + 1}"
+            out.append(ont)
+    return out
+
+
+# ── Referencia: bucle histórico de poll_single_olt ──────────
+def legacy_normalize(vendor: str, onts: List[Dict[str, Any]]) -> List[tuple]:
+    def to_f(val: Any) -> float:
+        try:
+            if val is None:
+                return 0.0
+            return float(str(val).replace(" dBm", "").strip())
+        except (TypeError, ValueError):
+            return 0.0
+
+    rows = []
+    for ont in onts:
+        if vendor == "huawei":
+            vid = f"{ont.get('schema_fsp')}/{ont.get('id')}"
+            meta = {
+                "id":           vid,
+                "schema_fsp":   ont.get("schema_fsp"),
+                "control_flag": ont.get("control_flag"),
+                "run_state":    ont.get("run_state"),
+                "config_state": ont.get("config_state"),
+                "match_state":  ont.get("match_state"),
+                "protect_side": ont.get("protect_side"),
+            }
+            ptx = to_f(ont.get("ptx") or ont.get("tx"))
+            prx = to_f(ont.get("prx") or ont.get("rx"))
+            status = STATUS_NORMALIZE["huawei"].get(ont.get("run_state"), 98)
+            sn, model, description = ont.get("sn"), None, ont.get("description")
+        else:
+            aid = ont.get("AID")
+            if not aid:
+                continue
+            vid = aid
+            raw_status = ont.get("Status")
+            raw_status_norm = str(raw_status).strip().upper() if raw_status is not None else None
+            status = STATUS_NORMALIZE[vendor].get(raw_status_norm, 98)
+            meta = {
+                "AID": aid, "Status": raw_status, "SN": ont.get("SN"),
+                "Model": ont.get("Model"), "__vendor": vendor,
+            }
+            if vendor == "zyxel1240XA" and "__filter" in ont:
+                meta["filter"] = ont.get("__filter")
+            ptx = to_f(ont.get("ONT Tx") or ont.get("tx") or ont.get("Tx") or ont.get("PTX"))
+            prx = to_f(ont.get("ONT Rx") or ont.get("rx") or ont.get("Rx") or ont.get("PRX"))
+            sn, model, description = ont.get("SN"), ont.get("Model"), ont.get("Description")
+            for k in ("Template-ID", "FW Version", "Distance"):
+                if k in ont:
+                    meta[k] = ont.get(k)
+        rows.append((vid, ptx, prx, status, sn, model, description, json.dumps(meta)))
+    return rows
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--onts", type=int, default=100_000)
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--vendor", choices=VENDORS, action="append")
+    ap.add_argument("--min-rate", type=float, default=0.0, help="filas/s mínimas (0 = sin control)")
+    args = ap.parse_args()
+
+    failed = []
+    for vendor in args.vendor or VENDORS:
+        onts = make_onts(vendor, args.onts)
+
+        # Misma salida que el bucle histórico
+        if [tuple(r) for r in normalize_scan(vendor, onts)] != legacy_normalize(vendor, onts):
+            print(f"{vendor}: la salida difiere del bucle histórico")
+            failed.append(vendor)
+            continue
+
+        for label, fn in (("legacy", legacy_normalize), ("registry", normalize_scan)):
+            durations = []
+            for _ in range(args.runs):
+                with Timer() as t:
+                    fn(vendor, onts)
+                durations.append(t.elapsed)
+            stats = summarize(f"{vendor} {label}", durations, len(onts))
+            if label == "registry" and stats["rows_s"] < args.min_rate:
+                failed.append(vendor)
+
+    if failed:
+        print("Regresión en:", ", ".join(failed))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
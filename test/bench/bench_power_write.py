@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+bench_power_write.py ─ INSERT (executemany) vs COPY en ont_power
+────────────────────────────────────────────────────────────────────
+Uso:
+  python test/bench/bench_power_write.py --onts 5000 --runs 10
+
+Mide filas/segundo de los dos caminos de `collector/ingest.py`
+contra una TimescaleDB local (ver BENCH_DSN en common.py).
+────────────────────────────────────────────────────────────────────
+"""
+from __future__ import annotations
+
+import random
+import argparse
+import datetime as dt
+
+from common import Timer, drop_bench_olt, ensure_bench_olt, get_engine, seed_onts, summarize
+from ingest import write_power_rows
+
+
+def make_power_rows(ont_ids, when):
+    return [
+        {
+            "time": when,
+            "ont_id": oid,
+            "ptx": round(random.uniform(2.0, 5.0), 2),
+            "prx": round(random.uniform(-27.0, -17.0), 2),
+            "status": 1,
+        }
+        for oid in ont_ids
+    ]
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--onts", type=int, default=5000)
+    ap.add_argument("--runs", type=int, default=10)
+    args = ap.parse_args()
+
+    engine = get_engine()
+    drop_bench_olt(engine)
+    ensure_bench_olt(engine)
+    try:
+        ont_ids = seed_onts(engine, args.onts)
+        base = dt.datetime.utcnow()
+        step = 0
+
+        for mode in ("insert", "copy"):
+            durations = []
+            for _ in range(args.runs):
+                step += 1
+                rows = make_power_rows(ont_ids, base + dt.timedelta(seconds=step))
+                with Timer() as t, engine.begin() as conn:
+                    write_power_rows(conn, rows, mode=mode)
+                durations.append(t.elapsed)
+            summarize(f"{mode} ({len(ont_ids)} onts)", durations, len(ont_ids))
+    finally:
+        drop_bench_olt(engine)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+bench_search.py ─ Latencia de /ui/onts/search según el nº de ONTs
+────────────────────────────────────────────────────────────────────
+Uso:
+  python test/bench/bench_search.py --sizes 10000,100000,300000 --runs 50
+
+Crece la OLT de benchmark hasta cada tamaño y mide tres búsquedas con las
+mismas consultas que ui_search_onts (api/app/ui_sql.py):
+  • serial completo      camino rápido (rango en el btree ont_search_norm(serial))
+  • trozo de serial      subcadena por trigram + orden por similitud
+  • trozo de vendor_id   ídem sobre vendor_ont_id ("3-1-1")
+Con los índices de db-init/20261017_add_ont_search_trgm.sql la latencia
+debe mantenerse plana al crecer la tabla. Con --ilike se mide también la
+consulta anterior (ILIKE sobre toda la tabla) como referencia.
+────────────────────────────────────────────────────────────────────
+"""
+from __future__ import annotations
+
+import sys
+import random
+import argparse
+from pathlib import Path
+from typing import Any, Dict, List
+
+from sqlalchemy import text
+
+from common import BENCH_OLT_ID, Timer, drop_bench_olt, ensure_bench_olt, get_engine, summarize
+
+API_DIR = Path(__file__).resolve().parents[2] / "api" / "app"
+if str(API_DIR) not in sys.path:
+    sys.path.insert(0, str(API_DIR))
+
+import ui_sql  # noqa: E402
+
+_SEED = text("""
+    INSERT INTO ont(olt_id, vendor_ont_id, serial, status, props)
+    SELECT :olt_id,
+           'ont-' || (1 + i / 2048) || '-' || (1 + (i / 128) % 16) || '-' || (1 + i % 128),
+           '5A5958' || upper(substr(md5(i::text), 1, 10)),
+           1, '{}'::jsonb
+      FROM generate_series(CAST(:first AS int), CAST(:last AS int) - 1) AS i
+    ON CONFLICT (olt_id, vendor_ont_id) DO NOTHING
+""")
+
+_FILTERS = ui_sql.ui_search_filters(None, None, True)
+FAST = ui_sql.ui_search_sql(True, _FILTERS)[1]
+TRGM = ui_sql.ui_search_sql(False, _FILTERS)[1]
+ILIKE = """
+    SELECT o.id, o.vendor_ont_id, o.serial
+      FROM ont o JOIN olt ol ON ol.id = o.olt_id
+     WHERE (o.vendor_ont_id ILIKE :like OR COALESCE(o.serial,'') ILIKE :like) AND o.geom IS NULL
+     ORDER BY o.id
+     LIMIT :lim OFFSET :off
+"""
+
+
+def params_for(q: str, serial: bool) -> Dict[str, Any]:
+    return {"q": q, "lim": 50, "off": 0, **ui_sql.ui_search_params(q, serial)}
+
+
+def run(engine, label: str, sql: str, queries: List[str], serial: bool = False) -> None:
+    durations = []
+    with engine.connect() as conn:
+        for q in queries:
+            with Timer() as t:
+                conn.execute(text(sql), params_for(q, serial)).all()
+            durations.append(t.elapsed)
+    summarize(label, durations, 1)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--sizes", default="10000,100000,300000")
+    ap.add_argument("--runs", type=int, default=50)
+    ap.add_argument("--ilike", action="store_true", help="mide también el ILIKE anterior")
+    args = ap.parse_args()
+
+    engine = get_engine()
+    drop_bench_olt(engine)
+    ensure_bench_olt(engine, vendor="zyxel2406")
+    current = 0
+    try:
+        for size in sorted(int(s) for s in args.sizes.split(",")):
+            with Timer() as t, engine.begin() as conn:
+                conn.execute(_SEED, {"olt_id": BENCH_OLT_ID, "first": current, "last": size})
+                conn.execute(text("ANALYZE ont"))
+            current = size
+            with engine.connect() as conn:
+                serials = conn.execute(text("""
+                    SELECT lower(serial) FROM ont WHERE olt_id = :olt_id ORDER BY random() LIMIT :n
+                """), {"olt_id": BENCH_OLT_ID, "n": args.runs}).scalars().all()
+            print(f"\n{size} ONTs (alta en {t.elapsed:.1f} s)")
+
+            run(engine, "serial completo", FAST, serials, serial=True)
+            fragments = [s[random.randint(6, 10):][:6] for s in serials]
+            run(engine, "trozo de serial", TRGM, fragments)
+            vids = [f"{random.randint(1, 4)}-{random.randint(1, 16)}-1" for _ in serials]
+            run(engine, "trozo de vendor_ont_id", TRGM, vids)
+            if args.ilike:
+                run(engine, "ILIKE anterior (serial)", ILIKE, fragments)
+    finally:
+        drop_bench_olt(engine)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+bench_storage.py ─ Tamaño y latencia de ont_power antes/después de comprimir
+────────────────────────────────────────────────────────────────────
+Uso:
+  python test/bench/bench_storage.py --onts 200 --days 30 --interval 300
+
+1. Genera `--days` de histórico sintético (una lectura cada `--interval`
+   s por ONT) con chunks de `--chunk-hours` h.
+2. Mide el tamaño del hypertable y la latencia de las consultas de
+   /onts/{id}/history y /metrics/ (crudo 24 h, crudo toda la ventana y
+   agregado horario de toda la ventana).
+3. Aplica las políticas de collector/storage.py, comprime los chunks con
+   más de `--compress-after` días y repite las mediciones.
+Al terminar descomprime esos chunks y borra la OLT de benchmark.
+Usar una BD desechable (ver BENCH_DSN en common.py): set_chunk_time_interval
+y la política de compresión cambian el hypertable para todos.
+────────────────────────────────────────────────────────────────────
+"""
+from __future__ import annotations
+
+import random
+import argparse
+import datetime as dt
+from typing import Dict, List
+
+from sqlalchemy import text
+
+from common import Timer, drop_bench_olt, ensure_bench_olt, get_engine, seed_onts, summarize
+from storage import apply_storage_policies
+
+_GENERATE = text("""
+    INSERT INTO ont_power(time, ont_id, ptx, prx, status)
+    SELECT t, o.id,
+           round((2 + random() * 3)::numeric, 2),
+           round((-27 + random() * 10)::numeric, 2),
+           CASE WHEN random() < 0.01 THEN 2 ELSE 1 END
+      FROM unnest(CAST(:ids AS bigint[])) AS o(id),
+           generate_series(CAST(:start AS timestamptz), CAST(:end AS timestamptz),
+                           make_interval(secs => :step)) AS t
+""")
+
+_SIZE = text("""
+    SELECT hypertable_size('ont_power'),
+           (SELECT count(*) FROM show_chunks('ont_power'))
+""")
+
+# Mismas consultas que api/app/main.py (history y /metrics/)
+QUERIES: Dict[str, str] = {
+    "raw 24h": """
+        SELECT time, ptx, prx, status
+          FROM ont_power
+         WHERE ont_id = :oid AND time >= :end - INTERVAL '24 hours'
+         ORDER BY time DESC
+    """,
+    "raw window": """
+        SELECT time, ptx, prx, status
+          FROM ont_power
+         WHERE ont_id = :oid AND time BETWEEN :start AND :end
+         ORDER BY time ASC
+    """,
+    "1h aggregate window": """
+        SELECT bucket, ptx_sum / NULLIF(ptx_n, 0), ptx_min, ptx_max,
+               prx_sum / NULLIF(prx_n, 0), prx_min, prx_max, last_status, samples
+          FROM ont_power_1h
+         WHERE ont_id = :oid AND bucket > :start AND bucket <= :end
+         ORDER BY bucket ASC
+    """,
+}
+
+
+def measure(engine, label: str, ont_ids: List[int], start, end, runs: int) -> None:
+    with engine.connect() as conn:
+        size, chunks = conn.execute(_SIZE).one()
+    print(f"\n[{label}] ont_power: {size / 1024 / 1024:.1f} MiB en {chunks} chunks")
+    for name, sql in QUERIES.items():
+        durations, rows = [], 0
+        with engine.connect() as conn:
+            for _ in range(runs):
+                oid = random.choice(ont_ids)
+                with Timer() as t:
+                    rows += len(conn.execute(text(sql), {"oid": oid, "start": start, "end": end}).all())
+                durations.append(t.elapsed)
+        summarize(name, durations, rows // max(1, runs))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--onts", type=int, default=200)
+    ap.add_argument("--days", type=int, default=30)
+    ap.add_argument("--interval", type=int, default=300, help="segundos entre lecturas")
+    ap.add_argument("--chunk-hours", type=int, default=24)
+    ap.add_argument("--compress-after", type=int, default=1, help="días")
+    ap.add_argument("--runs", type=int, default=50, help="consultas por tipo")
+    args = ap.parse_args()
+
+    engine = get_engine()
+    drop_bench_olt(engine)
+    ensure_bench_olt(engine)
+    end = dt.datetime.now(dt.timezone.utc).replace(microsecond=0)
+    start = end - dt.timedelta(days=args.days)
+    compressed: List[str] = []
+    try:
+        ont_ids = seed_onts(engine, args.onts)
+        with Timer() as t, engine.begin() as conn:
+            conn.execute(
+                text("SELECT set_chunk_time_interval('ont_power', make_interval(hours => :h))"),
+                {"h": args.chunk_hours},
+            )
+            conn.execute(_GENERATE, {"ids": ont_ids, "start": start, "end": end, "step": args.interval})
+        print(f"Histórico: {args.onts} ONTs × {args.days} días cada {args.interval} s en {t.elapsed:.1f} s")
+
+        # Los agregados se materializan como lo haría su política
+        raw = engine.raw_connection()
+        try:
+            raw.autocommit = True
+            with raw.cursor() as cur:
+                for view in ("ont_power_5m", "ont_power_1h", "ont_power_1d"):
+                    cur.execute(f"CALL refresh_continuous_aggregate('{view}', %s, %s)", (start, end))
+        finally:
+            raw.close()
+
+        measure(engine, "sin comprimir", ont_ids, start, end, args.runs)
+
+        with Timer() as t, engine.begin() as conn:
+            apply_storage_policies(
+                conn, chunk_hours=args.chunk_hours,
+                compress_after_days=args.compress_after, retention=0,
+            )
+            compressed = list(conn.execute(text("""
+                SELECT compress_chunk(c, if_not_compressed => true)::text
+                  FROM show_chunks('ont_power', older_than => make_interval(days => :d)) AS c
+            """), {"d": args.compress_after}).scalars())
+        print(f"\nComprimidos {len(compressed)} chunks en {t.elapsed:.1f} s")
+        with engine.connect() as conn:
+            before, after = conn.execute(text("""
+                SELECT sum(before_compression_total_bytes), sum(after_compression_total_bytes)
+                  FROM chunk_compression_stats('ont_power')
+            """)).one()
+        if before:
+            print(f"Chunks comprimidos: {before / 1024 / 1024:.1f} MiB → "
+                  f"{after / 1024 / 1024:.1f} MiB (×{before / max(1, after):.1f})")
+
+        measure(engine, "comprimido", ont_ids, start, end, args.runs)
+    finally:
+        if compressed:
+            with engine.begin() as conn:
+                for chunk in compressed:
+                    conn.execute(text("SELECT decompress_chunk(CAST(:c AS regclass), if_compressed => true)"),
+                                 {"c": chunk})
+        drop_bench_olt(engine)
+
+
+if __name__ == "__main__":
+    main()
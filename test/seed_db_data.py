@@ -68,6 +68,17 @@ for ont_id in filter(None, ids):
         else:
             cur.execute(insert_power, (t, ont_id, None, None, status))
 
+# 3) Última lectura por ONT (la mantiene el collector; /geo y /onts la usan)
+cur.execute("""
+  INSERT INTO ont_last_power(ont_id, time, ptx, prx, status)
+  SELECT DISTINCT ON (ont_id) ont_id, time, ptx, prx, status
+    FROM ont_power
+   WHERE ont_id = ANY(%s)
+   ORDER BY ont_id, time DESC
+  ON CONFLICT (ont_id) DO UPDATE SET
+    time = EXCLUDED.time, ptx = EXCLUDED.ptx, prx = EXCLUDED.prx, status = EXCLUDED.status
+""", (list(filter(None, ids)),))
+
 
 conn.commit()
 cur.close()